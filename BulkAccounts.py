@@ -0,0 +1,307 @@
+import argparse
+import csv
+import json
+import os
+import secrets
+import sqlite3
+import string
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# 复用服务器的数据库助手，保证表结构已迁移到最新版本
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'server'))
+from DataBaseHelper import DataBaseHelper
+from PasswordHashHelper import PasswordHashHelper
+
+# 定义数据库路径
+db_path = 'users.db'
+
+# 每批读取/哈希/写入的账户数
+BATCH_SIZE = 5000
+
+# 导出时的字段
+EXPORT_FIELDS = ['id', 'username', 'avatar', 'status', 'created_at', 'last_login']
+
+# 导入结束时最多列出的无效行数
+MAX_REPORTED_INVALID = 20
+
+
+def hash_password(password):
+    """
+    哈希单个密码（在子进程中执行，使用校准后的迭代次数）
+    """
+    return PasswordHashHelper.hash(password)
+
+
+def parse_account(row):
+    """
+    检查一行账户数据的字段类型
+
+    Args:
+        row: CSV的一行或JSONL解析出的对象
+
+    Returns:
+        tuple: ((username, password, avatar), None)，数据无效时返回(None, 原因)
+    """
+    if not isinstance(row, dict):
+        return None, f"应为JSON对象，实际为{type(row).__name__}"
+    username = row.get('username')
+    password = row.get('password')
+    avatar = row.get('avatar')
+    if not isinstance(username, str) or not username.strip():
+        return None, "username缺失或不是字符串"
+    if not isinstance(password, str) or not password:
+        return None, "password缺失或不是字符串"
+    if avatar is not None and not isinstance(avatar, str):
+        return None, "avatar不是字符串"
+    return (username.strip(), password, avatar or None), None
+
+
+def read_accounts(input_path, invalid):
+    """
+    逐行读取CSV或JSONL账户文件，无效的行记录到invalid中并跳过，不会中断导入
+
+    Args:
+        input_path: 文件路径，CSV需要包含username和password列，JSONL每行一个对象
+        invalid: 列表，追加无效行的(行号, 原因)
+
+    Yields:
+        tuple: (username, password, avatar)
+    """
+    with open(input_path, 'r', encoding='utf-8', newline='') as f:
+        if input_path.lower().endswith('.jsonl'):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    invalid.append((line_number, f"不是有效的JSON: {e.msg}"))
+                    continue
+                account, reason = parse_account(row)
+                if account is None:
+                    invalid.append((line_number, reason))
+                    continue
+                yield account
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                account, reason = parse_account(row)
+                if account is None:
+                    invalid.append((reader.line_num, reason))
+                    continue
+                yield account
+
+
+def batched(iterable, size):
+    """
+    把可迭代对象切分为固定大小的批次
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def filter_existing(cursor, batch):
+    """
+    去掉数据库中已存在的用户名以及批次内重复的用户名，避免为它们做无用的密码哈希
+    """
+    usernames = list({username for username, _, _ in batch})
+    existing = set()
+    # SQLite对单条语句的参数个数有限制，分段查询
+    for i in range(0, len(usernames), 500):
+        chunk = usernames[i:i + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        cursor.execute(f"SELECT username FROM users WHERE username IN ({placeholders})", chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    result = []
+    for account in batch:
+        if account[0] not in existing:
+            existing.add(account[0])
+            result.append(account)
+    return result
+
+
+def import_accounts(input_path, workers=None):
+    """
+    批量导入账户：多进程并行哈希密码，所有账户在一个事务中写入
+
+    Args:
+        input_path: CSV或JSONL文件路径
+        workers: 哈希进程数，默认为CPU核心数
+
+    Returns:
+        bool: 操作是否成功
+    """
+    if not os.path.exists(input_path):
+        print(f"账户文件 {input_path} 不存在！")
+        return False
+
+    DataBaseHelper(db_path, cache_size=0)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    created_at = DataBaseHelper._now()
+
+    total = 0
+    imported = 0
+    invalid = []
+    hash_seconds = 0.0
+    write_seconds = 0.0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for batch in batched(read_accounts(input_path, invalid), BATCH_SIZE):
+                total += len(batch)
+                batch = filter_existing(cursor, batch)
+
+                hash_start = time.perf_counter()
+                hashes = list(executor.map(hash_password, [password for _, password, _ in batch], chunksize=64))
+                hash_seconds += time.perf_counter() - hash_start
+
+                write_start = time.perf_counter()
+                before = conn.total_changes
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO users (username, password, avatar, created_at) VALUES (?, ?, ?, ?)",
+                    [(username, hashed, avatar, created_at) for (username, _, avatar), hashed in zip(batch, hashes)]
+                )
+                imported += conn.total_changes - before
+                write_seconds += time.perf_counter() - write_start
+
+                elapsed = time.perf_counter() - start
+                print(f"已处理 {total} 个账户，{total / elapsed:.0f} 个/秒")
+
+        commit_start = time.perf_counter()
+        conn.commit()
+        write_seconds += time.perf_counter() - commit_start
+    except (sqlite3.Error, ValueError, OSError) as e:
+        conn.rollback()
+        print(f"导入失败，已回滚: {e}")
+        return False
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    if invalid:
+        print(f"跳过 {len(invalid)} 行无效数据：")
+        for line_number, reason in invalid[:MAX_REPORTED_INVALID]:
+            print(f"  第 {line_number} 行: {reason}")
+        if len(invalid) > MAX_REPORTED_INVALID:
+            print(f"  ……其余 {len(invalid) - MAX_REPORTED_INVALID} 行未列出")
+    print(f"导入完成：读取 {total} 个，新增 {imported} 个，跳过已存在 {total - imported} 个")
+    print(f"总耗时 {elapsed:.2f} 秒，{total / elapsed if elapsed else 0:.0f} 个/秒"
+          f"（哈希 {hash_seconds:.2f} 秒，写入 {write_seconds:.2f} 秒）")
+    return True
+
+
+def export_accounts(output_path, include_hash=False):
+    """
+    流式导出账户（不含明文密码）
+
+    Args:
+        output_path: 输出文件路径，.jsonl结尾导出JSONL，否则导出CSV
+        include_hash: 是否导出密码哈希（用于迁移到另一台服务器）
+
+    Returns:
+        bool: 操作是否成功
+    """
+    if not os.path.exists(db_path):
+        print(f"数据库文件 {db_path} 不存在！")
+        return False
+
+    fields = EXPORT_FIELDS + (['password'] if include_hash else [])
+    start = time.perf_counter()
+    count = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(fields)} FROM users ORDER BY id")
+        with open(output_path, 'w', encoding='utf-8', newline='') as f:
+            as_jsonl = output_path.lower().endswith('.jsonl')
+            writer = None if as_jsonl else csv.writer(f)
+            if writer:
+                writer.writerow(fields)
+            while True:
+                rows = cursor.fetchmany(BATCH_SIZE)
+                if not rows:
+                    break
+                if as_jsonl:
+                    f.writelines(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n' for row in rows)
+                else:
+                    writer.writerows(rows)
+                count += len(rows)
+    except (sqlite3.Error, OSError) as e:
+        print(f"导出失败: {e}")
+        return False
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"导出完成：{count} 个账户 -> {output_path}，耗时 {elapsed:.2f} 秒，{count / elapsed if elapsed else 0:.0f} 个/秒")
+    return True
+
+
+def generate_accounts(output_path, count, prefix='user', password_length=12):
+    """
+    生成随机账户文件（用于压力测试或课堂/局域网部署）
+
+    Args:
+        output_path: 输出的CSV文件路径
+        count: 账户数量
+        prefix: 用户名前缀
+        password_length: 随机密码长度
+
+    Returns:
+        bool: 操作是否成功
+    """
+    alphabet = string.ascii_letters + string.digits
+    width = len(str(count))
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['username', 'password'])
+        for i in range(1, count + 1):
+            password = ''.join(secrets.choice(alphabet) for _ in range(password_length))
+            writer.writerow([f"{prefix}{i:0{width}d}", password])
+    print(f"已生成 {count} 个账户: {output_path}")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量账户工具：导入、导出和生成账户")
+    parser.add_argument('--db', default=db_path, help="数据库文件路径（默认: users.db）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help="从CSV/JSONL文件批量导入账户")
+    import_parser.add_argument('input', help="账户文件，需要包含username和password字段")
+    import_parser.add_argument('--workers', type=int, default=None, help="哈希进程数（默认: CPU核心数）")
+
+    export_parser = subparsers.add_parser('export', help="导出账户到CSV/JSONL文件")
+    export_parser.add_argument('output', help="输出文件，.jsonl结尾导出JSONL，否则导出CSV")
+    export_parser.add_argument('--with-hash', action='store_true', help="同时导出密码哈希")
+
+    generate_parser = subparsers.add_parser('generate', help="生成随机账户CSV文件")
+    generate_parser.add_argument('output', help="输出的CSV文件")
+    generate_parser.add_argument('count', type=int, help="账户数量")
+    generate_parser.add_argument('--prefix', default='user', help="用户名前缀（默认: user）")
+
+    args = parser.parse_args()
+    db_path = args.db
+
+    print("=== 批量账户工具 ===")
+    if args.command == 'import':
+        success = import_accounts(args.input, workers=args.workers)
+    elif args.command == 'export':
+        success = export_accounts(args.output, include_hash=args.with_hash)
+    else:
+        success = generate_accounts(args.output, args.count, prefix=args.prefix)
+
+    print()
+    if success:
+        print("✅ 操作完成！")
+    else:
+        print("❌ 操作失败！")
+        sys.exit(1)
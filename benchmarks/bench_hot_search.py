@@ -0,0 +1,307 @@
+"""
+百度热搜榜解析基准测试：旧的多轮正则扫描 vs HotSearchParser单遍增量解析
+
+fixtures目录下保存了热搜榜页面（gzip压缩的HTML）及对应的正确榜单（.expected.json），
+测试时分别用两种方式解析，比较解析耗时、提取准确率，以及增量解析读到榜单时已接收的页面比例。
+
+fixture分为两类：
+    - recorded_*：record命令录制的真实页面，正确榜单直接从页面内嵌的JSON读取，不经过被测的解析器
+    - synthetic_*：generate-fixtures按页面结构构造的页面，只能说明解析器能处理预想到的结构，
+      不能代替真实页面；没有录制过真实页面时run会给出提示
+
+用法（在项目根目录运行）：
+    python benchmarks/bench_hot_search.py run
+    python benchmarks/bench_hot_search.py record
+    python benchmarks/bench_hot_search.py generate-fixtures
+"""
+
+import argparse
+import asyncio
+import glob
+import gzip
+import html
+import json
+import os
+import random
+import re
+import sys
+import time
+
+import aiohttp
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+sys.path.insert(0, os.path.join(ROOT_DIR, "src", "server"))
+
+from HotSearchHelper import HotSearchHelper, HotSearchParser
+
+SAMPLE_TITLES = [
+    "神舟二十一号发射圆满成功", "国足2:0胜印尼", "多地迎来今冬首场降雪", "央行宣布降准0.5个百分点",
+    "这些地方明起供暖", "男子捡到8万现金原地等失主3小时", "专家提醒流感季这些误区要避开",
+    "\"双十一\"快递量创新高", "村民用了多年的垫脚石竟是恐龙化石", "电影《长安的荔枝》票房破10亿",
+    "高铁票价调整 部分线路可打折", "台风", "Python之父谈JavaScript和AI编程", "考研报名今日截止",
+    "女子150万竞得32间法拍房6年未交付", "外卖平台新规下月起施行", "全国大部地区气温将创新低",
+    "CBA常规赛辽宁男篮三连胜", "博物馆夜场门票秒空", "新能源车购置税政策明年调整",
+    "年轻人开始流行\"反向旅游\"", "大学食堂推出9.9元自助", "多家银行下调存款利率",
+    "感悟跨越百年的鼓岭情缘", "A股三大指数集体收涨", "网红景点排队6小时只玩10分钟",
+    "科学家发现新型抗生素", "铁路12306推出新功能", "中学生发明防溺水手环获专利",
+    "猫咪被困高楼外墙消防员出动", "医保个人账户可家庭共济", "明年放假安排公布",
+    "苹果发布会&新品汇总", "小区电梯加装补贴标准出炉", "国产大飞机C919新航线开通",
+    "首批数字人民币硬钱包发放", "多地公积金政策优化", "马拉松比赛选手集体跑错路线",
+]
+
+NAV_LINKS = ["百度首页", "百度热搜 - 实时热点", "小说榜单", "电影榜单", "电视剧榜单", "汽车榜单",
+             "游戏榜单", "设置 - 搜索设置", "登录百度帐号", "意见反馈 - 联系我们", "使用百度前必读"]
+
+
+def legacy_parse(html_content):
+    """旧的解析方式（HotSearchHelper重构前的实现）"""
+    hot_searches = []
+    patterns = [
+        re.compile(r'<div class=["\']c-single-text-ellipsis["\'].*?>(.*?)</div>', re.DOTALL),
+        re.compile(r'<a[^>]*?>(.*?)</a>', re.DOTALL),
+    ]
+    for pattern in patterns:
+        matches = pattern.findall(html_content)
+        for match in matches:
+            title = match.strip()
+            if (title and len(title) > 4 and len(title) < 80 and
+                    title not in hot_searches and
+                    not any(keyword in title.lower() for keyword in ['http', 'javascript', 'css', 'style', 'script', 'img', 'div', 'span'])):
+                hot_searches.append(title)
+                if len(hot_searches) >= 10:
+                    break
+        if len(hot_searches) >= 10:
+            break
+    if len(hot_searches) < 10:
+        general_pattern = re.compile(r'>([^<]{5,50})<', re.DOTALL)
+        for match in general_pattern.findall(html_content):
+            title = match.strip()
+            if (title and len(title) > 4 and len(title) < 80 and
+                    title not in hot_searches and
+                    not any(keyword in title.lower() for keyword in ['http', 'javascript', 'css', 'style', 'script', 'img', 'div', 'span'])):
+                hot_searches.append(title)
+                if len(hot_searches) >= 10:
+                    break
+    return hot_searches[:10]
+
+
+def build_board_page(seed, with_data=True, title_class="c-single-text-ellipsis"):
+    """
+    按热搜榜页面的结构构造HTML：头部样式和脚本、导航链接、内嵌的s-data榜单JSON、50条榜单条目
+
+    Args:
+        seed: 随机数种子
+        with_data: 是否包含内嵌的s-data注释
+        title_class: 榜单标题元素的class（模拟页面改版）
+
+    Returns:
+        tuple: (HTML文本, 正确的前10条榜单)
+    """
+    rng = random.Random(seed)
+    titles = rng.sample(SAMPLE_TITLES, len(SAMPLE_TITLES))
+    top, content = titles[0], titles[1:]
+
+    def item(index, word):
+        return {
+            "appUrl": f"https://www.baidu.com/s?wd={word}&sa=fyb_news",
+            "desc": f"{word}的相关报道。" * rng.randint(1, 3),
+            "hotChange": rng.choice(["same", "up", "down"]),
+            "hotScore": str(rng.randint(1000000, 8000000)),
+            "img": f"https://fyb-2.cdn.bcebos.com/hotboard_image/{rng.getrandbits(64):x}",
+            "index": index,
+            "isTop": index == 0,
+            "query": word,
+            "rawUrl": f"https://www.baidu.com/s?wd={word}",
+            "show": [],
+            "url": f"https://www.baidu.com/s?wd={word}&sa=fyb_news&rsv_dl=fyb_news",
+            "word": word
+        }
+
+    data = {
+        "data": {
+            "cards": [{
+                "component": "hotList",
+                "content": [item(i + 1, word) for i, word in enumerate(content)],
+                "more": True,
+                "moreAppUrl": "https://top.baidu.com/board?tab=realtime",
+                "text": "实时热点",
+                "topContent": [item(0, top)],
+                "typeName": "realtime"
+            }],
+            "curBoardName": "realtime",
+            "logid": str(rng.getrandbits(48))
+        }
+    }
+
+    parts = ['<!DOCTYPE html><html><head><meta charset="UTF-8"><title>百度热搜</title>']
+    for _ in range(30):
+        rules = "".join(f".c-{rng.getrandbits(24):x}{{margin:{rng.randint(0, 20)}px;color:#{rng.getrandbits(24):06x}}}"
+                        for _ in range(40))
+        parts.append(f"<style>{rules}</style>")
+    for _ in range(20):
+        code = ";".join(f"var a{rng.getrandbits(20):x}=function(e){{return e.split('<span>').join('')}}" for _ in range(60))
+        parts.append(f"<script>{code}</script>")
+    parts.append('</head><body><div id="sanRoot"><div class="header_2V_cB">')
+    for text in NAV_LINKS:
+        parts.append(f'<a href="https://www.baidu.com/" class="nav-item_1o2Gq">{text}</a>')
+    parts.append('</div>')
+    if with_data:
+        parts.append(f"<!--s-data:{json.dumps(data, ensure_ascii=False)}-->")
+    parts.append('<div class="container-bg_lQ801"><div class="content_1YWBm">')
+    for index, word in enumerate([top] + content):
+        escaped = html.escape(word)
+        parts.append(
+            f'<div class="category-wrap_iQLoo horizontal_1eKyQ">'
+            f'<a class="img-wrapper_29V76" href="https://www.baidu.com/s?wd={escaped}" target="_blank">'
+            f'<div class="index_1Ew5p c-index-bg{min(index, 4)}">{index if index else ""}</div>'
+            f'<img src="https://fyb-2.cdn.bcebos.com/hotboard_image/{rng.getrandbits(64):x}" alt=""></a>'
+            f'<div class="trend_2RttY hide-icon_3XeIB"><div class="img-wrapper_29V76"></div></div>'
+            f'<div class="content_1YWBm"><a href="https://www.baidu.com/s?wd={escaped}" class="title_dIF3B" target="_blank">'
+            f'<div class="{title_class}">  {escaped}  </div></a>'
+            f'<div class="hot-desc_1m_jR large_nSuFU ">{html.escape(word)}的相关报道。'
+            f'<a href="https://www.baidu.com/s?wd={escaped}" class="look-more_3oNWC" target="_blank">查看更多&gt;</a></div></div>'
+            f'<div class="hot-index_1Bl1a"> {rng.randint(1000000, 8000000)} </div></div>'
+        )
+    parts.append('</div></div><div class="footer_3XuBL"><a href="https://www.baidu.com/duty/">使用百度前必读</a>'
+                 '<a href="https://www.baidu.com/">百度首页</a></div></div></body></html>')
+    return "".join(parts), ([top] + content)[:10]
+
+
+def generate_fixtures():
+    """生成三种页面：正常页面、没有内嵌数据的页面、标题元素改版的页面"""
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    variants = [
+        ("synthetic_hot_search_board", {}),
+        ("synthetic_hot_search_board_no_data", {"with_data": False}),
+        ("synthetic_hot_search_board_redesign", {"title_class": "title-text_2cgQe"}),
+    ]
+    for index, (name, options) in enumerate(variants):
+        page, expected = build_board_page(seed=2024 + index, **options)
+        with gzip.open(os.path.join(FIXTURE_DIR, f"{name}.html.gz"), "wb") as f:
+            f.write(page.encode("utf-8"))
+        with open(os.path.join(FIXTURE_DIR, f"{name}.expected.json"), "w", encoding="utf-8") as f:
+            json.dump(expected, f, ensure_ascii=False, indent=1)
+        print(f"已生成 {name}: {len(page.encode('utf-8')) / 1024:.0f} KB")
+
+
+def embedded_board(page, limit=10):
+    """
+    直接从页面内嵌的s-data JSON读取榜单（录制fixture时生成正确榜单，不使用被测的HotSearchParser）
+
+    Returns:
+        list/None: 前limit条标题，页面没有内嵌数据时返回None
+    """
+    start = page.find("<!--s-data:")
+    end = page.find("-->", start)
+    if start < 0 or end < 0:
+        return None
+    data = json.loads(page[start + len("<!--s-data:"):end])
+    titles = []
+    for card in data["data"]["cards"]:
+        for item in card.get("topContent", []) + card.get("content", []):
+            title = item.get("word") or item.get("query")
+            if title and title not in titles:
+                titles.append(title)
+    return titles[:limit]
+
+
+async def record_fixture(output=None, url=HotSearchHelper.URL):
+    """
+    下载实时的热搜榜页面保存为fixture，并从页面内嵌的数据生成正确榜单
+
+    Args:
+        output: 保存路径（.html.gz），默认为fixtures/recorded_hot_search_<日期>.html.gz
+        url: 热搜榜地址
+    """
+    output = output or os.path.join(FIXTURE_DIR, f"recorded_hot_search_{time.strftime('%Y%m%d')}.html.gz")
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url, headers=HotSearchHelper.HEADERS) as response:
+            raw = await response.read()
+    page = raw.decode("utf-8", errors="replace")
+    expected = embedded_board(page)
+    if not expected:
+        print("页面中没有内嵌的榜单数据，无法自动生成正确榜单，未保存fixture")
+        return
+    with gzip.open(output, "wb") as f:
+        f.write(raw)
+    with open(output.replace(".html.gz", ".expected.json"), "w", encoding="utf-8") as f:
+        json.dump(expected, f, ensure_ascii=False, indent=1)
+    print(f"已录制 {output}: {len(raw) / 1024:.0f} KB（请对照页面核对.expected.json）")
+
+
+def accuracy(result, expected):
+    """
+    与正确榜单比较
+
+    Returns:
+        str: "命中条数/总数（位置也一致的条数）"
+    """
+    found = len(set(result) & set(expected))
+    in_place = sum(1 for got, want in zip(result, expected) if got == want)
+    return f"{found}/{len(expected)}（位置一致 {in_place}）"
+
+
+def stream_parse(page, chunk_size=16384):
+    """模拟边下载边解析，返回(结果, 读到榜单时已接收的字符比例)"""
+    parser = HotSearchParser()
+    received = 0
+    for start in range(0, len(page), chunk_size):
+        chunk = page[start:start + chunk_size]
+        received += len(chunk)
+        if parser.feed(chunk):
+            break
+    return parser.close(), received / len(page)
+
+
+def run(repeat):
+    fixtures = sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html.gz")))
+    if not fixtures:
+        print("没有找到fixture，请先运行 generate-fixtures 或 record")
+        return
+    if not any(os.path.basename(path).startswith("recorded_") for path in fixtures):
+        print("注意：只有模拟页面（synthetic_*），结果不能代表真实页面，请在能访问百度的环境中运行 record 录制真实页面\n")
+    for path in fixtures:
+        name = os.path.basename(path)[:-len(".html.gz")]
+        with gzip.open(path, "rb") as f:
+            page = f.read().decode("utf-8", errors="replace")
+        with open(path.replace(".html.gz", ".expected.json"), encoding="utf-8") as f:
+            expected = json.load(f)
+        print(f"{name} ({len(page.encode('utf-8')) / 1024:.0f} KB)")
+
+        for label, parse in (("旧实现", legacy_parse), ("单遍解析", HotSearchHelper.parse_hot_search)):
+            started_at = time.perf_counter()
+            for _ in range(repeat):
+                result = parse(page)
+            elapsed = (time.perf_counter() - started_at) / repeat * 1000
+            print(f"  {label:<6} {elapsed:8.3f} ms/次  准确 {accuracy(result, expected)}")
+            for got, want in zip(result, expected):
+                if got != want:
+                    print(f"           第一处不一致: {got!r}（应为 {want!r}）")
+                    break
+
+        result, fraction = stream_parse(page)
+        print(f"  增量解析读到榜单时已接收页面的 {fraction:.0%}，准确 {accuracy(result, expected)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="百度热搜榜解析基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_args = subparsers.add_parser("run", help="运行基准测试")
+    run_args.add_argument("--repeat", type=int, default=50, help="每个fixture解析的次数")
+    record_args = subparsers.add_parser("record", help="下载实时的热搜榜页面保存为fixture")
+    record_args.add_argument("--output", default=None, help="保存路径，默认为fixtures/recorded_hot_search_<日期>.html.gz")
+    subparsers.add_parser("generate-fixtures", help="生成模拟的热搜榜页面")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args.repeat)
+    elif args.command == "record":
+        asyncio.run(record_fixture(args.output))
+    else:
+        generate_fixtures()
+
+
+if __name__ == "__main__":
+    main()
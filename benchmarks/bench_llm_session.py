@@ -0,0 +1,103 @@
+"""
+call_llm_api首字延迟基准测试：每次请求新建会话 vs 共享连接池会话
+
+用法（在项目根目录运行）：
+    python benchmarks/bench_llm_session.py --requests 200
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src", "server"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# 导入server模块前指定数据目录，账户库、聊天记录和日志都写入临时目录，不影响正式数据
+DATA_DIR = tempfile.mkdtemp(prefix="floritechat-bench-")
+os.environ["CHAT_SERVER_DATA_DIR"] = DATA_DIR
+
+from mock_llm_server import start_mock_server
+import server
+from HttpSessionHelper import HttpSessionHelper
+from LLMEndpointHelper import LLMEndpointHelper
+from LLMCacheHelper import LLMCacheHelper
+
+
+async def measure_first_token(prompt):
+    """调用一次call_llm_api，返回首个片段到达的耗时（毫秒）"""
+    start = time.perf_counter()
+    first_token_at = None
+
+    async def on_chunk(chunk_text):
+        nonlocal first_token_at
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+
+    await server.call_llm_api(prompt, stream=True, on_chunk=on_chunk)
+    return (first_token_at - start) * 1000
+
+
+async def run_case(requests, reuse_session):
+    """
+    连续发送请求并统计首字延迟
+
+    Args:
+        requests: 请求数量
+        reuse_session: False时每次请求后关闭会话，模拟旧的"每次新建ClientSession"行为
+    """
+    timings = []
+    for i in range(requests):
+        timings.append(await measure_first_token(f"问题{i}"))
+        if not reuse_session:
+            await HttpSessionHelper.close("llm")
+    await HttpSessionHelper.close("llm")
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<16} 平均 {statistics.mean(timings):7.2f} ms  中位数 {statistics.median(timings):7.2f} ms  "
+          f"p95 {p95:7.2f} ms  最大 {timings[-1]:7.2f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="call_llm_api首字延迟基准测试")
+    parser.add_argument("--requests", type=int, default=200, help="每种情况的请求数量")
+    parser.add_argument("--api-base", default=None, help="使用已有的服务地址，默认启动本地模拟服务")
+    args = parser.parse_args()
+
+    logging.getLogger("ChatServer").setLevel(logging.WARNING)
+
+    runner = None
+    api_base = args.api_base
+    if api_base is None:
+        runner, api_base = await start_mock_server(tokens=5)
+    server.chatbot_config = {"enabled": True, "api_key": "mock", "model_name": "mock-model", "api_base": api_base}
+    server.llm_router = LLMEndpointHelper.from_config(server.chatbot_config)
+    # 关闭回复缓存，保证每次请求都经过HTTP连接
+    server.llm_cache = LLMCacheHelper(capacity=0)
+    server.chatbot_tips = "你是一个友好的聊天助手。"
+
+    print(f"服务地址: {api_base}，每种情况 {args.requests} 次请求")
+    # 预热
+    await run_case(5, reuse_session=True)
+    report("每次新建会话", await run_case(args.requests, reuse_session=False))
+    report("共享会话", await run_case(args.requests, reuse_session=True))
+
+    if runner is not None:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        logging.shutdown()
+        shutil.rmtree(DATA_DIR, ignore_errors=True)
@@ -0,0 +1,271 @@
+"""
+@苹果派流式回复压力测试：N个客户端同时提问，经过真实的聊天服务器转发模拟大模型服务的流式输出
+
+脚本会在子进程中启动模拟大模型服务和聊天服务器（使用临时目录中的账户库和聊天记录，不影响正式数据），
+然后用N个WebSocket客户端登录并同时发送@苹果派问题，统计：
+    - 帧率：所有客户端每秒收到的sse_stream帧数（房间内每个客户端都会收到所有回复）
+    - 首字延迟：从发出问题到收到自己那条回复的第一个片段
+    - 端到端延迟：从发出问题到收到自己那条回复的end
+
+用法（在项目根目录运行）：
+    python benchmarks/bench_llm_streams.py --clients 20 --tokens 100 --tokens-per-second 50
+    python benchmarks/bench_llm_streams.py --clients 50 --rooms 5 --error-rate 0.1 --max-concurrent 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import websockets
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.join(ROOT_DIR, "src", "server")
+sys.path.insert(0, BENCH_DIR)
+
+from mock_llm_server import add_mock_arguments
+
+
+def free_port():
+    """获取一个空闲的本地端口"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(args):
+    """
+    子进程模式：在临时目录中运行聊天服务器，大模型配置指向模拟服务
+    """
+    # 导入server模块前指定数据目录，账户库、聊天记录和日志都写入临时目录，不影响正式数据
+    os.environ["CHAT_SERVER_DATA_DIR"] = args.workdir
+    sys.path.insert(0, SERVER_DIR)
+    import server
+
+    config = {
+        "enabled": True,
+        "api_key": "mock",
+        "model_name": "mock-model",
+        "api_base": args.api_base,
+        "max_concurrent_requests": args.max_concurrent,
+        "max_queue_size": args.max_queue,
+        "max_queue_per_user": args.max_queue,
+        "max_connections": max(args.max_concurrent, 20),
+        # 每个客户端的问题都不同，压测时关闭缓存和记忆，保证每个问题都经过模拟服务
+        "response_cache_size": 0,
+        "memory_scope": "off"
+    }
+
+    def load_config():
+        server.chatbot_config = config
+        server.chatbot_tips = "你是一个友好的聊天助手。"
+
+    server.load_chatbot_config = load_config
+    server.logger.setLevel("WARNING")
+    # 不启动天气、热搜和新闻等定时任务，压测期间只有聊天和大模型的流量
+    asyncio.run(server.main(host="127.0.0.1", port=args.port, background_jobs=False))
+
+
+async def wait_for_port(port, timeout=15):
+    """等待子进程开始监听端口"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return True
+        except OSError:
+            await asyncio.sleep(0.1)
+    return False
+
+
+async def connect_client(url, name, room):
+    """注册、登录并加入房间，返回websocket连接"""
+    websocket = await websockets.connect(url, max_size=None)
+    await websocket.send(json.dumps({"type": "register", "username": name, "password": "bench-password"}))
+    await websocket.send(json.dumps({"type": "login", "username": name, "password": "bench-password"}))
+    while True:
+        data = json.loads(await websocket.recv())
+        if data.get("type") == "login_response":
+            if not data.get("success", True):
+                raise RuntimeError(f"{name} 登录失败: {data.get('message')}")
+            break
+    if room:
+        await websocket.send(json.dumps({"type": "join_room", "room": room}))
+        while json.loads(await websocket.recv()).get("type") != "room_joined":
+            pass
+    return websocket
+
+
+class ClientStats:
+    """单个客户端的统计"""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.sent_at = None
+        self.first_token_at = None
+        self.end_at = None
+        self.error = None
+        self.reply = []
+
+
+async def run_client(websocket, stats, start_event, done_event):
+    """等待统一开始信号后提问，统计收到的帧直到自己的回复结束"""
+    await start_event.wait()
+    stats.sent_at = time.perf_counter()
+    await websocket.send(json.dumps({"type": "message", "message": f"@苹果派 {stats.name}的问题"}))
+    try:
+        while not done_event.is_set():
+            try:
+                raw = await asyncio.wait_for(websocket.recv(), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            data = json.loads(raw)
+            if data.get("type") == "error" and stats.end_at is None:
+                stats.error = data.get("message")
+                stats.end_at = time.perf_counter()
+                continue
+            if data.get("type") != "sse_stream":
+                continue
+            stats.frames += 1
+            if data.get("requester") != stats.name:
+                continue
+            if data.get("event_type") == "chunk":
+                if stats.first_token_at is None:
+                    stats.first_token_at = time.perf_counter()
+                stats.reply.append(data.get("message", ""))
+            elif data.get("event_type") == "end":
+                stats.end_at = time.perf_counter()
+                # 上游出错时服务器把错误提示作为回复内容发送
+                reply = "".join(stats.reply)
+                if reply.startswith("抱歉，调用大模型API时"):
+                    stats.error = reply
+    except websockets.ConnectionClosed as e:
+        stats.error = f"连接断开: {e}"
+
+
+def describe(name, values):
+    """格式化延迟分布（毫秒）"""
+    if not values:
+        return f"  {name:<8} 无数据"
+    values = sorted(values)
+    p95 = values[max(0, int(len(values) * 0.95) - 1)]
+    return (f"  {name:<8} 平均 {statistics.mean(values):8.1f} ms  中位数 {statistics.median(values):8.1f} ms  "
+            f"p95 {p95:8.1f} ms  最大 {values[-1]:8.1f} ms")
+
+
+async def run_benchmark(args):
+    mock_port = free_port()
+    server_port = free_port()
+    workdir = tempfile.mkdtemp(prefix="floritechat-bench-")
+    processes = []
+
+    mock_command = [
+        sys.executable, os.path.join(BENCH_DIR, "mock_llm_server.py"), "--port", str(mock_port),
+        "--tokens", str(args.tokens), "--token-text", args.token_text,
+        "--first-token-delay", str(args.first_token_delay), "--token-interval", str(args.token_interval),
+        "--tokens-per-second", str(args.tokens_per_second), "--chunk-tokens", str(args.chunk_tokens),
+        "--write-size", str(args.write_size), "--error-rate", str(args.error_rate),
+        "--error-status", str(args.error_status), "--disconnect-rate", str(args.disconnect_rate)
+    ]
+    if args.seed is not None:
+        mock_command += ["--seed", str(args.seed)]
+    server_command = [
+        sys.executable, os.path.abspath(__file__), "serve", "--workdir", workdir, "--port", str(server_port),
+        "--api-base", f"http://127.0.0.1:{mock_port}/v1",
+        "--max-concurrent", str(args.max_concurrent or args.clients), "--max-queue", str(args.clients)
+    ]
+
+    try:
+        processes.append(subprocess.Popen(mock_command, stdout=subprocess.DEVNULL))
+        processes.append(subprocess.Popen(server_command, stdout=subprocess.DEVNULL,
+                                          stderr=open(os.path.join(workdir, "server.err"), "w")))
+        if not await wait_for_port(mock_port) or not await wait_for_port(server_port):
+            print(f"服务启动失败，日志目录: {workdir}")
+            return
+
+        url = f"ws://127.0.0.1:{server_port}"
+        rooms = [f"bench-{i + 1}" for i in range(args.rooms)] if args.rooms > 1 else [None]
+        clients = []
+        for i in range(args.clients):
+            name = f"bench{i + 1}"
+            clients.append((await connect_client(url, name, rooms[i % len(rooms)]), ClientStats(name)))
+        print(f"{args.clients} 个客户端已登录（{len(rooms)} 个房间），上游并发上限 {args.max_concurrent or args.clients}，"
+              f"每个回复 {args.tokens} 个片段")
+
+        start_event = asyncio.Event()
+        done_event = asyncio.Event()
+        tasks = [asyncio.create_task(run_client(ws, stats, start_event, done_event)) for ws, stats in clients]
+        started_at = time.perf_counter()
+        start_event.set()
+
+        deadline = started_at + args.timeout
+        while time.perf_counter() < deadline:
+            if all(stats.end_at is not None or stats.error for _, stats in clients):
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started_at
+        done_event.set()
+        await asyncio.gather(*tasks)
+        for ws, _ in clients:
+            await ws.close()
+
+        all_stats = [stats for _, stats in clients]
+        frames = sum(stats.frames for stats in all_stats)
+        completed = [stats for stats in all_stats if stats.end_at is not None and not stats.error]
+        failed = [stats for stats in all_stats if stats.error]
+        unfinished = len(all_stats) - len(completed) - len(failed)
+        print(f"耗时 {elapsed:.2f} s，收到 {frames} 帧，{frames / elapsed:.0f} 帧/秒")
+        print(f"完成 {len(completed)} 个，出错 {len(failed)} 个，超时未完成 {unfinished} 个")
+        print(describe("首字延迟", [(s.first_token_at - s.sent_at) * 1000 for s in completed if s.first_token_at]))
+        print(describe("端到端", [(s.end_at - s.sent_at) * 1000 for s in completed]))
+        for stats in failed[:5]:
+            print(f"  {stats.name}: {stats.error}")
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{mock_port}/stats") as response:
+                mock_stats = await response.json()
+        print(f"模拟服务: 请求 {mock_stats['requests']} 次，注入错误 {mock_stats['errors']} 次，"
+              f"中途断开 {mock_stats['disconnects']} 次，输出 {mock_stats['tokens']} 个片段")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="@苹果派流式回复压力测试")
+    subparsers = parser.add_subparsers(dest="command")
+
+    serve_args = subparsers.add_parser("serve", help="（内部使用）在子进程中运行聊天服务器")
+    serve_args.add_argument("--workdir", required=True)
+    serve_args.add_argument("--port", type=int, required=True)
+    serve_args.add_argument("--api-base", required=True)
+    serve_args.add_argument("--max-concurrent", type=int, default=4)
+    serve_args.add_argument("--max-queue", type=int, default=50)
+
+    parser.add_argument("--clients", type=int, default=10, help="同时提问的客户端数量")
+    parser.add_argument("--rooms", type=int, default=1, help="把客户端平均分到几个房间")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="服务器的max_concurrent_requests，默认等于客户端数量")
+    parser.add_argument("--timeout", type=float, default=120, help="最长等待时间（秒）")
+    add_mock_arguments(parser)
+    parser.set_defaults(tokens=100, tokens_per_second=50)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args)
+    else:
+        asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
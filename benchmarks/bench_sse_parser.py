@@ -0,0 +1,255 @@
+"""
+大模型SSE流式响应解析基准测试：旧的逐行解析 vs SSEParserHelper增量解析
+
+fixtures目录下保存了录制的流式响应（gzip压缩的原始字节），测试时按随机大小切成网络数据块，
+通过aiohttp.StreamReader交给两种解析方式，比较吞吐量并核对解析出的文本是否一致。
+
+用法（在项目根目录运行）：
+    python benchmarks/bench_sse_parser.py run
+    python benchmarks/bench_sse_parser.py record --api-base http://127.0.0.1:8800/v1 --output benchmarks/fixtures/xxx.sse.gz
+    python benchmarks/bench_sse_parser.py generate-fixtures
+"""
+
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+import aiohttp
+from aiohttp.base_protocol import BaseProtocol
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+sys.path.insert(0, os.path.join(ROOT_DIR, "src", "server"))
+sys.path.insert(0, BENCH_DIR)
+
+from SSEParserHelper import SSEParserHelper
+from mock_llm_server import start_mock_server, build_chunk
+
+SAMPLE_TEXT = [
+    "你好", "！", "我是", "苹果派", "，", "很高兴", "为你", "解答", "问题", "。", "\n",
+    "Python", " 是一种", "解释型", "语言", "，", "常用于", "数据分析", "和", "Web开发", "。",
+    "今天", "天气", "晴朗", "，", "适合", "出门", "散步", "🍎", "😊", " the", " quick", " fox"
+]
+
+
+async def record_fixture(api_base, output, prompt, api_key="mock", model="mock-model"):
+    """
+    向OpenAI兼容服务发送一次流式请求，把原始响应字节保存为fixture
+
+    Args:
+        api_base: 服务地址
+        output: 保存路径（.sse.gz）
+        prompt: 用户问题
+    """
+    request_data = {"model": model, "messages": [{"role": "user", "content": prompt}], "stream": True}
+    headers = {"Authorization": f"Bearer {api_key}"}
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{api_base}/chat/completions", json=request_data, headers=headers) as response:
+            raw = await response.read()
+    with gzip.open(output, "wb") as f:
+        f.write(raw)
+    print(f"已录制 {output}: {len(raw) / 1024 / 1024:.2f} MB")
+
+
+def build_multiline_fixture(size_mb, seed=2024):
+    """
+    构造覆盖SSE规范中各种写法的响应：\\r\\n换行、注释心跳、event字段、
+    一个JSON被拆成多行data:
+
+    Args:
+        size_mb: 目标大小（MB）
+
+    Returns:
+        bytes: 原始响应字节
+    """
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    index = 0
+    while size < size_mb * 1024 * 1024:
+        text = "".join(rng.choice(SAMPLE_TEXT) for _ in range(rng.randint(1, 4)))
+        payload = json.dumps(build_chunk(text, "mock-model"), ensure_ascii=False, indent=1)
+        lines = [f"data: {line}" for line in payload.split("\n")]
+        event = "\r\n".join(lines) + "\r\n\r\n"
+        if index % 50 == 0:
+            event = ": keep-alive\r\n\r\n" + event
+        if index % 7 == 0:
+            event = "event: message\r\n" + event
+        encoded = event.encode("utf-8")
+        parts.append(encoded)
+        size += len(encoded)
+        index += 1
+    parts.append(b"data: [DONE]\r\n\r\n")
+    return b"".join(parts)
+
+
+async def generate_fixtures(size_mb):
+    """生成默认的fixture：一个从本地模拟服务录制，一个覆盖多行事件等写法"""
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    # 按目标大小估算片段数（每个事件约150字节）
+    runner, api_base = await start_mock_server(
+        tokens=int(size_mb * 1024 * 1024 / 150),
+        token_text="苹果派的回答🍎 "
+    )
+    try:
+        await record_fixture(api_base, os.path.join(FIXTURE_DIR, "openai_stream.sse.gz"), "介绍一下你自己")
+    finally:
+        await runner.cleanup()
+
+    output = os.path.join(FIXTURE_DIR, "multiline_crlf_stream.sse.gz")
+    raw = build_multiline_fixture(size_mb)
+    with gzip.open(output, "wb") as f:
+        f.write(raw)
+    print(f"已生成 {output}: {len(raw) / 1024 / 1024:.2f} MB")
+
+
+class FeedProtocol(BaseProtocol):
+    """没有真实连接的协议对象，让StreamReader认为连接仍然打开"""
+
+    @property
+    def connected(self):
+        return True
+
+
+def split_chunks(raw, max_chunk, seed=7):
+    """按随机大小切分数据块，模拟网络读到的数据不与行边界对齐"""
+    rng = random.Random(seed)
+    chunks = []
+    pos = 0
+    while pos < len(raw):
+        size = rng.randint(1, max_chunk)
+        chunks.append(raw[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def extract_text(json_str, pieces):
+    """从chat.completion.chunk中取出文本片段"""
+    chunk_data = json.loads(json_str)
+    if chunk_data.get("choices"):
+        text = chunk_data["choices"][0].get("delta", {}).get("content")
+        if text:
+            pieces.append(text)
+
+
+async def parse_line_based(reader):
+    """旧实现：逐行读取，按行解码、去空白、匹配data:前缀"""
+    full_response = ""
+    errors = 0
+    async for line in reader:
+        if line.strip():
+            line_str = line.decode("utf-8").strip()
+            if line_str == "data: [DONE]":
+                break
+            if line_str.startswith("data: "):
+                json_str = line_str[6:]
+                try:
+                    pieces = []
+                    extract_text(json_str, pieces)
+                    for text in pieces:
+                        full_response += text
+                except json.JSONDecodeError:
+                    errors += 1
+    return full_response, errors
+
+
+async def parse_incremental(reader):
+    """新实现：按数据块增量解析，片段收集到列表"""
+    parser = SSEParserHelper()
+    pieces = []
+    errors = 0
+    async for data in reader.iter_any():
+        for _, event_data in parser.feed(data):
+            if event_data == "[DONE]":
+                return "".join(pieces), errors
+            try:
+                extract_text(event_data, pieces)
+            except json.JSONDecodeError:
+                errors += 1
+    return "".join(pieces), errors
+
+
+async def run_parser(parse, chunks):
+    """
+    一边向StreamReader写入数据块一边解析，返回(耗时秒, 文本, 解析失败数)
+    """
+    loop = asyncio.get_running_loop()
+    reader = aiohttp.StreamReader(FeedProtocol(loop), 2 ** 16, loop=loop)
+
+    async def produce():
+        for chunk in chunks:
+            reader.feed_data(chunk)
+            await asyncio.sleep(0)
+        reader.feed_eof()
+
+    start = time.perf_counter()
+    producer = asyncio.create_task(produce())
+    text, errors = await parse(reader)
+    await producer
+    return time.perf_counter() - start, text, errors
+
+
+async def run_benchmark(fixtures, max_chunk, repeat):
+    for path in fixtures:
+        with gzip.open(path, "rb") as f:
+            raw = f.read()
+        chunks = split_chunks(raw, max_chunk)
+        size_mb = len(raw) / 1024 / 1024
+        print(f"\n{os.path.basename(path)}: {size_mb:.2f} MB，{len(chunks)} 个数据块（1~{max_chunk}字节）")
+
+        results = {}
+        for name, parse in (("逐行解析(旧)", parse_line_based), ("增量解析(新)", parse_incremental)):
+            timings = []
+            for _ in range(repeat):
+                elapsed, text, errors = await run_parser(parse, chunks)
+                timings.append(elapsed)
+            best = min(timings)
+            results[name] = text
+            print(f"  {name:<10} 最快 {best * 1000:8.1f} ms  {size_mb / best:7.1f} MB/s  "
+                  f"文本 {len(text)} 字符  解析失败 {errors} 个事件")
+
+        old_text, new_text = results.values()
+        print(f"  两种方式解析结果{'一致' if old_text == new_text else '不一致'}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="SSE流式响应解析基准测试")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser_args = subparsers.add_parser("run", help="运行基准测试（默认）")
+    run_parser_args.add_argument("--fixture", action="append", help="fixture路径，默认使用fixtures目录下全部文件")
+    run_parser_args.add_argument("--max-chunk", type=int, default=4096, help="数据块的最大字节数")
+    run_parser_args.add_argument("--repeat", type=int, default=3, help="每种方式重复次数，取最快一次")
+
+    record_args = subparsers.add_parser("record", help="从OpenAI兼容服务录制一次流式响应")
+    record_args.add_argument("--api-base", required=True)
+    record_args.add_argument("--api-key", default="mock")
+    record_args.add_argument("--model", default="mock-model")
+    record_args.add_argument("--prompt", default="介绍一下你自己")
+    record_args.add_argument("--output", required=True)
+
+    generate_args = subparsers.add_parser("generate-fixtures", help="重新生成默认fixture")
+    generate_args.add_argument("--size-mb", type=float, default=4)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        await record_fixture(args.api_base, args.output, args.prompt, args.api_key, args.model)
+    elif args.command == "generate-fixtures":
+        await generate_fixtures(args.size_mb)
+    else:
+        fixtures = getattr(args, "fixture", None) or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.sse.gz")))
+        if not fixtures:
+            print("没有找到fixture，先运行: python benchmarks/bench_sse_parser.py generate-fixtures")
+            return
+        await run_benchmark(fixtures, getattr(args, "max_chunk", 4096), getattr(args, "repeat", 3))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
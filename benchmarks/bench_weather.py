@@ -0,0 +1,141 @@
+"""
+@天气查询对事件循环的影响：旧的同步requests实现 vs WeatherHelper的aiohttp实现
+
+模拟天气API运行在独立线程的事件循环中（同步请求阻塞主循环时它仍能响应），
+主循环同时发起N个天气查询，另一个协程每隔几毫秒醒来一次，统计醒来比预期晚了多少（事件循环延迟）。
+事件循环被阻塞期间，服务器无法处理任何客户端的消息。
+之后再用同一批查询测试缓存和请求合并：统计实际发往上游的请求数和缓存命中率。
+
+用法（在项目根目录运行）：
+    python benchmarks/bench_weather.py --lookups 20 --delay 0.2
+    python benchmarks/bench_weather.py --lookups 50 --cities 3
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src", "server"))
+sys.path.insert(0, BENCH_DIR)
+
+from HttpSessionHelper import HttpSessionHelper
+from WeatherHelper import WeatherHelper, WeatherCache
+from mock_weather_server import start_mock_server
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+def start_mock_in_thread(delay):
+    """在后台线程的事件循环中启动模拟天气API，返回api_url"""
+    ready = threading.Event()
+    result = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        _, result["api_url"] = loop.run_until_complete(start_mock_server(delay=delay))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return result["api_url"]
+
+
+async def legacy_get_weather(api_url, city):
+    """旧实现：在协程中直接调用同步的requests并用eval解析"""
+    response = requests.request("GET", f"{api_url}?city={city}&key=mock",
+                                headers={"User-Agent": WeatherHelper.USER_AGENT}, data={})
+    weather_response = eval(response.text)
+    return WeatherHelper.restruct_weather_data(weather_response["data"])
+
+
+async def measure(lookup, cities, interval=0.005):
+    """
+    并发执行查询，同时测量事件循环延迟
+
+    Returns:
+        tuple: (耗时秒数, 延迟样本列表（毫秒）)
+    """
+    lags = []
+    running = True
+
+    async def sampler():
+        while running:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+    sampler_task = asyncio.create_task(sampler())
+    await asyncio.sleep(interval * 2)
+    started_at = time.perf_counter()
+    await asyncio.gather(*(lookup(city) for city in cities))
+    elapsed = time.perf_counter() - started_at
+    running = False
+    await sampler_task
+    return elapsed, lags
+
+
+def report(name, elapsed, lags):
+    lags = sorted(lags)
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+    print(f"  {name:<10} 总耗时 {elapsed * 1000:8.1f} ms  事件循环延迟: 平均 {statistics.mean(lags or [0]):7.1f} ms  "
+          f"p99 {p99:7.1f} ms  最大 {max(lags or [0]):7.1f} ms")
+
+
+async def run_benchmark(args):
+    api_url = start_mock_in_thread(args.delay)
+    WeatherHelper._config = {"key": "mock", "api_url": api_url}
+    cities = [f"城市{i % args.cities}" for i in range(args.lookups)]
+    print(f"{args.lookups} 个并发查询（{args.cities} 个城市），模拟API延迟 {args.delay * 1000:.0f} ms")
+
+    if requests is not None:
+        elapsed, lags = await measure(lambda city: legacy_get_weather(api_url, city), cities)
+        report("requests", elapsed, lags)
+    else:
+        print("  未安装requests，跳过旧实现")
+
+    async def lookup(city):
+        success, data = await WeatherHelper.get_weather_info(city)
+        assert success and data["city"] == city, data
+
+    try:
+        # 关闭缓存（同一城市的并发查询仍会合并为一次上游请求）
+        WeatherHelper._cache = WeatherCache(capacity=0)
+        elapsed, lags = await measure(lookup, cities)
+        report("aiohttp", elapsed, lags)
+
+        # 打开缓存：第一轮并发查询中相同城市的请求被合并，第二轮全部命中缓存
+        WeatherHelper._cache = WeatherCache()
+        WeatherHelper.upstream_calls = WeatherHelper.coalesced = 0
+        for round_name in ("第一轮", "第二轮"):
+            calls_before = WeatherHelper.upstream_calls
+            elapsed, lags = await measure(lookup, cities)
+            report(f"缓存{round_name}", elapsed, lags)
+            print(f"  {'':<10} 上游请求 {WeatherHelper.upstream_calls - calls_before} 次")
+        stats = WeatherHelper.stats()
+        print(f"  合并的查询 {stats['coalesced']} 个，缓存命中率 {stats['hit_rate']:.0%}")
+    finally:
+        await HttpSessionHelper.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="@天气查询的事件循环延迟测试")
+    parser.add_argument("--lookups", type=int, default=20, help="并发查询数")
+    parser.add_argument("--cities", type=int, default=20, help="查询的不同城市数")
+    parser.add_argument("--delay", type=float, default=0.2, help="模拟API的响应延迟（秒）")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+本地模拟的OpenAI兼容大模型服务（/chat/completions）
+
+用于在不调用付费API的情况下测试call_llm_api和SSE流式转发。
+可以配置输出速度、首字延迟、每个事件包含的片段数、写入块大小，以及按比例注入错误。
+
+用法：
+    python benchmarks/mock_llm_server.py --port 8800 --tokens 200 --tokens-per-second 50 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from aiohttp import web
+
+
+def build_chunk(text, model):
+    """构造一个流式响应片段（chat.completion.chunk）"""
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]
+    }
+
+
+def create_app(tokens=20, token_text="你好", first_token_delay=0.0, token_interval=0.0,
+               tokens_per_second=0, chunk_tokens=1, write_size=0,
+               error_rate=0.0, error_status=500, disconnect_rate=0.0, seed=None):
+    """
+    创建模拟服务
+
+    Args:
+        tokens: 每个回复的片段数量
+        token_text: 每个片段的文本
+        first_token_delay: 首个片段之前的等待时间（秒）
+        token_interval: 片段之间的间隔（秒）
+        tokens_per_second: 输出速度（片段/秒），大于0时代替token_interval
+        chunk_tokens: 每个SSE事件包含的片段数
+        write_size: 每次写入的字节数，大于0时把响应按该大小切开写出（事件会跨写入边界）
+        error_rate: 直接返回错误状态码的请求比例
+        error_status: 注入错误时返回的HTTP状态码
+        disconnect_rate: 输出到一半时断开连接的请求比例
+        seed: 随机数种子，便于复现错误注入
+
+    Returns:
+        web.Application: aiohttp应用
+    """
+    app = web.Application()
+    app["stats"] = {"requests": 0, "errors": 0, "disconnects": 0, "tokens": 0}
+    rng = random.Random(seed)
+    if tokens_per_second > 0:
+        token_interval = 1.0 / tokens_per_second
+    chunk_tokens = max(1, chunk_tokens)
+
+    async def write_data(response, data):
+        """按write_size切开写出，模拟网络分包"""
+        if write_size <= 0:
+            await response.write(data)
+            return
+        for start in range(0, len(data), write_size):
+            await response.write(data[start:start + write_size])
+
+    async def chat_completions(request):
+        stats = app["stats"]
+        stats["requests"] += 1
+        body = await request.json()
+        model = body.get("model", "mock-model")
+
+        if error_rate and rng.random() < error_rate:
+            stats["errors"] += 1
+            return web.json_response(
+                {"error": {"message": "mock injected error", "type": "server_error"}},
+                status=error_status
+            )
+
+        if not body.get("stream"):
+            if first_token_delay:
+                await asyncio.sleep(first_token_delay)
+            stats["tokens"] += tokens
+            return web.json_response({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": token_text * tokens}, "finish_reason": "stop"}]
+            })
+
+        disconnect_at = rng.randint(1, max(1, tokens - 1)) if disconnect_rate and rng.random() < disconnect_rate else None
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        try:
+            if first_token_delay:
+                await asyncio.sleep(first_token_delay)
+            sent = 0
+            while sent < tokens:
+                if sent and token_interval:
+                    await asyncio.sleep(token_interval * chunk_tokens)
+                if disconnect_at is not None and sent >= disconnect_at:
+                    # 模拟上游中途断开：不发送[DONE]直接关闭连接
+                    stats["disconnects"] += 1
+                    request.transport.close()
+                    return response
+                count = min(chunk_tokens, tokens - sent)
+                chunk = build_chunk(token_text * count, model)
+                await write_data(response, f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                sent += count
+                stats["tokens"] += count
+            await write_data(response, b"data: [DONE]\n\n")
+            await response.write_eof()
+        except (ConnectionResetError, asyncio.CancelledError):
+            # 客户端提前断开（例如对冲请求被取消）
+            pass
+        return response
+
+    async def get_stats(request):
+        return web.json_response(app["stats"])
+
+    app.router.add_post("/chat/completions", chat_completions)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+async def start_mock_server(host="127.0.0.1", port=0, **options):
+    """
+    在当前事件循环中启动模拟服务
+
+    Args:
+        host: 监听地址
+        port: 监听端口，0表示随机端口
+        **options: 传给create_app的参数
+
+    Returns:
+        tuple: (runner, api_base) - 用于关闭服务的runner和可写入chatbot配置的api_base
+    """
+    app = create_app(**options)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}/v1"
+
+
+def add_mock_arguments(parser):
+    """添加模拟服务的命令行参数（基准测试脚本共用）"""
+    parser.add_argument("--tokens", type=int, default=20, help="每个回复的片段数量")
+    parser.add_argument("--token-text", default="你好", help="每个片段的文本")
+    parser.add_argument("--first-token-delay", type=float, default=0.0, help="首个片段之前的等待时间（秒）")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="片段之间的间隔（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="输出速度（片段/秒），设置后代替--token-interval")
+    parser.add_argument("--chunk-tokens", type=int, default=1, help="每个SSE事件包含的片段数")
+    parser.add_argument("--write-size", type=int, default=0, help="每次写入的字节数，0表示每个事件写一次")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误状态码的请求比例（0~1）")
+    parser.add_argument("--error-status", type=int, default=500, help="注入错误时的HTTP状态码")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="输出到一半时断开连接的请求比例（0~1）")
+    parser.add_argument("--seed", type=int, default=None, help="错误注入的随机数种子")
+
+
+def mock_options(args):
+    """从命令行参数中取出create_app的参数"""
+    return {
+        "tokens": args.tokens,
+        "token_text": args.token_text,
+        "first_token_delay": args.first_token_delay,
+        "token_interval": args.token_interval,
+        "tokens_per_second": args.tokens_per_second,
+        "chunk_tokens": args.chunk_tokens,
+        "write_size": args.write_size,
+        "error_rate": args.error_rate,
+        "error_status": args.error_status,
+        "disconnect_rate": args.disconnect_rate,
+        "seed": args.seed
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟的OpenAI兼容大模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    print(f"模拟大模型服务已启动: http://{args.host}:{args.port}/v1（统计信息: /stats）")
+    web.run_app(create_app(**mock_options(args)), host=args.host, port=args.port, print=None)
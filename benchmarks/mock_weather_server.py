@@ -0,0 +1,100 @@
+"""
+本地模拟的天气API（v2.xxapi.cn/api/weather）
+
+用于在不消耗天气API额度的情况下测试WeatherHelper。
+可以配置响应延迟，城市名中包含"不存在"时按API的方式返回错误码。
+
+用法：
+    python benchmarks/mock_weather_server.py --port 8801 --delay 0.3
+然后在LittleAPIConfig.json中加上 "api_url": "http://127.0.0.1:8801/api/weather"
+"""
+
+import argparse
+import asyncio
+import json
+from collections import Counter
+from aiohttp import web
+
+WEEKDAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+WEATHERS = ["晴", "多云", "阴", "小雨", "雷阵雨", "小雪", "雾"]
+
+
+def build_weather(city):
+    """构造一周的天气数据，格式与xxapi一致"""
+    seed = sum(ord(ch) for ch in city)
+    days = []
+    for index, weekday in enumerate(WEEKDAYS):
+        days.append({
+            "date": weekday,
+            "weather": WEATHERS[(seed + index) % len(WEATHERS)],
+            "temperature": f"{10 + (seed + index * 3) % 20}℃",
+            "air_quality": "良",
+            "wind": f"北风{1 + index % 3}级"
+        })
+    return {"city": city, "data": days}
+
+
+def create_app(delay=0.0):
+    """
+    创建模拟服务
+
+    Args:
+        delay: 每个请求的响应延迟（秒）
+
+    Returns:
+        web.Application: aiohttp应用
+    """
+    app = web.Application()
+    app["requests"] = Counter()
+
+    async def weather(request):
+        city = request.query.get("city", "")
+        app["requests"][city] += 1
+        if delay:
+            await asyncio.sleep(delay)
+        if not city or "不存在" in city:
+            body = {"code": -2, "msg": "城市不存在", "data": None}
+        else:
+            body = {"code": 200, "msg": "数据请求成功", "data": build_weather(city)}
+        # 真实接口的Content-Type并不总是application/json
+        return web.Response(text=json.dumps(body, ensure_ascii=False), content_type="text/html")
+
+    async def get_stats(request):
+        counter = app["requests"]
+        return web.json_response({"requests": sum(counter.values()), "cities": dict(counter)})
+
+    app.router.add_get("/api/weather", weather)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+async def start_mock_server(host="127.0.0.1", port=0, **options):
+    """
+    在当前事件循环中启动模拟服务
+
+    Args:
+        host: 监听地址
+        port: 监听端口，0表示随机端口
+        **options: 传给create_app的参数
+
+    Returns:
+        tuple: (runner, api_url) - 用于关闭服务的runner和可写入LittleAPIConfig.json的api_url
+    """
+    app = create_app(**options)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}/api/weather"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟的天气API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8801)
+    parser.add_argument("--delay", type=float, default=0.0, help="每个请求的响应延迟（秒）")
+    args = parser.parse_args()
+
+    print(f"模拟天气API已启动: http://{args.host}:{args.port}/api/weather（统计信息: /stats）")
+    web.run_app(create_app(delay=args.delay), host=args.host, port=args.port, print=None)
@@ -323,6 +323,8 @@ function connectToServer() {
             elements.connectionStatus.className = 'status online';
             reconnectAttempts = 0; // 重置重连计数
             lastHeartbeatTime = Date.now();
+            // 断线前未完成的分页请求不会再有回复，登录后收到的是最新的聊天记录
+            loadingOlderHistory = false;
             
             // 直接使用本地存储的认证状态
             isAuthenticated = localStorage.getItem('authenticated') === 'true';
@@ -525,10 +527,21 @@ function startHeartbeat() {
     }, 10000);
 }
 
+// 当前所在的房间，序号只在房间内唯一
+let currentRoom = 'lobby';
+// 当前房间已显示的聊天记录序号，用于重连后补发记录时去重，切换房间时清空
+let seenSeqs = new Set();
+// 当前房间已显示的最早一条聊天记录的序号，用于向前分页
+let oldestSeq = null;
+// 是否正在等待更早的聊天记录
+let loadingOlderHistory = false;
+
 // 存储流式响应消息的容器
 let streamingMessages = {};
 // 存储当前活跃的流式对话气泡
 let activeStreamingBubbles = {};
+// 进行中的SSE流式回复，按stream_id区分：{ responseId, nextSeq, pending }
+let sseStreams = {};
 
 // 处理接收到的消息
 function handleMessage(data) {
@@ -537,6 +550,15 @@ function handleMessage(data) {
     
     console.log('进入handleMessage函数，处理消息类型:', data.type);
     
+    // 记录已显示的聊天记录序号
+    if (typeof data.seq === 'number') {
+        if (seenSeqs.has(data.seq)) return;
+        seenSeqs.add(data.seq);
+        if (oldestSeq === null || data.seq < oldestSeq) {
+            oldestSeq = data.seq;
+        }
+    }
+    
     // 特殊处理流式消息片段
     if (data.type === 'message' && data.stream_id && data.stream_type) {
         handleStreamingMessage(data);
@@ -544,13 +566,22 @@ function handleMessage(data) {
     }
     
     switch (data.type) {
+        case 'history':
+            handleHistoryMessage(data);
+            break;
+        case 'room_joined':
+            // 切换房间后序号重新开始，清空上一个房间的记录
+            switchRoom(data.room);
+            showSystemMessage(data.message);
+            break;
         case 'image_preload':
             // 处理图片预加载消息，不显示在聊天界面
             console.log('处理图片预加载消息:', data.image_id, data.image_path);
             // 如果有image_path，尝试预加载图片
             if (data.image_path) {
                 const img = new Image();
-                img.src = data.image_path;
+                // 与showNewsCard使用相同的绝对路径，预加载的图片才能被浏览器缓存复用
+                img.src = data.image_path.startsWith('/') ? data.image_path : '/' + data.image_path;
                 
                 // 图片加载成功回调
                 img.onload = () => {
@@ -638,7 +669,7 @@ function handleMessage(data) {
             break;
         case 'hot_search':
             // 处理热搜消息
-            showHotSearchMessage(data.message, data.user || '热搜榜', data.avatar || '🔥', data.time);
+            showHotSearchMessage(data.message, data.user || '热搜榜', data.avatar || '🔥', data.time, data.updated_at);
             break;
         case 'error':
             showError(data.message || '未知错误');
@@ -691,6 +722,87 @@ function handleMessage(data) {
     }
 }
 
+// 切换到新的房间：清空聊天区域和已显示的序号
+function switchRoom(room) {
+    if (!room || room === currentRoom) return;
+    currentRoom = room;
+    seenSeqs = new Set();
+    oldestSeq = null;
+    loadingOlderHistory = false;
+    elements.chatMessages.innerHTML = '';
+}
+
+// 处理聊天记录消息：登录、切换房间或重连时的最新记录追加到末尾，分页加载的更早记录插入到顶部
+function handleHistoryMessage(data) {
+    if (data.room && data.room !== currentRoom) {
+        switchRoom(data.room);
+    }
+    if (!Array.isArray(data.messages)) return;
+    
+    // 跳过已经显示过的消息
+    const unseen = data.messages.filter(msg => typeof msg.seq === 'number' && !seenSeqs.has(msg.seq));
+    const isOlderPage = loadingOlderHistory;
+    loadingOlderHistory = false;
+    
+    if (isOlderPage) {
+        prependOlderMessages(unseen);
+    } else {
+        unseen.forEach(msg => handleMessage(msg));
+        if (unseen.length > 0) {
+            showSystemMessage(`—— 以上为 ${unseen.length} 条聊天记录 ——`);
+        }
+    }
+    updateLoadMoreButton(data.has_more);
+}
+
+// 把更早的聊天记录插入到聊天区域顶部，并保持当前的滚动位置
+function prependOlderMessages(messages) {
+    const container = elements.chatMessages;
+    const distanceFromBottom = container.scrollHeight - container.scrollTop;
+    const firstExisting = Array.from(container.children).find(child => !child.classList.contains('load-more-btn'));
+    const renderedBefore = container.children.length;
+    
+    // 消息的渲染函数都追加到末尾，渲染完成后再整体移到原有消息之前
+    messages.forEach(msg => handleMessage(msg));
+    const rendered = Array.from(container.children).slice(renderedBefore);
+    rendered.forEach(node => container.insertBefore(node, firstExisting || null));
+    
+    container.scrollTop = container.scrollHeight - distanceFromBottom;
+}
+
+// 根据是否还有更早的记录显示或移除"加载更早的消息"按钮
+function updateLoadMoreButton(hasMore) {
+    let loadMoreBtn = elements.chatMessages.querySelector('.load-more-btn');
+    if (!hasMore || oldestSeq === null) {
+        if (loadMoreBtn) loadMoreBtn.remove();
+        return;
+    }
+    if (!loadMoreBtn) {
+        loadMoreBtn = document.createElement('button');
+        loadMoreBtn.className = 'load-more-btn';
+        loadMoreBtn.onclick = requestOlderHistory;
+    }
+    loadMoreBtn.textContent = '加载更早的消息';
+    loadMoreBtn.disabled = false;
+    elements.chatMessages.insertBefore(loadMoreBtn, elements.chatMessages.firstChild);
+}
+
+// 请求当前房间更早的聊天记录
+function requestOlderHistory() {
+    if (loadingOlderHistory || oldestSeq === null) return;
+    if (!socket || socket.readyState !== WebSocket.OPEN) {
+        showError('连接已断开，无法加载聊天记录');
+        return;
+    }
+    loadingOlderHistory = true;
+    const loadMoreBtn = elements.chatMessages.querySelector('.load-more-btn');
+    if (loadMoreBtn) {
+        loadMoreBtn.textContent = '加载中...';
+        loadMoreBtn.disabled = true;
+    }
+    socket.send(JSON.stringify({ type: 'history_request', before_seq: oldestSeq, limit: 50 }));
+}
+
 // 处理流式消息片段
 function handleStreamingMessage(data) {
     const streamId = data.stream_id;
@@ -791,34 +903,58 @@ function finalizeStreamMessage(streamId) {
 
 // 处理SSE流式响应消息
 // 处理新格式的SSE流式消息（带有event_type字段）
+// 同一房间可能同时有多个流式回复，按stream_id分别显示，按stream_seq排序并去重
 function handleSseStreamMessage(data) {
-    // 使用当前时间戳作为响应ID，确保唯一性
-    const responseId = 'sse_' + Date.now();
+    // 不带stream_id的旧服务端同一时间只有一个流
+    const streamId = data.stream_id || 'legacy';
+    const seq = typeof data.stream_seq === 'number' ? data.stream_seq : null;
+    let stream = sseStreams[streamId];
+    
+    if (stream && data.event_type === 'start' && !data.stream_id) {
+        // 旧服务端开始了新的流，结束上一个
+        finalizeStreamingMessage(stream.responseId);
+        delete sseStreams[streamId];
+        stream = null;
+    }
+    
+    if (!stream) {
+        if (data.event_type === 'end' && seq === null) return;
+        // 中途加入房间时可能收不到start，从收到的第一条消息开始显示
+        const responseId = 'sse_' + streamId + '_' + Date.now();
+        createStreamingMessage(responseId, '苹果派', '', data.requester);
+        stream = { responseId: responseId, nextSeq: seq === null ? 0 : seq, pending: new Map() };
+        sseStreams[streamId] = stream;
+    }
     
+    if (seq === null) {
+        applySseStreamEvent(streamId, stream, data);
+        return;
+    }
+    // 丢弃重复的消息，暂存提前到达的消息
+    if (seq < stream.nextSeq) return;
+    stream.pending.set(seq, data);
+    while (sseStreams[streamId] === stream && stream.pending.has(stream.nextSeq)) {
+        const event = stream.pending.get(stream.nextSeq);
+        stream.pending.delete(stream.nextSeq);
+        stream.nextSeq++;
+        applySseStreamEvent(streamId, stream, event);
+    }
+}
+
+// 按顺序处理某个流的一条SSE消息
+function applySseStreamEvent(streamId, stream, data) {
     switch (data.event_type) {
         case 'start':
-            // 开始新的流式响应
-            // 由于服务端没有传递原始消息，我们可以使用占位符
-            createStreamingMessage(responseId, '苹果派', '');
+            // 气泡已在收到第一条消息时创建
             break;
         case 'chunk':
             // 更新流式响应内容
-            // 查找最近创建的流式消息
-            const lastStreamId = Object.keys(streamingMessages).pop();
-            if (lastStreamId && streamingMessages[lastStreamId]) {
-                updateStreamingMessage(lastStreamId, data.message || '');
-            } else {
-                // 如果没有找到现有的流式消息，创建一个新的
-                createStreamingMessage(responseId, '苹果派', '');
-                updateStreamingMessage(responseId, data.message || '');
-            }
+            updateStreamingMessage(stream.responseId, data.message || '');
             break;
         case 'end':
             // 结束流式响应
-            const activeStreamId = Object.keys(streamingMessages).pop();
-            if (activeStreamId && streamingMessages[activeStreamId]) {
-                finalizeStreamingMessage(activeStreamId);
-            }
+            finalizeStreamingMessage(stream.responseId);
+            delete sseStreams[streamId];
             break;
         default:
             console.log('未知的SSE事件类型:', data.event_type);
@@ -849,7 +985,7 @@ function handleStreamMessage(data) {
 }
 
 // 创建流式消息容器
-function createStreamingMessage(responseId, sender, originalMessage) {
+function createStreamingMessage(responseId, sender, originalMessage, requester) {
     const messageDiv = document.createElement('div');
     messageDiv.id = `streaming-${responseId}`;
     messageDiv.className = 'message other streaming';
@@ -858,7 +994,7 @@ function createStreamingMessage(responseId, sender, originalMessage) {
     const messageHtml = `
         <div class="message-header">
             <div class="message-avatar">${sender.charAt(0).toUpperCase()}</div>
-            <span class="message-sender">${escapeHtml(sender)}</span>
+            <span class="message-sender">${escapeHtml(sender)}${requester ? ' · 回复 ' + escapeHtml(requester) : ''}</span>
         </div>
         <div class="message-content">
             <div class="streaming-content">正在思考...</div>
@@ -892,7 +1028,7 @@ function updateStreamingMessage(responseId, content) {
         }
         
         // 处理@提及
-        const processedContent = content.replace(/@([^\s]+)/g, '<span class="mention">@$1</span>');
+        const processedContent = escapeHtml(content).replace(/@([^\s]+)/g, '<span class="mention">@$1</span>');
         contentElement.innerHTML += processedContent;
     }
     
@@ -925,8 +1061,10 @@ function finalizeStreamingMessage(responseId) {
 }
 
 // 显示热搜消息
-function showHotSearchMessage(message, user, avatar, time) {
+function showHotSearchMessage(message, user, avatar, time, updatedAt) {
     const timestamp = time || new Date().toLocaleTimeString();
+    // 服务器在后台定期刷新热搜榜，显示榜单的更新时间
+    const updatedLabel = updatedAt ? `<span class="hot-search-updated">更新于 ${escapeHtml(updatedAt)}</span>` : '';
     
     // 创建热搜卡片容器
     const hotSearchCard = document.createElement('div');
@@ -938,6 +1076,7 @@ function showHotSearchMessage(message, user, avatar, time) {
     header.innerHTML = `
         <div class="hot-search-avatar">${avatar}</div>
         <span class="hot-search-user">${escapeHtml(user)}</span>
+        ${updatedLabel}
         <span class="message-time">${timestamp}</span>
     `;
     
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger("ChatServer")
+
+
+class ChatHistoryHelper:
+    """
+    聊天记录存储（只追加）
+
+    消息先进入内存队列，由后台任务按固定间隔批量写入SQLite（组提交），
+    广播路径上只做内存操作，不等待磁盘。读取按(room, seq)主键索引分页。
+    """
+
+    def __init__(self, db_path=None, flush_interval=0.05, max_batch=500):
+        """
+        初始化聊天记录存储
+
+        Args:
+            db_path: 数据库文件路径，默认为服务器目录下的chat_history.db
+            flush_interval: 组提交间隔（秒）
+            max_batch: 队列达到该长度时立即提交
+        """
+        self.db_path = db_path or os.path.join(os.path.dirname(__file__), "chat_history.db")
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        # 等待写入的消息：(room, seq, sender, type, created_at, payload)
+        self._pending = []
+        # 正在写入磁盘的批次，读取时同样可见
+        self._inflight = []
+        # 每个房间下一条消息的序号
+        self._next_seq = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._flush_task = None
+        self._closing = False
+        self._conn = None
+        self.init_database()
+
+    def init_database(self):
+        """
+        创建消息表并读取各房间当前的最大序号
+        """
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 组提交已经把写入合并成批，NORMAL在WAL模式下不会损坏数据库
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                room TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                sender TEXT,
+                type TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (room, seq)
+            ) WITHOUT ROWID
+        ''')
+        self._conn.commit()
+        for room, max_seq in self._conn.execute("SELECT room, MAX(seq) FROM messages GROUP BY room"):
+            self._next_seq[room] = max_seq + 1
+        logger.info(f"聊天记录库初始化完成: {self.db_path}，房间数: {len(self._next_seq)}")
+
+    def append(self, room, message):
+        """
+        追加一条消息（只写内存，由后台任务批量落盘）
+
+        Args:
+            room: 房间名称
+            message: 已完整构造的消息对象，会写入seq字段
+
+        Returns:
+            int: 消息在房间内的序号
+        """
+        room = room or "lobby"
+        seq = self._next_seq.get(room, 1)
+        self._next_seq[room] = seq + 1
+        message["seq"] = seq
+        self._pending.append((
+            room,
+            seq,
+            message.get("sender") or message.get("user"),
+            message.get("type", "message"),
+            time.time(),
+            json.dumps(message, ensure_ascii=False)
+        ))
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return seq
+
+    async def start(self):
+        """启动后台组提交任务"""
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+            logger.info(f"聊天记录组提交任务已启动，间隔: {self.flush_interval}秒")
+
+    async def close(self):
+        """停止后台任务，写入剩余消息并关闭数据库"""
+        if self._flush_task is not None:
+            # 不直接cancel，避免打断正在线程中执行的写入
+            self._closing = True
+            self._wakeup.set()
+            await self._flush_task
+            self._flush_task = None
+        await self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        logger.info("聊天记录库已关闭")
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """
+        把当前队列中的消息在一个事务内写入数据库
+
+        Returns:
+            int: 写入的消息数量
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            self._inflight, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._write_batch, self._inflight)
+                return len(self._inflight)
+            except Exception as e:
+                logger.error(f"写入聊天记录失败，将在下次提交时重试: {str(e)}")
+                self._pending = self._inflight + self._pending
+                return 0
+            finally:
+                self._inflight = []
+
+    def _write_batch(self, batch):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages (room, seq, sender, type, created_at, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                batch
+            )
+
+    def _read_rows(self, room, before_seq, limit):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if before_seq is None:
+                cursor = conn.execute(
+                    "SELECT seq, payload FROM messages WHERE room = ? ORDER BY seq DESC LIMIT ?",
+                    (room, limit)
+                )
+            else:
+                cursor = conn.execute(
+                    "SELECT seq, payload FROM messages WHERE room = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                    (room, before_seq, limit)
+                )
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    async def get_history(self, room, before_seq=None, limit=50):
+        """
+        分页读取房间的聊天记录
+
+        Args:
+            room: 房间名称
+            before_seq: 只返回序号小于该值的消息，None表示从最新开始
+            limit: 最多返回的条数
+
+        Returns:
+            tuple: (messages, has_more) - 按序号升序排列的消息列表，是否还有更早的消息
+        """
+        room = room or "lobby"
+        limit = max(1, min(int(limit), 200))
+        # 尚未落盘的消息序号一定大于磁盘上的消息，先从内存中取
+        unflushed = [
+            (seq, payload) for r, seq, _, _, _, payload in self._inflight + self._pending
+            if r == room and (before_seq is None or seq < before_seq)
+        ]
+        rows = unflushed[-limit:]
+        missing = limit - len(rows)
+        if missing > 0:
+            disk_before = rows[0][0] if rows else before_seq
+            disk_rows = await asyncio.to_thread(self._read_rows, room, disk_before, missing)
+            rows = disk_rows[::-1] + rows
+        # 序号从1开始连续分配，第一条不是1就说明还有更早的消息
+        has_more = bool(rows) and rows[0][0] > 1
+        return [json.loads(payload) for _, payload in rows], has_more
+
+    def get_last_seq(self, room):
+        """
+        获取房间最新一条消息的序号
+
+        Args:
+            room: 房间名称
+
+        Returns:
+            int: 序号，房间没有消息时为0
+        """
+        return self._next_seq.get(room or "lobby", 1) - 1
@@ -0,0 +1,185 @@
+import re
+from collections import OrderedDict, deque
+
+
+class ConversationMemoryHelper:
+    """
+    @苹果派的对话记忆
+
+    每个会话（按用户或按房间）保存最近几轮问答，总token数超过预算时从最早的一轮开始裁剪；
+    开启摘要时，被裁剪的问答会交给摘要任务，压缩成一段摘要放在历史最前面。
+    会话数量由LRU限制，最久没有对话的会话最先被淘汰。
+    """
+
+    # 中日韩文字及全角符号，大约一个字一个token
+    WIDE_CHAR_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+    # 每条消息的格式开销（role等字段）
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, max_tokens=1000, max_conversations=500, summarize=False, summary_tokens=200):
+        """
+        初始化对话记忆
+
+        Args:
+            max_tokens: 每个会话保留的历史（含摘要）的token预算，0表示不保留历史
+            max_conversations: 最多保留的会话数
+            summarize: 是否把裁剪掉的问答压缩成摘要
+            summary_tokens: 摘要的token上限
+        """
+        self.max_tokens = max_tokens
+        self.max_conversations = max_conversations
+        self.summarize = summarize
+        self.summary_tokens = summary_tokens
+        self._conversations = OrderedDict()
+        self.evictions = 0
+        self.trimmed_turns = 0
+
+    @property
+    def enabled(self):
+        return self.max_tokens > 0 and self.max_conversations > 0
+
+    @staticmethod
+    def estimate_tokens(text):
+        """
+        估算文本的token数（不依赖具体模型的分词器）
+
+        中日韩文字按每字1个token，其余字符按每4个字符1个token计算。
+
+        Args:
+            text: 文本
+
+        Returns:
+            int: 估算的token数
+        """
+        wide = len(ConversationMemoryHelper.WIDE_CHAR_PATTERN.findall(text))
+        return wide + (len(text) - wide + 3) // 4 + ConversationMemoryHelper.MESSAGE_OVERHEAD
+
+    def get_messages(self, key):
+        """
+        获取会话历史，格式与chat/completions的messages一致
+
+        Args:
+            key: 会话键
+
+        Returns:
+            list: 历史消息列表（摘要作为一条system消息放在最前面）
+        """
+        if not self.enabled or key is None:
+            return []
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            return []
+        self._conversations.move_to_end(key)
+
+        messages = []
+        if conversation["summary"]:
+            messages.append({"role": "system", "content": f"此前对话的摘要：{conversation['summary']}"})
+        for user_text, assistant_text, _ in conversation["turns"]:
+            messages.append({"role": "user", "content": user_text})
+            messages.append({"role": "assistant", "content": assistant_text})
+        return messages
+
+    def add_turn(self, key, user_text, assistant_text):
+        """
+        记录一轮问答，超出预算时裁剪最早的问答
+
+        Args:
+            key: 会话键
+            user_text: 用户问题
+            assistant_text: 回复
+
+        Returns:
+            bool: 有被裁剪的问答等待摘要时返回True
+        """
+        if not self.enabled or key is None:
+            return False
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            conversation = {"summary": "", "summary_tokens": 0, "turns": deque(), "tokens": 0, "pending": []}
+            self._conversations[key] = conversation
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._conversations.move_to_end(key)
+
+        tokens = self.estimate_tokens(user_text) + self.estimate_tokens(assistant_text)
+        conversation["turns"].append((user_text, assistant_text, tokens))
+        conversation["tokens"] += tokens
+        self._trim(conversation)
+        return bool(conversation["pending"])
+
+    def _trim(self, conversation, summarize=True):
+        """从最早的问答开始裁剪，直到总token数不超过预算"""
+        while conversation["tokens"] > self.max_tokens and conversation["turns"]:
+            user_text, assistant_text, tokens = conversation["turns"].popleft()
+            conversation["tokens"] -= tokens
+            self.trimmed_turns += 1
+            if self.summarize and summarize:
+                conversation["pending"].append((user_text, assistant_text))
+
+    def take_pending(self, key):
+        """
+        取出等待摘要的问答
+
+        Args:
+            key: 会话键
+
+        Returns:
+            tuple: (当前摘要, 问答列表)，没有等待摘要的问答时列表为空
+        """
+        conversation = self._conversations.get(key)
+        if conversation is None or not conversation["pending"]:
+            return "", []
+        pending = conversation["pending"]
+        conversation["pending"] = []
+        return conversation["summary"], pending
+
+    def set_summary(self, key, summary):
+        """
+        更新会话摘要，超出摘要上限的部分会被截断
+
+        Args:
+            key: 会话键
+            summary: 新的摘要
+        """
+        conversation = self._conversations.get(key)
+        if conversation is None:
+            return
+        summary = summary.strip()
+        while summary and self.estimate_tokens(summary) > self.summary_tokens:
+            summary = summary[:int(len(summary) * 0.9)]
+        summary_tokens = self.estimate_tokens(summary) if summary else 0
+        conversation["tokens"] += summary_tokens - conversation["summary_tokens"]
+        conversation["summary"] = summary
+        conversation["summary_tokens"] = summary_tokens
+        # 摘要变长后可能超出预算，只裁剪问答，裁掉的部分不再摘要
+        self._trim(conversation, summarize=False)
+
+    def clear(self, key=None):
+        """
+        清空对话记忆
+
+        Args:
+            key: 会话键，None表示清空全部会话
+        """
+        if key is None:
+            self._conversations.clear()
+        else:
+            self._conversations.pop(key, None)
+
+    def stats(self):
+        """
+        获取对话记忆统计
+
+        Returns:
+            dict: 会话数、总token数、淘汰的会话数和裁剪的问答数
+        """
+        return {
+            "conversations": len(self._conversations),
+            "max_conversations": self.max_conversations,
+            "tokens": sum(conversation["tokens"] for conversation in self._conversations.values()),
+            "max_tokens": self.max_tokens,
+            "evictions": self.evictions,
+            "trimmed_turns": self.trimmed_turns
+        }
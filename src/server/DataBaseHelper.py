@@ -1,49 +1,200 @@
 import sqlite3
 import logging
 import os
+import datetime
+import threading
+import time
+from collections import OrderedDict
 from passlib.hash import pbkdf2_sha256
+from PasswordHashHelper import PasswordHashHelper
 
 logger = logging.getLogger("ChatServer")
 
+# db_manager.DatabaseManager（accounts.db）使用的哈希参数
+LEGACY_SALT_SIZE = 32
+LEGACY_ROUNDS = 100000
+
+# 数据库结构迁移列表：(版本号, 说明, SQL语句列表)，只能追加，不能修改已发布的版本
+# username列上的UNIQUE约束自带索引，按用户名查询无需额外建索引
+SCHEMA_MIGRATIONS = [
+    (1, "创建用户表", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            avatar TEXT DEFAULT NULL,
+            status TEXT DEFAULT 'offline',
+            last_login TEXT DEFAULT NULL
+        )
+        ''',
+    ]),
+    (2, "添加注册时间列，为在线状态查询建立索引", [
+        "ALTER TABLE users ADD COLUMN created_at TEXT DEFAULT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_users_status ON users(status)",
+    ]),
+    (3, "记录旧账户库的导入情况", [
+        '''
+        CREATE TABLE IF NOT EXISTS legacy_imports (
+            source TEXT PRIMARY KEY,
+            imported INTEGER NOT NULL,
+            skipped INTEGER NOT NULL,
+            imported_at TEXT NOT NULL
+        )
+        ''',
+    ]),
+]
+
+
+class UserProfileCache:
+    """
+    用户资料的LRU缓存（id、用户名、密码哈希、头像）
+    
+    不存在的用户同样会被缓存，注册新用户时需要调用invalidate。
+    条目在ttl秒后过期，其他进程（例如批量导入账户、重置数据库的脚本）对账户库的修改最多延迟ttl秒生效；
+    "用户不存在"的条目使用更短的negative_ttl。
+    """
+    
+    # 表示"数据库中没有该用户"的缓存值
+    MISSING = object()
+    
+    def __init__(self, capacity=10000, ttl=300, negative_ttl=30):
+        """
+        初始化缓存
+        
+        Args:
+            capacity: 最多缓存的用户数
+            ttl: 用户资料的缓存时间（秒）
+            negative_ttl: "用户不存在"的缓存时间（秒）
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # username -> (用户资料或MISSING, 过期时间)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, username):
+        """
+        读取缓存
+        
+        Returns:
+            dict/MISSING/None: 用户资料，MISSING表示已知不存在，None表示未缓存
+        """
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                self.misses += 1
+                return None
+            profile, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[username]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+            return profile
+    
+    def put(self, username, profile):
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+        
+        Args:
+            username: 用户名
+            profile: 用户资料或MISSING
+        """
+        if self.capacity <= 0:
+            return
+        ttl = self.negative_ttl if profile is UserProfileCache.MISSING else self.ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[username] = (profile, time.monotonic() + ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, username=None):
+        """
+        使缓存失效
+        
+        Args:
+            username: 用户名，None表示清空全部缓存
+        """
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+    
+    def stats(self):
+        """
+        获取缓存统计
+        
+        Returns:
+            dict: 容量、条目数、命中/未命中/淘汰/过期次数和命中率
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "capacity": self.capacity,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
 
 class DataBaseHelper:
-    def __init__(self, db_path="users.db"):
+    def __init__(self, db_path="users.db", cache_size=10000, cache_ttl=300, negative_cache_ttl=30):
         """
         初始化数据库助手
         
         Args:
             db_path: 数据库文件路径
+            cache_size: 用户资料缓存的最大条目数，0表示不缓存
+            cache_ttl: 用户资料的缓存时间（秒）
+            negative_cache_ttl: "用户不存在"的缓存时间（秒）
         """
         self.db_path = db_path
+        self.profile_cache = UserProfileCache(cache_size, ttl=cache_ttl, negative_ttl=negative_cache_ttl)
         self.init_database()
     
+    def _connect(self):
+        """
+        打开数据库连接
+        
+        Returns:
+            sqlite3.Connection: 数据库连接
+        """
+        return sqlite3.connect(self.db_path)
+    
     def init_database(self):
         """
-        初始化数据库，创建用户表
+        初始化数据库，执行结构迁移并创建默认管理员
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 创建用户表
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    avatar TEXT DEFAULT NULL,
-                    status TEXT DEFAULT 'offline',
-                    last_login TEXT DEFAULT NULL
-                )
-            ''')
+            conn = self._connect()
+            # WAL模式下读写互不阻塞，登录查询不会被注册写入卡住
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.migrate(conn)
             
+            cursor = conn.cursor()
             # 创建默认管理员用户（如果不存在）
-            cursor.execute("SELECT * FROM users WHERE username = 'admin'")
+            cursor.execute("SELECT id FROM users WHERE username = 'admin'")
             if not cursor.fetchone():
-                admin_password = pbkdf2_sha256.hash("admin123")
+                admin_password = PasswordHashHelper.hash("admin123")
                 cursor.execute(
-                    "INSERT INTO users (username, password, avatar, status) VALUES (?, ?, ?, ?)",
-                    ('admin', admin_password, 'admin', 'online')
+                    "INSERT INTO users (username, password, avatar, status, created_at) VALUES (?, ?, ?, ?, ?)",
+                    ('admin', admin_password, 'admin', 'online', self._now())
                 )
                 logger.info("默认管理员用户已创建")
             
@@ -53,6 +204,178 @@ class DataBaseHelper:
         except Exception as e:
             logger.error(f"数据库初始化失败: {str(e)}")
     
+    def migrate(self, conn):
+        """
+        执行尚未应用的结构迁移，版本号记录在PRAGMA user_version中
+        
+        每个迁移在独立事务中执行，失败时回滚且不会更新版本号
+        
+        Args:
+            conn: 数据库连接
+            
+        Returns:
+            int: 迁移后的结构版本号
+        """
+        current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+        # 手动控制事务，使DDL语句也处于事务之内
+        isolation_level = conn.isolation_level
+        conn.isolation_level = None
+        try:
+            for version, description, statements in SCHEMA_MIGRATIONS:
+                if version <= current_version:
+                    continue
+                conn.execute("BEGIN")
+                try:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {int(version)}")
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                current_version = version
+                logger.info(f"数据库结构已迁移到版本 {version}: {description}")
+        finally:
+            conn.isolation_level = isolation_level
+        return current_version
+    
+    @staticmethod
+    def _now():
+        """
+        获取当前时间字符串，用于created_at/last_login等列
+        """
+        return datetime.datetime.now().isoformat(timespec='seconds')
+    
+    @staticmethod
+    def _convert_legacy_hash(stored_password):
+        """
+        将db_manager格式的密码哈希（32字节盐值 + pbkdf2_hmac摘要）转换为passlib格式
+        
+        两者都是PBKDF2-HMAC-SHA256，只是编码方式不同，因此无需用户重置密码
+        
+        Args:
+            stored_password: accounts.db中的password_hash值
+            
+        Returns:
+            str or None: passlib格式的哈希字符串，无法识别时返回None
+        """
+        if not isinstance(stored_password, (bytes, bytearray)) or len(stored_password) != LEGACY_SALT_SIZE + 32:
+            return None
+        return pbkdf2_sha256(
+            rounds=LEGACY_ROUNDS,
+            salt=bytes(stored_password[:LEGACY_SALT_SIZE]),
+            checksum=bytes(stored_password[LEGACY_SALT_SIZE:])
+        ).to_string()
+    
+    def import_legacy_accounts(self, legacy_db_path):
+        """
+        将旧版db_manager账户库（accounts.db）合并到当前数据库
+        
+        同一个来源只会导入一次；用户名冲突时保留当前数据库中的账户
+        
+        Args:
+            legacy_db_path: 旧账户库文件路径
+            
+        Returns:
+            tuple: (success, result) - (是否成功, 导入统计或错误信息)
+        """
+        source = os.path.abspath(legacy_db_path)
+        if not os.path.exists(source):
+            return False, f"旧账户库不存在: {source}"
+        
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("SELECT imported, skipped FROM legacy_imports WHERE source = ?", (source,))
+            done = cursor.fetchone()
+            if done:
+                conn.close()
+                return True, {"imported": done[0], "skipped": done[1], "already_imported": True}
+            
+            legacy_conn = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+            legacy_rows = legacy_conn.execute(
+                "SELECT username, password_hash, created_at FROM users ORDER BY id"
+            ).fetchall()
+            legacy_conn.close()
+            
+            rows = []
+            skipped = 0
+            for username, password_hash, created_at in legacy_rows:
+                converted = self._convert_legacy_hash(password_hash)
+                if converted is None:
+                    logger.warning(f"无法识别旧账户的密码格式，跳过: {username}")
+                    skipped += 1
+                    continue
+                rows.append((username, converted, created_at))
+            
+            # 整批在一个事务中写入，用户名已存在的行由INSERT OR IGNORE跳过
+            before = conn.total_changes
+            cursor.executemany(
+                "INSERT OR IGNORE INTO users (username, password, created_at) VALUES (?, ?, ?)",
+                rows
+            )
+            imported = conn.total_changes - before
+            skipped += len(rows) - imported
+            cursor.execute(
+                "INSERT INTO legacy_imports (source, imported, skipped, imported_at) VALUES (?, ?, ?, ?)",
+                (source, imported, skipped, self._now())
+            )
+            conn.commit()
+            conn.close()
+            self.profile_cache.invalidate()
+            
+            logger.info(f"旧账户库导入完成: {source}，导入 {imported} 个，跳过 {skipped} 个")
+            return True, {"imported": imported, "skipped": skipped, "already_imported": False}
+        except Exception as e:
+            logger.error(f"导入旧账户库失败: {str(e)}")
+            return False, f"导入失败: {str(e)}"
+    
+    def _load_profile(self, username, authenticating=False):
+        """
+        读取用户资料，优先使用缓存
+        
+        Args:
+            username: 用户名
+            authenticating: 是否用于登录验证。登录验证不使用也不写入"用户不存在"的缓存，
+                            刚由其他进程创建的账户可以立即登录，猜测用户名的请求也不会占满缓存
+            
+        Returns:
+            dict or None: 包含id、username、password、avatar的用户资料，不存在返回None
+        """
+        profile = self.profile_cache.get(username)
+        if profile is UserProfileCache.MISSING and not authenticating:
+            return None
+        if profile is not None and profile is not UserProfileCache.MISSING:
+            return profile
+        
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, username, password, avatar FROM users WHERE username = ?", (username,))
+        result = cursor.fetchone()
+        conn.close()
+        
+        if not result:
+            if not authenticating:
+                self.profile_cache.put(username, UserProfileCache.MISSING)
+            return None
+        profile = {
+            "id": result[0],
+            "username": result[1],
+            "password": result[2],
+            "avatar": result[3]
+        }
+        self.profile_cache.put(username, profile)
+        return profile
+    
+    def get_cache_stats(self):
+        """
+        获取用户资料缓存的命中统计
+        
+        Returns:
+            dict: 缓存统计信息
+        """
+        return self.profile_cache.stats()
+    
     def register_user(self, username, password, avatar=None):
         """
         注册新用户
@@ -66,25 +389,24 @@ class DataBaseHelper:
             tuple: (success, message) - (是否成功, 消息)
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # 检查用户名是否已存在
-            cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-            if cursor.fetchone():
-                conn.close()
+            if self._load_profile(username):
                 return False, "用户名已存在"
             
             # 哈希密码
-            hashed_password = pbkdf2_sha256.hash(password)
+            hashed_password = PasswordHashHelper.hash(password)
             
             # 插入新用户
+            conn = self._connect()
+            cursor = conn.cursor()
             cursor.execute(
-                "INSERT INTO users (username, password, avatar) VALUES (?, ?, ?)",
-                (username, hashed_password, avatar)
+                "INSERT INTO users (username, password, avatar, created_at) VALUES (?, ?, ?, ?)",
+                (username, hashed_password, avatar, self._now())
             )
             conn.commit()
             conn.close()
+            # 清除"用户不存在"的缓存
+            self.profile_cache.invalidate(username)
             
             logger.info(f"用户注册成功: {username}")
             return True, "注册成功"
@@ -104,33 +426,34 @@ class DataBaseHelper:
             tuple: (success, user_data) - (是否成功, 用户数据)
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # 查找用户
-            cursor.execute("SELECT id, username, password, avatar FROM users WHERE username = ?", (username,))
-            user = cursor.fetchone()
-            
+            user = self._load_profile(username, authenticating=True)
             if not user:
-                conn.close()
                 return False, None
             
-            # 验证密码
-            if pbkdf2_sha256.verify(password, user[2]):
+            # 验证密码，迭代次数需要更新时顺便生成新哈希
+            verified, new_hash = PasswordHashHelper.verify_and_update(password, user["password"])
+            if verified:
                 # 更新用户状态
-                cursor.execute("UPDATE users SET status = 'online' WHERE id = ?", (user[0],))
+                conn = self._connect()
+                cursor = conn.cursor()
+                cursor.execute("UPDATE users SET status = 'online', last_login = ? WHERE id = ?", (self._now(), user["id"]))
+                if new_hash:
+                    cursor.execute("UPDATE users SET password = ? WHERE id = ?", (new_hash, user["id"]))
                 conn.commit()
                 conn.close()
+                if new_hash:
+                    self.profile_cache.invalidate(username)
+                    logger.info(f"用户密码哈希已按当前迭代次数更新: {username}")
                 
                 user_data = {
-                    "id": user[0],
-                    "username": user[1],
-                    "avatar": user[3]
+                    "id": user["id"],
+                    "username": user["username"],
+                    "avatar": user["avatar"]
                 }
                 logger.info(f"用户登录成功: {username}")
                 return True, user_data
             else:
-                conn.close()
                 return False, None
         except Exception as e:
             logger.error(f"用户验证失败: {str(e)}")
@@ -145,7 +468,7 @@ class DataBaseHelper:
             status: 状态值（online/offline）
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             cursor.execute("UPDATE users SET status = ? WHERE username = ?", (status, username))
             conn.commit()
@@ -165,14 +488,9 @@ class DataBaseHelper:
             str or None: 头像标识，不存在返回None
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT avatar FROM users WHERE username = ?", (username,))
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result:
-                return result[0]
+            user = self._load_profile(username)
+            if user:
+                return user["avatar"]
             return None
         except Exception as e:
             logger.error(f"获取用户头像失败: {str(e)}")
@@ -190,11 +508,12 @@ class DataBaseHelper:
             bool: 是否更新成功
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             cursor.execute("UPDATE users SET avatar = ? WHERE username = ?", (avatar, username))
             conn.commit()
             conn.close()
+            self.profile_cache.invalidate(username)
             logger.info(f"用户头像已更新: {username}")
             return True
         except Exception as e:
@@ -209,7 +528,7 @@ class DataBaseHelper:
             list: 在线用户列表
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._connect()
             cursor = conn.cursor()
             cursor.execute("SELECT username, avatar FROM users WHERE status = 'online'")
             users = cursor.fetchall()
@@ -238,17 +557,12 @@ class DataBaseHelper:
             tuple: (success, user_data) - (是否成功, 用户数据)
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, username, avatar FROM users WHERE username = ?", (username,))
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result:
+            user = self._load_profile(username)
+            if user:
                 user_data = {
-                    "id": result[0],
-                    "username": result[1],
-                    "avatar": result[2] if result[2] else None
+                    "id": user["id"],
+                    "username": user["username"],
+                    "avatar": user["avatar"] if user["avatar"] else None
                 }
                 return True, user_data
             else:
@@ -256,3 +570,27 @@ class DataBaseHelper:
         except Exception as e:
             logger.error(f"检查用户存在性失败: {str(e)}")
             return False, None
+    
+    def get_user_by_id(self, user_id):
+        """
+        根据用户ID获取用户名
+        
+        Args:
+            user_id: 用户ID
+            
+        Returns:
+            str or None: 用户名，不存在返回None
+        """
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            cursor.execute("SELECT username FROM users WHERE id = ?", (user_id,))
+            result = cursor.fetchone()
+            conn.close()
+            
+            if result:
+                return result[0]
+            return None
+        except Exception as e:
+            logger.error(f"获取用户信息失败: {str(e)}")
+            return None
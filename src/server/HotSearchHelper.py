@@ -1,119 +1,300 @@
 import asyncio
-import aiohttp
+import codecs
+import datetime
+import html
+import json
 import logging
 import re
+import time
+
+from HttpSessionHelper import HttpSessionHelper
+from JobStatusHelper import JobStatusHelper
 
 logger = logging.getLogger("ChatServer")
 
 
+class HotSearchParser:
+    """
+    百度热搜榜页面的单遍增量解析
+
+    热搜榜页面在HTML注释 <!--s-data:{...}--> 中内嵌了完整的榜单JSON（置顶条目在topContent，
+    其余在content），解析器边接收边查找该注释，读到注释结束即可解析出榜单，后面的页面不必再下载。
+    页面中没有内嵌数据时，退回到对榜单标题元素（c-single-text-ellipsis）的一次正则扫描。
+    """
+
+    DATA_MARKER = "<!--s-data:"
+    END_MARKER = "-->"
+    TITLE_PATTERN = re.compile(r'<div class="c-single-text-ellipsis"[^>]*>([^<]*)</div>')
+
+    def __init__(self, limit=10):
+        """
+        初始化解析器
+
+        Args:
+            limit: 最多提取的条数
+        """
+        self.limit = limit
+        self._text = ""
+        # 在已接收的文本中继续查找的起始位置，已经查找过的部分不再重复扫描
+        self._search_from = 0
+        self._data_start = None
+        self._data = None
+        self.done = False
+        self.source = None
+
+    def feed(self, text):
+        """
+        接收一段页面文本
+
+        Args:
+            text: 已解码的文本片段
+
+        Returns:
+            bool: 是否已经读到完整的内嵌数据（之后的内容可以不再读取）
+        """
+        if self.done or not text:
+            return self.done
+        self._text += text
+
+        if self._data_start is None:
+            index = self._text.find(HotSearchParser.DATA_MARKER, self._search_from)
+            if index < 0:
+                # 标记可能跨越两个片段，下次从末尾不足一个标记长度的位置开始查找
+                self._search_from = max(0, len(self._text) - len(HotSearchParser.DATA_MARKER) + 1)
+                return False
+            self._data_start = index + len(HotSearchParser.DATA_MARKER)
+            self._search_from = self._data_start
+
+        while True:
+            end = self._text.find(HotSearchParser.END_MARKER, self._search_from)
+            if end < 0:
+                self._search_from = max(self._data_start, len(self._text) - len(HotSearchParser.END_MARKER) + 1)
+                return False
+            try:
+                self._data, _ = json.JSONDecoder().raw_decode(self._text, self._data_start)
+            except ValueError:
+                # 注释结束标记出现在JSON字符串内部，JSON还不完整，继续接收
+                self._search_from = end + len(HotSearchParser.END_MARKER)
+                continue
+            self.done = True
+            return True
+
+    def _extract_embedded(self):
+        """从内嵌的s-data JSON中提取标题，数据格式不符时返回None"""
+        try:
+            for card in self._data["data"]["cards"]:
+                items = (card.get("topContent") or []) + (card.get("content") or [])
+                if items:
+                    return [item.get("word") or item.get("query") or "" for item in items]
+        except (KeyError, TypeError, AttributeError):
+            pass
+        return None
+
+    def _dedup(self, titles):
+        """去掉空标题和重复标题，最多保留limit条"""
+        result = []
+        seen = set()
+        for title in titles:
+            title = " ".join(html.unescape(title).split())
+            if not title or title in seen:
+                continue
+            seen.add(title)
+            result.append(title)
+            if len(result) >= self.limit:
+                break
+        return result
+
+    def close(self):
+        """
+        结束解析
+
+        Returns:
+            list: 热搜标题列表
+        """
+        if self._data is not None:
+            titles = self._extract_embedded()
+            if titles:
+                self.source = "s-data"
+                return self._dedup(titles)
+        # 没有内嵌数据（或数据格式变化）时扫描榜单的标题元素
+        self.source = "html"
+        return self._dedup(HotSearchParser.TITLE_PATTERN.findall(self._text))
+
+
 class HotSearchHelper:
+    """
+    百度热搜
+
+    后台任务定期抓取热搜榜并把解析好的列表保存在内存中，@热搜直接返回最近一次成功的结果；
+    抓取失败时继续使用上一次成功的列表。
+    """
+
+    URL = "https://top.baidu.com/board?tab=realtime"
+    HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+        "Accept-Language": "zh-CN,zh;q=0.8,zh-TW;q=0.7,zh-HK;q=0.5,en-US;q=0.3,en;q=0.2"
+    }
+    # 后台刷新间隔（秒）
+    REFRESH_INTERVAL = 300
+    # 抓取失败后的重试间隔（秒）
+    RETRY_INTERVAL = 60
+    # 列表超过该时间（秒）没有更新时，@热搜会顺便触发一次刷新
+    MAX_AGE = 900
+
+    # 最近一次成功抓取的热搜列表和时间
+    _latest = []
+    _updated_at = None
+    _updated_monotonic = None
+    # 正在进行的刷新任务，并发的刷新请求共用
+    _refresh_task = None
+    refreshes = 0
+    refresh_errors = 0
+    last_error = None
+
     @staticmethod
-    async def get_baidu_hot_search():
+    def parse_hot_search(html_content, limit=10):
         """
-        从百度获取热搜列表
-        
+        从热搜榜页面中提取热搜标题
+
+        Args:
+            html_content: 页面HTML
+            limit: 最多返回的条数
+
+        Returns:
+            list: 热搜标题（置顶的一条在最前）
+        """
+        parser = HotSearchParser(limit)
+        parser.feed(html_content)
+        return parser.close()
+
+    @staticmethod
+    async def fetch_hot_search():
+        """
+        抓取并解析百度热搜榜
+
         Returns:
-            list: 热搜列表
+            list: 热搜标题列表
+
+        Raises:
+            Exception: HTTP错误、超时或页面中没有解析出热搜
         """
+        session = await HttpSessionHelper.open("hot_search", limit=4, limit_per_host=2,
+                                               connect_timeout=5, read_timeout=10, total_timeout=15)
+        parser = HotSearchParser()
+        async with session.get(HotSearchHelper.URL, headers=HotSearchHelper.HEADERS) as response:
+            if response.status != 200:
+                raise Exception(f"HTTP {response.status}")
+            decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+            # 边下载边解析，读到内嵌的榜单数据后不再下载页面的其余部分
+            async for chunk in response.content.iter_chunked(16384):
+                if parser.feed(decoder.decode(chunk)):
+                    break
+            else:
+                parser.feed(decoder.decode(b"", final=True))
+        
+        hot_searches = parser.close()
+        if not hot_searches:
+            raise Exception("页面中没有解析出热搜")
+        return hot_searches
+
+    @staticmethod
+    async def _refresh():
+        HotSearchHelper.refreshes += 1
         try:
-            async with aiohttp.ClientSession() as session:
-                # 使用百度热搜的专门页面
-                url = "https://top.baidu.com/board?tab=realtime"
-                headers = {
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                    "Accept-Language": "zh-CN,zh;q=0.8,zh-TW;q=0.7,zh-HK;q=0.5,en-US;q=0.3,en;q=0.2",
-                    "Connection": "keep-alive"
-                }
-                
-                async with session.get(url, headers=headers) as response:
-                    if response.status == 200:
-                        html_content = await response.text()
-                        # 提取热搜内容
-                        hot_searches = []
-                        
-                        # 根据用户提供的截图，更新正则表达式匹配最新的百度热搜格式
-                        # 匹配标题和热度的模式
-                        patterns = [
-                            # 匹配可能的热搜标题格式
-                            re.compile(r'<div class=["\']c-single-text-ellipsis["\'].*?>(.*?)</div>', re.DOTALL),
-                            # 匹配a标签中的文本
-                            re.compile(r'<a[^>]*?>(.*?)</a>', re.DOTALL),
-                        ]
-                        
-                        # 尝试所有模式进行匹配
-                        for pattern in patterns:
-                            matches = pattern.findall(html_content)
-                            for match in matches:
-                                title = match.strip()
-                                # 过滤无效标题
-                                if (title and len(title) > 4 and len(title) < 80 and 
-                                    title not in hot_searches and 
-                                    not any(keyword in title.lower() for keyword in ['http', 'javascript', 'css', 'style', 'script', 'img', 'div', 'span'])):
-                                    hot_searches.append(title)
-                                    if len(hot_searches) >= 10:
-                                        break
-                            if len(hot_searches) >= 10:
-                                break
-                        
-                        # 如果使用特定模式没有匹配到足够的热搜，使用通用模式
-                        if len(hot_searches) < 10:
-                            logger.info("搜索整个HTML以获取更多热搜")
-                            general_pattern = re.compile(r'>([^<]{5,50})<', re.DOTALL)
-                            general_matches = general_pattern.findall(html_content)
-                            
-                            for match in general_matches:
-                                title = match.strip()
-                                if (title and len(title) > 4 and len(title) < 80 and 
-                                    title not in hot_searches and 
-                                    not any(keyword in title.lower() for keyword in ['http', 'javascript', 'css', 'style', 'script', 'img', 'div', 'span'])):
-                                    hot_searches.append(title)
-                                    if len(hot_searches) >= 10:
-                                        break
-                        
-                        # 如果没有匹配到，使用备用数据
-                        if not hot_searches:
-                            logger.warning("无法从百度获取热搜，使用备用数据")
-                            hot_searches = [
-                                "日本跟中国不是一个量级的",
-                                "村民用了多年的垫脚石竟是恐龙化石",
-                                "流感季防护 这些误区要避开",
-                                "俄罗斯洲际弹道导弹爆炸",
-                                "女子地铁内蹲坐被压骨折 获赔15万",
-                                "旅行社：中国赴日团体游几乎全部",
-                                "300元滑雪服被冻哭的年轻人焊身上",
-                                "女子150万竞得32间法拍房6年未交付",
-                                "刘强东：未来机器人会完成所有工作",
-                                "感悟跨越百年的鼓岭情缘"
-                            ]
-                        
-                        logger.info(f"成功获取百度热搜列表，共{len(hot_searches)}条")
-                        return hot_searches[:10]  # 确保只返回10条
-                    else:
-                        logger.error(f"获取百度热搜失败: HTTP {response.status}")
-                        # 返回备用数据
-                        return [
-                            "获取热搜失败，使用默认数据",
-                            "新闻资讯：热点事件追踪",
-                            "科技动态：创新产品发布",
-                            "娱乐八卦：明星最新消息",
-                            "生活百科：实用小技巧"
-                        ]
+            hot_searches = await HotSearchHelper.fetch_hot_search()
         except Exception as e:
-            logger.error(f"获取百度热搜异常: {str(e)}")
-            # 返回备用数据，使用用户提供的热搜内容
-            return [
-                "日本跟中国不是一个量级的",
-                "村民用了多年的垫脚石竟是恐龙化石",
-                "流感季防护 这些误区要避开",
-                "俄罗斯洲际弹道导弹爆炸",
-                "女子地铁内蹲坐被压骨折 获赔15万",
-                "旅行社：中国赴日团体游几乎全部",
-                "300元滑雪服被冻哭的年轻人焊身上",
-                "女子150万竞得32间法拍房6年未交付",
-                "刘强东：未来机器人会完成所有工作",
-                "感悟跨越百年的鼓岭情缘"
-            ]
+            HotSearchHelper.refresh_errors += 1
+            HotSearchHelper.last_error = f"{type(e).__name__} {str(e)}".strip()
+            if HotSearchHelper._latest:
+                logger.error(f"刷新百度热搜失败，继续使用 {HotSearchHelper._updated_at:%H:%M:%S} 的列表: {HotSearchHelper.last_error}")
+            else:
+                logger.error(f"获取百度热搜失败: {HotSearchHelper.last_error}")
+            JobStatusHelper.shared().record("hot_search", False, HotSearchHelper.last_error)
+            return False
+        
+        HotSearchHelper._latest = hot_searches
+        HotSearchHelper._updated_at = datetime.datetime.now()
+        HotSearchHelper._updated_monotonic = time.monotonic()
+        HotSearchHelper.last_error = None
+        logger.info(f"成功获取百度热搜列表，共{len(hot_searches)}条")
+        JobStatusHelper.shared().record("hot_search", True, f"{len(hot_searches)}条")
+        return True
+
+    @staticmethod
+    async def refresh():
+        """
+        刷新热搜列表，并发调用共用同一次抓取
+
+        Returns:
+            bool: 是否抓取成功（失败时保留上一次成功的列表）
+        """
+        task = HotSearchHelper._refresh_task
+        if task is None or task.done():
+            task = HotSearchHelper._refresh_task = asyncio.create_task(HotSearchHelper._refresh())
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def run_refresher(interval=REFRESH_INTERVAL, retry_interval=RETRY_INTERVAL):
+        """
+        后台定期刷新热搜列表（在main()中作为后台任务启动）
+
+        Args:
+            interval: 刷新间隔（秒）
+            retry_interval: 抓取失败后的重试间隔（秒）
+        """
+        while True:
+            success = await HotSearchHelper.refresh()
+            await asyncio.sleep(interval if success else retry_interval)
+
+    @staticmethod
+    def get_latest():
+        """
+        获取内存中的热搜列表
+
+        Returns:
+            tuple: (热搜列表, 更新时间datetime)，还没有成功抓取过时返回([], None)
+        """
+        return list(HotSearchHelper._latest), HotSearchHelper._updated_at
+
+    @staticmethod
+    def stats():
+        """
+        获取热搜刷新统计
+
+        Returns:
+            dict: 条数、更新时间、距今秒数、刷新次数、失败次数和最近一次错误
+        """
+        age = None
+        if HotSearchHelper._updated_monotonic is not None:
+            age = round(time.monotonic() - HotSearchHelper._updated_monotonic)
+        return {
+            "size": len(HotSearchHelper._latest),
+            "updated_at": HotSearchHelper._updated_at.strftime("%Y-%m-%d %H:%M:%S") if HotSearchHelper._updated_at else None,
+            "age": age,
+            "refreshes": HotSearchHelper.refreshes,
+            "refresh_errors": HotSearchHelper.refresh_errors,
+            "last_error": HotSearchHelper.last_error
+        }
+
+    @staticmethod
+    async def get_baidu_hot_search():
+        """
+        获取百度热搜列表
+
+        优先返回内存中的列表；还没有列表时（例如服务器刚启动）等待一次抓取。
+        列表过旧时在后台触发刷新，本次仍直接返回现有列表。
+        
+        Returns:
+            tuple: (热搜列表, 更新时间datetime) - 从未成功抓取过时为([], None)
+        """
+        if not HotSearchHelper._latest:
+            await HotSearchHelper.refresh()
+        elif time.monotonic() - HotSearchHelper._updated_monotonic > HotSearchHelper.MAX_AGE:
+            task = HotSearchHelper._refresh_task
+            if task is None or task.done():
+                HotSearchHelper._refresh_task = asyncio.create_task(HotSearchHelper._refresh())
+        return HotSearchHelper.get_latest()
 
     @staticmethod
     def format_hot_searches(hot_searches):
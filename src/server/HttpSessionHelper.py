@@ -0,0 +1,128 @@
+import asyncio
+import aiohttp
+import logging
+
+logger = logging.getLogger("ChatServer")
+
+
+class HttpSessionHelper:
+    """
+    共享HTTP会话管理
+
+    每个上游服务（大模型API、天气API等）使用一个长期存在的aiohttp.ClientSession，
+    复用TCP/TLS连接并缓存DNS解析结果，避免每次请求都重新握手。
+    会话在main()中创建，服务器关闭时统一关闭。
+    """
+
+    # 默认连接参数
+    DEFAULT_LIMIT = 100
+    DEFAULT_LIMIT_PER_HOST = 20
+    DEFAULT_DNS_TTL = 300
+    DEFAULT_KEEPALIVE = 60
+    DEFAULT_CONNECT_TIMEOUT = 10
+    DEFAULT_READ_TIMEOUT = 60
+
+    _sessions = {}
+    _options = {}
+
+    @staticmethod
+    def configure(name, limit=DEFAULT_LIMIT, limit_per_host=DEFAULT_LIMIT_PER_HOST,
+                  connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                  total_timeout=None, headers=None, trace_configs=None):
+        """
+        设置某个上游服务的会话参数（在会话创建之前调用才生效）
+
+        Args:
+            name: 上游服务名称
+            limit: 连接池总连接数上限
+            limit_per_host: 单个主机的连接数上限
+            connect_timeout: 建立连接的超时时间（秒）
+            read_timeout: 两次读取之间的超时时间（秒），流式响应按片段计时
+            total_timeout: 整个请求的超时时间（秒），None表示不限制
+            headers: 默认请求头
+            trace_configs: aiohttp.TraceConfig列表，用于统计连接耗时等指标
+        """
+        HttpSessionHelper._options[name] = {
+            "limit": limit,
+            "limit_per_host": limit_per_host,
+            "connect_timeout": connect_timeout,
+            "read_timeout": read_timeout,
+            "total_timeout": total_timeout,
+            "headers": headers,
+            "trace_configs": trace_configs
+        }
+
+    @staticmethod
+    async def open(name, **options):
+        """
+        创建（或返回已存在的）共享会话
+
+        Args:
+            name: 上游服务名称
+            **options: 传给configure的会话参数
+
+        Returns:
+            aiohttp.ClientSession: 共享会话
+        """
+        session = HttpSessionHelper._sessions.get(name)
+        if session is not None and not session.closed:
+            return session
+
+        if options or name not in HttpSessionHelper._options:
+            HttpSessionHelper.configure(name, **options)
+        opts = HttpSessionHelper._options[name]
+
+        connector = aiohttp.TCPConnector(
+            limit=opts["limit"],
+            limit_per_host=opts["limit_per_host"],
+            use_dns_cache=True,
+            ttl_dns_cache=HttpSessionHelper.DEFAULT_DNS_TTL,
+            keepalive_timeout=HttpSessionHelper.DEFAULT_KEEPALIVE
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=opts["total_timeout"],
+            connect=opts["connect_timeout"],
+            sock_connect=opts["connect_timeout"],
+            sock_read=opts["read_timeout"]
+        )
+        session = aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=opts["headers"], trace_configs=opts["trace_configs"]
+        )
+        HttpSessionHelper._sessions[name] = session
+        logger.info(f"已创建共享HTTP会话: {name}，连接上限: {opts['limit']}/{opts['limit_per_host']}")
+        return session
+
+    @staticmethod
+    async def get(name):
+        """
+        获取共享会话，尚未创建时按已配置的参数创建
+
+        Args:
+            name: 上游服务名称
+
+        Returns:
+            aiohttp.ClientSession: 共享会话
+        """
+        session = HttpSessionHelper._sessions.get(name)
+        if session is None or session.closed:
+            session = await HttpSessionHelper.open(name)
+        return session
+
+    @staticmethod
+    async def close(name):
+        """
+        关闭指定的共享会话
+
+        Args:
+            name: 上游服务名称
+        """
+        session = HttpSessionHelper._sessions.pop(name, None)
+        if session is not None and not session.closed:
+            await session.close()
+            logger.info(f"已关闭共享HTTP会话: {name}")
+
+    @staticmethod
+    async def close_all():
+        """关闭所有共享会话（服务器关闭时调用）"""
+        names = list(HttpSessionHelper._sessions.keys())
+        await asyncio.gather(*(HttpSessionHelper.close(name) for name in names), return_exceptions=True)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import math
+import time
+
+logger = logging.getLogger("ChatServer")
+
+
+class ImagePreload:
+    """一次图片预加载：等待房间内的客户端回复image_preload_complete"""
+
+    def __init__(self, expected, quorum):
+        """
+        Args:
+            expected: 需要回复的客户端ID集合
+            quorum: 达到多少个回复即可继续
+        """
+        self.expected = set(expected)
+        self.quorum = quorum
+        self.loaded = set()
+        self.failed = set()
+        self.started_at = time.monotonic()
+        self.event = asyncio.Event()
+        self.check()
+
+    @property
+    def responded(self):
+        return len(self.loaded) + len(self.failed)
+
+    def check(self):
+        # 加载失败的客户端也算作已回复：继续等待并不能让它加载成功
+        if self.responded >= min(self.quorum, len(self.expected)):
+            self.event.set()
+
+
+class ImagePreloadHelper:
+    """
+    图片预加载确认
+
+    服务器广播image_preload后，客户端加载完图片会回复image_preload_complete。
+    按(图片ID, 房间)记录哪些客户端已经回复，达到法定比例（quorum）或超过期限后再发送引用该图片的消息，
+    加载快的客户端不必等待固定的时长，加载慢的客户端也有机会在消息到达前把图片下载好。
+    """
+
+    def __init__(self, quorum=0.8, timeout=3.0):
+        """
+        初始化
+
+        Args:
+            quorum: 需要回复的客户端比例（0~1），至少为1个客户端
+            timeout: 最长等待时间（秒）
+        """
+        self.quorum = quorum
+        self.timeout = timeout
+        # (image_id, room) -> ImagePreload
+        self._pending = {}
+        self.preloads = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def start(self, image_id, room, client_ids):
+        """
+        登记一次预加载（在广播image_preload之前调用，避免漏掉很快到达的回复）
+
+        Args:
+            image_id: 图片ID
+            room: 房间名称
+            client_ids: 会收到预加载消息的客户端ID列表
+        """
+        quorum = max(1, math.ceil(len(client_ids) * self.quorum))
+        self._pending[(image_id, room)] = ImagePreload(client_ids, quorum)
+        self.preloads += 1
+
+    def ack(self, image_id, room, client_id, success=True):
+        """
+        记录客户端的预加载结果
+
+        Args:
+            image_id: 图片ID
+            room: 客户端所在的房间
+            client_id: 客户端ID
+            success: 是否加载成功
+
+        Returns:
+            bool: 是否属于正在等待的预加载（过期或未知的回复返回False）
+        """
+        preload = self._pending.get((image_id, room))
+        if preload is None or client_id not in preload.expected:
+            return False
+        (preload.loaded if success else preload.failed).add(client_id)
+        if not success:
+            self.failures += 1
+        preload.check()
+        return True
+
+    def remove_client(self, client_id):
+        """
+        客户端断开或离开房间后不再等待它的回复
+
+        Args:
+            client_id: 客户端ID
+        """
+        for preload in self._pending.values():
+            if client_id in preload.expected:
+                preload.expected.discard(client_id)
+                preload.loaded.discard(client_id)
+                preload.failed.discard(client_id)
+                preload.check()
+
+    async def wait(self, image_id, room):
+        """
+        等待足够多的客户端完成预加载，最多等待timeout秒
+
+        Args:
+            image_id: 图片ID
+            room: 房间名称
+
+        Returns:
+            dict: 需要回复的客户端数、加载成功数、失败数、等待时长（毫秒）和是否超时
+        """
+        key = (image_id, room)
+        preload = self._pending.get(key)
+        if preload is None:
+            return {"expected": 0, "loaded": 0, "failed": 0, "waited_ms": 0.0, "timed_out": False}
+        timed_out = False
+        try:
+            await asyncio.wait_for(preload.event.wait(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            self.timeouts += 1
+        finally:
+            if self._pending.get(key) is preload:
+                del self._pending[key]
+        return {
+            "expected": len(preload.expected),
+            "loaded": len(preload.loaded),
+            "failed": len(preload.failed),
+            "waited_ms": round((time.monotonic() - preload.started_at) * 1000, 1),
+            "timed_out": timed_out
+        }
+
+    def stats(self):
+        """
+        获取预加载统计
+
+        Returns:
+            dict: 预加载次数、超时次数、客户端加载失败次数和正在等待的数量
+        """
+        return {
+            "preloads": self.preloads,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "pending": len(self._pending)
+        }
@@ -0,0 +1,219 @@
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger("ChatServer")
+
+
+class JobStatusHelper:
+    """
+    定时抓取任务的状态存储（SQLite）
+
+    每个任务（新闻图片、热搜刷新、天气预取等）每天一行，按(job, date)主键索引。
+    每次记录结果都是一条UPSERT语句，由SQLite保证原子性，不需要读出整个文件再写回；
+    同一天内多次尝试只更新这一行的尝试次数和最近结果，不会随着尝试次数增长。
+    当天只要成功过一次即视为成功，之后的失败不会覆盖。
+    """
+
+    _shared = None
+
+    def __init__(self, db_path=None):
+        """
+        初始化状态存储
+
+        Args:
+            db_path: 数据库文件路径，默认为服务器目录下的job_status.db
+        """
+        self.db_path = db_path or os.path.join(os.path.dirname(__file__), "job_status.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS job_runs (
+                job TEXT NOT NULL,
+                date TEXT NOT NULL,
+                success INTEGER NOT NULL,
+                attempts INTEGER NOT NULL,
+                last_attempt_at TEXT NOT NULL,
+                succeeded_at TEXT,
+                detail TEXT,
+                PRIMARY KEY (job, date)
+            ) WITHOUT ROWID
+        ''')
+        self._conn.commit()
+        logger.info(f"任务状态库初始化完成: {self.db_path}")
+
+    @staticmethod
+    def shared():
+        """
+        获取各个定时任务共用的状态存储（第一次调用时创建）
+
+        Returns:
+            JobStatusHelper: 共享的状态存储
+        """
+        if JobStatusHelper._shared is None:
+            JobStatusHelper._shared = JobStatusHelper()
+        return JobStatusHelper._shared
+
+    @staticmethod
+    def today():
+        return datetime.date.today().isoformat()
+
+    def record(self, job, success, detail=None, date=None):
+        """
+        记录一次任务执行结果
+
+        Args:
+            job: 任务名称
+            success: 是否成功
+            detail: 附加信息（例如错误原因或下载的文件名）
+            date: 日期YYYY-MM-DD，默认为今天
+
+        Returns:
+            bool: 是否记录成功（状态库出错只记录日志，不影响任务本身）
+        """
+        now = datetime.datetime.now().isoformat()
+        try:
+            with self._lock:
+                self._conn.execute('''
+                    INSERT INTO job_runs (job, date, success, attempts, last_attempt_at, succeeded_at, detail)
+                    VALUES (?, ?, ?, 1, ?, ?, ?)
+                    ON CONFLICT (job, date) DO UPDATE SET
+                        success = MAX(job_runs.success, excluded.success),
+                        attempts = job_runs.attempts + 1,
+                        last_attempt_at = excluded.last_attempt_at,
+                        succeeded_at = COALESCE(excluded.succeeded_at, job_runs.succeeded_at),
+                        detail = excluded.detail
+                ''', (job, date or JobStatusHelper.today(), int(bool(success)), now, now if success else None, detail))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"记录{job}任务状态失败: {e}")
+            return False
+        return True
+
+    def get(self, job, date=None):
+        """
+        读取某个任务某一天的状态
+
+        Args:
+            job: 任务名称
+            date: 日期YYYY-MM-DD，默认为今天
+
+        Returns:
+            dict/None: 状态，没有记录时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT date, success, attempts, last_attempt_at, succeeded_at, detail FROM job_runs WHERE job = ? AND date = ?",
+                (job, date or JobStatusHelper.today())
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def succeeded(self, job, date=None):
+        """
+        某个任务某一天是否已经成功过
+
+        Args:
+            job: 任务名称
+            date: 日期YYYY-MM-DD，默认为今天
+
+        Returns:
+            bool: 成功过返回True
+        """
+        status = self.get(job, date)
+        return bool(status and status["success"])
+
+    def history(self, job, limit=30):
+        """
+        读取某个任务最近几天的状态
+
+        Args:
+            job: 任务名称
+            limit: 最多返回的天数
+
+        Returns:
+            list: 状态列表，最近的在前
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, success, attempts, last_attempt_at, succeeded_at, detail FROM job_runs "
+                "WHERE job = ? ORDER BY date DESC LIMIT ?",
+                (job, limit)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def latest(self):
+        """
+        读取每个任务最近一天的状态
+
+        Returns:
+            dict: 任务名称 -> 状态
+        """
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT job, date, success, attempts, last_attempt_at, succeeded_at, detail FROM job_runs AS runs
+                WHERE date = (SELECT MAX(date) FROM job_runs WHERE job = runs.job)
+                ORDER BY job
+            ''').fetchall()
+        return {row[0]: self._row_to_dict(row[1:]) for row in rows}
+
+    def import_json(self, job, path):
+        """
+        导入旧的JSON状态文件（{"YYYY-MM-DD": {"timestamp": ..., "success": ...}}）
+
+        只在该任务还没有任何记录时导入，已有记录的日期不会被覆盖，重复调用没有影响。
+
+        Args:
+            job: 任务名称
+            path: JSON文件路径
+
+        Returns:
+            int: 导入的天数
+        """
+        if not os.path.exists(path):
+            return 0
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM job_runs WHERE job = ? LIMIT 1", (job,)).fetchone():
+                return 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"读取旧的状态文件失败: {path}, {e}")
+            return 0
+
+        rows = []
+        for date, entry in legacy.items():
+            if not isinstance(entry, dict):
+                continue
+            timestamp = entry.get("timestamp") or f"{date}T00:00:00"
+            success = bool(entry.get("success", False))
+            rows.append((job, date, int(success), timestamp, timestamp if success else None))
+        with self._lock:
+            self._conn.executemany('''
+                INSERT OR IGNORE INTO job_runs (job, date, success, attempts, last_attempt_at, succeeded_at)
+                VALUES (?, ?, ?, 1, ?, ?)
+            ''', rows)
+            self._conn.commit()
+        logger.info(f"已从 {path} 导入 {len(rows)} 天的{job}任务状态")
+        return len(rows)
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _row_to_dict(row):
+        date, success, attempts, last_attempt_at, succeeded_at, detail = row
+        return {
+            "date": date,
+            "success": bool(success),
+            "attempts": attempts,
+            "last_attempt_at": last_attempt_at,
+            "succeeded_at": succeeded_at,
+            "detail": detail
+        }
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("ChatServer")
+
+
+class LLMCacheHelper:
+    """
+    大模型回复的LRU+TTL缓存
+
+    缓存键由规范化后的问题、系统提示词、对话历史、模型名称和temperature共同决定，
+    提示词或模型变化后旧的回复自然不会再命中。
+    缓存值保存流式响应的各个片段，命中时可以按原来的片段顺序重放。
+    """
+
+    # 规范化问题时去掉的结尾标点
+    TRAILING_PUNCTUATION = "？?！!。.～~，,…"
+
+    def __init__(self, capacity=256, ttl=3600):
+        """
+        初始化缓存
+
+        Args:
+            capacity: 最多缓存的回复数，0表示禁用缓存
+            ttl: 回复的有效期（秒）
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        # key -> (过期时间, 片段列表)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.capacity > 0 and self.ttl > 0
+
+    @staticmethod
+    def normalize_prompt(prompt):
+        """
+        规范化用户问题：合并空白、统一大小写、去掉结尾标点
+
+        Args:
+            prompt: 用户问题
+
+        Returns:
+            str: 规范化后的问题
+        """
+        prompt = re.sub(r"\s+", " ", prompt).strip().lower()
+        return prompt.rstrip(LLMCacheHelper.TRAILING_PUNCTUATION).strip()
+
+    @staticmethod
+    def make_key(prompt, system_prompt, model, temperature, history=None):
+        """
+        生成缓存键
+
+        Args:
+            prompt: 用户问题
+            system_prompt: 系统提示词（chatbot_tips）
+            model: 模型名称
+            temperature: 采样温度
+            history: 随请求发送的对话历史，没有历史时不同用户的相同问题共用缓存
+
+        Returns:
+            str: 缓存键
+        """
+        raw = json.dumps(
+            [LLMCacheHelper.normalize_prompt(prompt), system_prompt, model, temperature, history or []],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            list/None: 回复片段列表，未命中或已过期时返回None
+        """
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, chunks = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return chunks
+
+    def put(self, key, chunks):
+        """
+        写入缓存，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: 缓存键
+            chunks: 回复片段列表（非流式回复为只有一个元素的列表）
+        """
+        if not self.enabled or not chunks:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, list(chunks))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """清空缓存（修改提示词或模型后可调用）"""
+        self._entries.clear()
+
+    def stats(self):
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 容量、条目数、命中/未命中/淘汰/过期次数和命中率
+        """
+        total = self.hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "ttl": self.ttl,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,254 @@
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger("ChatServer")
+
+
+class LLMEndpointError(Exception):
+    """大模型线路请求失败（HTTP错误、连接失败或没有可用线路）"""
+
+
+class LLMEndpoint:
+    """
+    一个大模型API线路（api_base + api_key + model_name）及其运行统计
+
+    熔断状态：
+        closed    正常使用
+        open      连续失败达到阈值，冷却期内不再使用
+        half_open 冷却期结束，只放行一个探测请求，成功则恢复，失败则重新熔断；
+                  探测请求超过probe_timeout仍没有结果时允许再发出一个探测请求
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    # 首字延迟指数滑动平均的权重
+    LATENCY_ALPHA = 0.3
+
+    def __init__(self, name, api_base, api_key, model_name, window=20):
+        """
+        初始化线路
+
+        Args:
+            name: 线路名称（用于日志和统计）
+            api_base: API地址
+            api_key: API密钥
+            model_name: 模型名称
+            window: 计算错误率时统计的最近请求数
+        """
+        self.name = name
+        self.api_base = api_base.rstrip("/")
+        self.api_key = api_key
+        self.model_name = model_name
+        self.latency = None
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.state = LLMEndpoint.CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started_at = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def record_latency(self, latency):
+        """记录一次首字延迟（秒）"""
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LLMEndpoint.LATENCY_ALPHA * (latency - self.latency)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "api_base": self.api_base,
+            "model_name": self.model_name,
+            "state": self.state,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+
+class LLMEndpointHelper:
+    """
+    大模型API多线路路由
+
+    按首字延迟的滑动平均和最近的错误率选择最快的健康线路，
+    连续失败的线路会被熔断一段时间，冷却后用一个探测请求确认是否恢复。
+    """
+
+    # 错误率对评分的放大系数：错误率50%的线路相当于慢了3倍
+    ERROR_PENALTY = 4
+
+    def __init__(self, endpoints, failure_threshold=3, cooldown=30, hedge_after=0, probe_timeout=120):
+        """
+        初始化路由
+
+        Args:
+            endpoints: LLMEndpoint列表，顺序即没有统计数据时的优先顺序
+            failure_threshold: 连续失败多少次后熔断
+            cooldown: 熔断的冷却时间（秒）
+            hedge_after: 首字超过该时间（秒）未到达时向第二条线路发出对冲请求，0表示不对冲
+            probe_timeout: 半开探测请求的最长等待时间（秒），超时后不再阻止新的探测
+        """
+        self.endpoints = endpoints
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedge_after = hedge_after
+        self.probe_timeout = probe_timeout
+        self.hedged = 0
+        self.failovers = 0
+
+    @staticmethod
+    def from_config(config):
+        """
+        根据chatbot-config.json创建路由
+
+        配置了endpoints列表时使用多线路，每条线路缺少的api_key/model_name沿用顶层配置；
+        否则使用顶层的api_base/api_key/model_name作为唯一线路。
+
+        Args:
+            config: chatbot配置
+
+        Returns:
+            LLMEndpointHelper: 路由对象（没有可用的API密钥时线路列表为空）
+        """
+        default_base = config.get("api_base", "https://api.openai.com/v1")
+        default_key = config.get("api_key", "")
+        default_model = config.get("model_name", "gpt-3.5-turbo")
+        endpoint_configs = config.get("endpoints") or [{"name": "default"}]
+
+        endpoints = []
+        for index, item in enumerate(endpoint_configs):
+            api_key = item.get("api_key", default_key)
+            if not api_key:
+                continue
+            endpoints.append(LLMEndpoint(
+                item.get("name", f"endpoint-{index + 1}"),
+                item.get("api_base", default_base),
+                api_key,
+                item.get("model_name", default_model)
+            ))
+
+        return LLMEndpointHelper(
+            endpoints,
+            failure_threshold=config.get("circuit_failure_threshold", 3),
+            cooldown=config.get("circuit_cooldown", 30),
+            hedge_after=config.get("hedge_after", 0),
+            probe_timeout=config.get("circuit_probe_timeout", 120)
+        )
+
+    def _is_available(self, endpoint, now):
+        """检查线路当前是否可以接收请求，冷却结束的熔断线路转为半开"""
+        if endpoint.state == LLMEndpoint.OPEN and now - endpoint.opened_at >= self.cooldown:
+            endpoint.state = LLMEndpoint.HALF_OPEN
+            endpoint.probing = False
+            logger.info(f"大模型线路 {endpoint.name} 冷却结束，允许探测请求")
+        if endpoint.probing and now - endpoint.probe_started_at >= self.probe_timeout:
+            # 探测请求没有留下结果（例如被取消后未记录），不能让线路永远停在半开状态
+            endpoint.probing = False
+            logger.warning(f"大模型线路 {endpoint.name} 的探测请求超时，允许新的探测请求")
+        if endpoint.state == LLMEndpoint.CLOSED:
+            return True
+        return endpoint.state == LLMEndpoint.HALF_OPEN and not endpoint.probing
+
+    def _score(self, endpoint):
+        """评分越低越优先；还没有请求过的线路优先尝试，只有失败记录的线路排在最后"""
+        if endpoint.latency is None:
+            return float("inf") if endpoint.outcomes else 0.0
+        return endpoint.latency * (1 + LLMEndpointHelper.ERROR_PENALTY * endpoint.error_rate)
+
+    def choose(self, exclude=()):
+        """
+        选择当前最快的健康线路
+
+        Args:
+            exclude: 本次请求已经尝试过的线路
+
+        Returns:
+            LLMEndpoint/None: 选中的线路，没有可用线路时返回None
+        """
+        now = time.monotonic()
+        candidates = [
+            endpoint for endpoint in self.endpoints
+            if endpoint not in exclude and self._is_available(endpoint, now)
+        ]
+        if not candidates:
+            return None
+        endpoint = min(candidates, key=self._score)
+        if endpoint.state == LLMEndpoint.HALF_OPEN:
+            endpoint.probing = True
+            endpoint.probe_started_at = now
+        endpoint.requests += 1
+        return endpoint
+
+    def record_success(self, endpoint, latency):
+        """
+        记录一次成功的请求
+
+        Args:
+            endpoint: 线路
+            latency: 首字延迟（秒）
+        """
+        endpoint.record_latency(latency)
+        endpoint.outcomes.append(True)
+        endpoint.consecutive_failures = 0
+        endpoint.probing = False
+        if endpoint.state != LLMEndpoint.CLOSED:
+            endpoint.state = LLMEndpoint.CLOSED
+            logger.info(f"大模型线路 {endpoint.name} 已恢复")
+
+    def record_failure(self, endpoint, reason=""):
+        """
+        记录一次失败的请求，连续失败达到阈值（或半开探测失败）时熔断
+
+        Args:
+            endpoint: 线路
+            reason: 失败原因（用于日志）
+        """
+        endpoint.outcomes.append(False)
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        endpoint.probing = False
+        if endpoint.state == LLMEndpoint.HALF_OPEN or endpoint.consecutive_failures >= self.failure_threshold:
+            if endpoint.state != LLMEndpoint.OPEN:
+                logger.warning(f"大模型线路 {endpoint.name} 已熔断 {self.cooldown} 秒: {reason}")
+            endpoint.state = LLMEndpoint.OPEN
+            endpoint.opened_at = time.monotonic()
+
+    def record_abandoned(self, endpoint, elapsed):
+        """
+        记录被放弃的请求（对冲请求中较慢的一方，或调用方取消时还没有输出首字的请求）
+
+        用已等待的时间作为首字延迟的下限，让慢线路的评分相应变差。
+
+        Args:
+            endpoint: 线路
+            elapsed: 放弃前已等待的时间（秒）
+        """
+        endpoint.probing = False
+        if endpoint.latency is None or elapsed > endpoint.latency:
+            endpoint.record_latency(elapsed)
+
+    def stats(self):
+        """
+        获取路由统计
+
+        Returns:
+            dict: 各线路的状态和统计，以及对冲和切换次数
+        """
+        return {
+            "endpoints": [endpoint.stats() for endpoint in self.endpoints],
+            "hedge_after": self.hedge_after,
+            "hedged": self.hedged,
+            "failovers": self.failovers
+        }
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger("ChatServer")
+
+
+class LLMSchedulerHelper:
+    """
+    大模型请求调度器
+
+    限制同时发往上游的请求数；超出的请求按用户轮询排队，
+    一个用户连续提问不会挤占其他用户。排队中的请求会收到当前排位的通知。
+    """
+
+    def __init__(self, max_concurrent=4, max_queue=50, max_per_user=3):
+        """
+        初始化调度器
+
+        Args:
+            max_concurrent: 同时进行的上游请求数上限
+            max_queue: 排队请求总数上限
+            max_per_user: 单个用户的排队请求数上限
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self._active = 0
+        # 每个用户的排队请求
+        self._queues = {}
+        # 轮询顺序：有排队请求的用户
+        self._round_robin = deque()
+        self._waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def stats(self):
+        """
+        获取调度器状态
+
+        Returns:
+            dict: 进行中、排队中、已完成和被拒绝的请求数
+        """
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "waiting_users": len(self._round_robin),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "max_concurrent": self.max_concurrent
+        }
+
+    def _dispatch_order(self):
+        """按轮询规则列出排队请求的出队顺序"""
+        order = []
+        depth = 0
+        while len(order) < self._waiting:
+            for user in self._round_robin:
+                queue = self._queues[user]
+                if depth < len(queue):
+                    order.append(queue[depth])
+            depth += 1
+        return order
+
+    async def _notify_positions(self):
+        """把排位有变化的请求通知给提问者"""
+        notifications = []
+        for position, entry in enumerate(self._dispatch_order(), 1):
+            if entry["position"] != position:
+                entry["position"] = position
+                if entry["on_position"]:
+                    notifications.append(entry["on_position"](position))
+        if notifications:
+            results = await asyncio.gather(*notifications, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning(f"发送排队位置通知失败: {str(result)}")
+
+    def _dispatch(self):
+        """空出名额时按轮询顺序放行排队请求"""
+        while self._active < self.max_concurrent and self._round_robin:
+            user = self._round_robin.popleft()
+            queue = self._queues[user]
+            entry = queue.popleft()
+            self._waiting -= 1
+            if queue:
+                # 该用户还有请求，排到轮询队尾
+                self._round_robin.append(user)
+            else:
+                del self._queues[user]
+            self._active += 1
+            entry["start"].set_result(True)
+
+    def _remove(self, entry):
+        """从队列中移除一个尚未开始的请求（提问者取消时）"""
+        queue = self._queues.get(entry["user"])
+        if queue is None or entry not in queue:
+            return
+        queue.remove(entry)
+        self._waiting -= 1
+        if not queue:
+            del self._queues[entry["user"]]
+            self._round_robin.remove(entry["user"])
+
+    async def run(self, user, job, on_position=None):
+        """
+        在调度器控制下执行一次大模型请求
+
+        Args:
+            user: 提问者（用于公平轮询）
+            job: 无参数的协程函数，轮到该请求时调用
+            on_position: 排队位置变化时调用的协程函数，参数为排位（从1开始）
+
+        Returns:
+            tuple: (accepted, result) - 是否被受理，job的返回值或拒绝原因
+        """
+        queued = False
+        if self._active < self.max_concurrent and not self._waiting:
+            self._active += 1
+        else:
+            queued = True
+            if self._waiting >= self.max_queue:
+                self.rejected += 1
+                return False, "苹果派当前排队人数已满，请稍后再试"
+            if len(self._queues.get(user, ())) >= self.max_per_user:
+                self.rejected += 1
+                return False, f"你已有 {self.max_per_user} 个问题在排队，请等待回答后再提问"
+
+            entry = {
+                "user": user,
+                "start": asyncio.get_running_loop().create_future(),
+                "on_position": on_position,
+                "position": None
+            }
+            if user not in self._queues:
+                self._queues[user] = deque()
+                self._round_robin.append(user)
+            self._queues[user].append(entry)
+            self._waiting += 1
+            logger.info(f"大模型请求排队: {user}，当前排队 {self._waiting} 个，进行中 {self._active} 个")
+
+            try:
+                # 通知也可能被取消（例如提问者断开），放在try中保证取消时移出队列
+                await self._notify_positions()
+                await entry["start"]
+            except asyncio.CancelledError:
+                if entry["start"].done() and not entry["start"].cancelled():
+                    # 已经被放行但还没开始执行，归还名额
+                    self._active -= 1
+                    self._dispatch()
+                else:
+                    self._remove(entry)
+                # 名额和队列已经恢复，再通知其余请求（此时再次被取消也不影响调度器状态）
+                await self._notify_positions()
+                raise
+
+        try:
+            if queued:
+                # 其余排队请求的位置都前移了一位
+                await self._notify_positions()
+            return True, await job()
+        finally:
+            self._active -= 1
+            self.completed += 1
+            self._dispatch()
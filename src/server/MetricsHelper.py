@@ -0,0 +1,185 @@
+import bisect
+import logging
+
+logger = logging.getLogger("ChatServer")
+
+
+class Histogram:
+    """
+    内存中的直方图
+
+    桶边界按对数刻度划分（每个数量级4个桶），内存占用固定，
+    分位数按桶内线性插值估算，精度对排查延迟问题足够。
+    """
+
+    # 默认桶边界：0.1 ~ 100000，每个数量级 1, 1.8, 3.2, 5.6
+    DEFAULT_BOUNDS = [round(10 ** (exponent / 4), 4) for exponent in range(-4, 21)]
+
+    def __init__(self, bounds=None):
+        """
+        初始化直方图
+
+        Args:
+            bounds: 递增的桶上边界列表，超过最后一个边界的值计入溢出桶
+        """
+        self.bounds = list(bounds or Histogram.DEFAULT_BOUNDS)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        """
+        记录一个观测值
+
+        Args:
+            value: 观测值（负数按0处理）
+        """
+        value = max(0.0, float(value))
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """
+        估算分位数
+
+        Args:
+            q: 分位（0~1）
+
+        Returns:
+            float/None: 分位数估计值，没有数据时返回None
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count or seen + bucket_count < rank:
+                seen += bucket_count
+                continue
+            lower = self.bounds[index - 1] if index > 0 else 0.0
+            upper = self.bounds[index] if index < len(self.bounds) else self.max
+            # 桶内线性插值，结果限制在实际的最小值和最大值之间
+            estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+            return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def stats(self):
+        """
+        获取直方图摘要
+
+        Returns:
+            dict: 次数、平均值、最小值、p50/p90/p99和最大值
+        """
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 2),
+            "min": round(self.min, 2),
+            "p50": round(self.percentile(0.5), 2),
+            "p90": round(self.percentile(0.9), 2),
+            "p99": round(self.percentile(0.99), 2),
+            "max": round(self.max, 2)
+        }
+
+
+class MetricsHelper:
+    """
+    服务器性能指标
+
+    各处代码按名称记录观测值（例如llm_ttft_ms），同名的值汇总到同一个直方图，
+    由管理员命令查看。指标只保存在内存中，服务器重启后清零。
+    """
+
+    # 指标名称 -> 说明（用于报告中的显示顺序和名称）
+    DESCRIPTIONS = {
+        "llm_queue_ms": "排队等待 (ms)",
+        "llm_connect_ms": "建立连接 (ms)",
+        "llm_headers_ms": "响应头到达 (ms)",
+        "llm_ttft_ms": "首字延迟 (ms)",
+        "llm_tokens_per_second": "输出速度 (片段/秒)",
+        "llm_duration_ms": "请求总耗时 (ms)",
+        "broadcast_frame_ms": "单帧广播 (ms)",
+        "broadcast_stream_ms": "整条回复广播 (ms)",
+        "event_loop_lag_ms": "事件循环延迟 (ms)",
+        "image_preload_ms": "图片预加载等待 (ms)"
+    }
+
+    _histograms = {}
+    _counters = {}
+
+    @staticmethod
+    def observe(name, value):
+        """
+        记录一个观测值
+
+        Args:
+            name: 指标名称
+            value: 观测值
+        """
+        histogram = MetricsHelper._histograms.get(name)
+        if histogram is None:
+            histogram = MetricsHelper._histograms[name] = Histogram()
+        histogram.observe(value)
+
+    @staticmethod
+    def increment(name, amount=1):
+        """
+        累加一个计数器
+
+        Args:
+            name: 计数器名称
+            amount: 增加的数量
+        """
+        MetricsHelper._counters[name] = MetricsHelper._counters.get(name, 0) + amount
+
+    @staticmethod
+    def snapshot():
+        """
+        获取所有指标的摘要
+
+        Returns:
+            dict: {"histograms": {名称: 摘要}, "counters": {名称: 数值}}
+        """
+        return {
+            "histograms": {name: histogram.stats() for name, histogram in MetricsHelper._histograms.items()},
+            "counters": dict(MetricsHelper._counters)
+        }
+
+    @staticmethod
+    def reset():
+        """清空所有指标"""
+        MetricsHelper._histograms.clear()
+        MetricsHelper._counters.clear()
+
+    @staticmethod
+    def format_report():
+        """
+        把直方图格式化为便于在聊天窗口中阅读的文本
+
+        Returns:
+            str: 每个指标一行，包含次数、平均值和分位数
+        """
+        names = [name for name in MetricsHelper.DESCRIPTIONS if name in MetricsHelper._histograms]
+        names += sorted(name for name in MetricsHelper._histograms if name not in MetricsHelper.DESCRIPTIONS)
+        if not names and not MetricsHelper._counters:
+            return "暂无性能数据"
+
+        lines = []
+        for name in names:
+            stats = MetricsHelper._histograms[name].stats()
+            label = MetricsHelper.DESCRIPTIONS.get(name, name)
+            lines.append(
+                f"{label}: {stats['count']}次 平均{stats['mean']:g} "
+                f"p50 {stats['p50']:g} p90 {stats['p90']:g} p99 {stats['p99']:g} 最大{stats['max']:g}"
+            )
+        for name, value in sorted(MetricsHelper._counters.items()):
+            lines.append(f"{name}: {value}")
+        return "\n".join(lines)
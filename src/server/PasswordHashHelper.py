@@ -0,0 +1,178 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import statistics
+import time
+from passlib.hash import pbkdf2_sha256
+
+logger = logging.getLogger("ChatServer")
+
+
+class PasswordHashHelper:
+    """
+    密码哈希助手
+
+    迭代次数由calibrate命令根据本机性能测得，保存在password-hash-config.json中。
+    哈希串本身（$pbkdf2-sha256$<迭代次数>$<盐值>$<摘要>）记录了每个用户的迭代次数，
+    登录成功时如果低于当前配置，会用新的迭代次数重新哈希；
+    高于当前配置的哈希只有在校准过（存在配置文件）时才会降低，未校准时的默认值不会削弱已有哈希。
+    """
+
+    CONFIG_FILE = os.path.join(os.path.dirname(__file__), "password-hash-config.json")
+    # 校准结果的下限，避免在很慢的机器上得到过低的强度
+    MIN_ROUNDS = 10000
+    MAX_ROUNDS = 2000000
+    # 默认目标：单次哈希约50毫秒
+    DEFAULT_TARGET_MS = 50
+
+    _rounds = None
+    # 迭代次数是否来自校准配置文件
+    _calibrated = False
+
+    @staticmethod
+    def load_config():
+        """
+        读取迭代次数配置
+        :return: 迭代次数，未校准时使用passlib默认值
+        """
+        rounds = pbkdf2_sha256.default_rounds
+        calibrated = False
+        try:
+            if os.path.exists(PasswordHashHelper.CONFIG_FILE):
+                with open(PasswordHashHelper.CONFIG_FILE, 'r', encoding='utf-8') as f:
+                    rounds = int(json.load(f)["rounds"])
+                calibrated = True
+        except (json.JSONDecodeError, KeyError, ValueError, IOError) as e:
+            logger.error(f"加载密码哈希配置失败，使用默认迭代次数: {e}")
+        PasswordHashHelper._rounds = rounds
+        PasswordHashHelper._calibrated = calibrated
+        return rounds
+
+    @staticmethod
+    def get_rounds():
+        """
+        获取当前使用的迭代次数
+        :return: 迭代次数
+        """
+        if PasswordHashHelper._rounds is None:
+            PasswordHashHelper.load_config()
+        return PasswordHashHelper._rounds
+
+    @staticmethod
+    def hash(password):
+        """
+        使用当前配置的迭代次数哈希密码
+        :param password: 明文密码
+        :return: 哈希串
+        """
+        return pbkdf2_sha256.using(rounds=PasswordHashHelper.get_rounds()).hash(password)
+
+    @staticmethod
+    def needs_rehash(password_hash):
+        """
+        检查哈希串是否需要按当前配置重新哈希
+        :param password_hash: 哈希串
+        :return: 迭代次数低于当前配置，或校准后高于当前配置时返回True
+        """
+        try:
+            rounds = pbkdf2_sha256.from_string(password_hash).rounds
+        except ValueError:
+            return False
+        target = PasswordHashHelper.get_rounds()
+        if rounds < target:
+            return True
+        # 没有校准配置时target只是passlib的默认值，不能据此降低已有哈希的强度
+        return rounds > target and PasswordHashHelper._calibrated
+
+    @staticmethod
+    def verify_and_update(password, password_hash):
+        """
+        验证密码，并在迭代次数过期时生成新的哈希串
+        :param password: 明文密码
+        :param password_hash: 数据库中的哈希串
+        :return: (是否正确, 新哈希串或None)
+        """
+        if not pbkdf2_sha256.verify(password, password_hash):
+            return False, None
+        if PasswordHashHelper.needs_rehash(password_hash):
+            return True, PasswordHashHelper.hash(password)
+        return True, None
+
+    @staticmethod
+    def measure(rounds, samples=5):
+        """
+        测量指定迭代次数下单次哈希的耗时
+        :param rounds: 迭代次数
+        :param samples: 采样次数
+        :return: 耗时中位数（毫秒）
+        """
+        handler = pbkdf2_sha256.using(rounds=rounds)
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            handler.hash("calibration-password")
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    @staticmethod
+    def calibrate(target_ms=DEFAULT_TARGET_MS, samples=5):
+        """
+        测量本机哈希速度，计算达到目标耗时所需的迭代次数
+        :param target_ms: 单次哈希的目标耗时（毫秒）
+        :param samples: 每次测量的采样次数
+        :return: (迭代次数, 实测耗时毫秒)
+        """
+        probe_rounds = 20000
+        probe_ms = PasswordHashHelper.measure(probe_rounds, samples)
+        rounds = int(probe_rounds * target_ms / probe_ms)
+        # 取整到千位，并限制在合理范围内
+        rounds = max(PasswordHashHelper.MIN_ROUNDS, min(PasswordHashHelper.MAX_ROUNDS, round(rounds, -3)))
+        return rounds, PasswordHashHelper.measure(rounds, samples)
+
+    @staticmethod
+    def save_config(rounds, target_ms, measured_ms):
+        """
+        保存校准结果
+        :return: 保存成功返回True，否则返回False
+        """
+        config = {
+            "scheme": "pbkdf2_sha256",
+            "rounds": rounds,
+            "target_ms": target_ms,
+            "measured_ms": round(measured_ms, 2),
+            "calibrated_at": datetime.datetime.now().isoformat(timespec='seconds')
+        }
+        try:
+            with open(PasswordHashHelper.CONFIG_FILE, 'w', encoding='utf-8') as f:
+                json.dump(config, f, ensure_ascii=False, indent=2)
+            PasswordHashHelper._rounds = rounds
+            PasswordHashHelper._calibrated = True
+            return True
+        except IOError as e:
+            logger.error(f"保存密码哈希配置失败: {e}")
+            return False
+
+
+# 直接运行脚本时执行校准
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="根据本机性能校准密码哈希的迭代次数")
+    parser.add_argument('--target-ms', type=float, default=PasswordHashHelper.DEFAULT_TARGET_MS,
+                        help=f"单次哈希的目标耗时，单位毫秒（默认: {PasswordHashHelper.DEFAULT_TARGET_MS}）")
+    parser.add_argument('--dry-run', action='store_true', help="只显示结果，不写入配置文件")
+    args = parser.parse_args()
+
+    current_rounds = PasswordHashHelper.get_rounds()
+    current_ms = PasswordHashHelper.measure(current_rounds)
+    print(f"当前迭代次数: {current_rounds}，单次哈希 {current_ms:.1f} 毫秒，单核约 {1000 / current_ms:.0f} 次登录/秒")
+
+    rounds, measured_ms = PasswordHashHelper.calibrate(args.target_ms)
+    print(f"校准结果: 迭代次数 {rounds}，单次哈希 {measured_ms:.1f} 毫秒，单核约 {1000 / measured_ms:.0f} 次登录/秒")
+
+    if args.dry_run:
+        print("未写入配置文件（--dry-run）")
+    elif PasswordHashHelper.save_config(rounds, args.target_ms, measured_ms):
+        print(f"已写入 {PasswordHashHelper.CONFIG_FILE}，用户将在下次登录时自动更新哈希")
+    else:
+        print("写入配置文件失败")
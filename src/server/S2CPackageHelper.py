@@ -118,23 +118,33 @@ class S2CPackageHelper:
         return stream_message
         
     @staticmethod
-    def create_sse_stream_message(message, event_type="chunk"):
+    def create_sse_stream_message(message, event_type="chunk", stream_id=None, requester=None, stream_seq=None):
         """
         创建SSE流式消息（用于大模型对话，对应@苹果派指令）
         
+        同一房间可以同时进行多个流式回复，客户端按stream_id区分，按stream_seq排序去重
+        
         Args:
             message: 消息内容
             event_type: 事件类型（start/chunk/end），默认为chunk
+            stream_id: 流式回复的唯一ID
+            requester: 提问者用户名
+            stream_seq: 该消息在本次流式回复中的序号（start为0，依次递增）
             
         Returns:
             dict: SSE流式消息对象
         """
-        return {
+        message_data = {
             "type": "sse_stream",
             "message": message,
             "event_type": event_type,
             "time": datetime.datetime.now().strftime("%H:%M:%S")
         }
+        if stream_id is not None:
+            message_data["stream_id"] = stream_id
+            message_data["requester"] = requester
+            message_data["stream_seq"] = stream_seq
+        return message_data
         
     @staticmethod
     def create_movie_message(url, sender="系统"):
@@ -156,7 +166,7 @@ class S2CPackageHelper:
         }
         
     @staticmethod
-    def create_hot_search_message(message, user="热搜榜", avatar="🔥"):
+    def create_hot_search_message(message, user="热搜榜", avatar="🔥", updated_at=None):
         """
         创建热搜消息（对应@热搜指令）
         
@@ -164,6 +174,7 @@ class S2CPackageHelper:
             message: 热搜内容
             user: 发送者名称
             avatar: 头像标识
+            updated_at: 热搜榜的更新时间（HH:MM）
             
         Returns:
             dict: 热搜消息对象
@@ -177,6 +188,9 @@ class S2CPackageHelper:
         
         if avatar:
             hot_search_message["avatar"] = avatar
+        
+        if updated_at:
+            hot_search_message["updated_at"] = updated_at
             
         return hot_search_message
         
@@ -424,6 +438,28 @@ class S2CPackageHelper:
             "time": datetime.datetime.now().strftime("%H:%M:%S")
         }
     
+    @staticmethod
+    def create_history_message(room, messages, has_more=False):
+        """
+        创建聊天记录消息（登录、切换房间或分页加载时发送）
+        
+        Args:
+            room: 房间名称
+            messages: 按序号升序排列的历史消息列表
+            has_more: 是否还有更早的消息
+            
+        Returns:
+            dict: 聊天记录消息对象
+        """
+        return {
+            "type": "history",
+            "room": room,
+            "messages": messages,
+            "has_more": has_more,
+            "oldest_seq": messages[0].get("seq") if messages else None,
+            "time": datetime.datetime.now().strftime("%H:%M:%S")
+        }
+    
     @staticmethod
     def create_heartbeat_response():
         """
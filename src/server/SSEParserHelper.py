@@ -0,0 +1,94 @@
+class SSEParserHelper:
+    """
+    增量SSE（text/event-stream）解析器
+
+    直接处理网络读到的字节块，不要求块边界与行边界对齐：
+    不完整的行留在缓冲区等待下一块；行结束符支持\\n、\\r\\n和单独的\\r；
+    一个事件可以由多行data:组成，按规范用\\n拼接；以:开头的注释行（心跳）会被忽略。
+    """
+
+    UTF8_BOM = b"\xef\xbb\xbf"
+
+    def __init__(self):
+        self._buffer = b""
+        # 当前事件已收到的data行
+        self._data = []
+        self._event = None
+        self._started = False
+        self.last_event_id = None
+
+    def feed(self, chunk):
+        """
+        写入一块字节数据
+
+        Args:
+            chunk: 从网络读到的字节
+
+        Returns:
+            list: 本次数据中完整结束的事件，每项为(event, data)，event默认为"message"
+        """
+        data = self._buffer + chunk if self._buffer else bytes(chunk)
+        if not self._started and data:
+            if len(data) < len(self.UTF8_BOM) and self.UTF8_BOM.startswith(data):
+                # 还不能确定开头是否为BOM
+                self._buffer = data
+                return []
+            self._started = True
+            if data.startswith(self.UTF8_BOM):
+                data = data[len(self.UTF8_BOM):]
+
+        held = b""
+        if b"\r" in data:
+            # 结尾的\r可能和下一块开头的\n组成一个\r\n，先留到下一块再处理
+            if data.endswith(b"\r"):
+                held = b"\r"
+                data = data[:-1]
+            data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        lines = data.split(b"\n")
+        self._buffer = lines.pop() + held
+        events = []
+        for line in lines:
+            self._process_line(line, events)
+        return events
+
+    def close(self):
+        """
+        输入结束，处理缓冲区中剩余的数据
+
+        服务端可能省略最后一个空行，这里仍然把已收到的数据作为最后一个事件返回。
+
+        Returns:
+            list: 剩余的事件，格式同feed
+        """
+        events = []
+        rest = self._buffer.rstrip(b"\r")
+        self._buffer = b""
+        if rest:
+            self._process_line(rest, events)
+        self._process_line(b"", events)
+        return events
+
+    def _process_line(self, line, events):
+        """处理一个完整的行（不含行结束符）"""
+        if not line:
+            # 空行：派发当前事件
+            if self._data:
+                events.append((self._event or "message", "\n".join(self._data)))
+                self._data = []
+            self._event = None
+            return
+        if line[0] == 0x3A:
+            # 注释行
+            return
+
+        field, _, value = line.partition(b":")
+        if value[:1] == b" ":
+            value = value[1:]
+        if field == b"data":
+            self._data.append(value.decode("utf-8", errors="replace"))
+        elif field == b"event":
+            self._event = value.decode("utf-8", errors="replace")
+        elif field == b"id":
+            self.last_event_id = value.decode("utf-8", errors="replace")
+        # retry及未知字段忽略
@@ -1,26 +1,50 @@
-import requests
-from bs4 import BeautifulSoup
-import json
+import asyncio
+import aiohttp
+import glob
+import hashlib
 import os
+import random
+import re
+import tempfile
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 
-# 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+from HttpSessionHelper import HttpSessionHelper
+from JobStatusHelper import JobStatusHelper
+
+logger = logging.getLogger("ChatServer")
+
+
+class NewsImageNotFoundError(Exception):
+    """新闻图片不存在（404），重试也没有用"""
+
 
 # 创建SixtySecondHelper类用于导出
 class SixtySecondHelper:
-    # 类级别的常量和方法
+    """
+    每天60秒读懂世界：抓取当天的新闻图片
+
+    使用共享的aiohttp会话异步抓取，不再占用工作线程。网络错误按指数退避重试；
+    图片边下载边写入同目录下的临时文件，下载完整后再原子地重命名，
+    客户端不会读到写了一半的图片。多个@新闻同时触发时共用同一次抓取。
+
+    图片按 日期-内容哈希.png 命名保存在images/news目录中，同一个文件名的内容永远不变，
+    静态文件服务器可以让浏览器长期缓存，每个客户端每天的图片最多下载一次。
+    """
 
-    # 类级别的常量和方法
     # 常量定义
     URL = "https://blog.intelexe.cn/display_images.php"
-    # 修正为相对于服务器的路径
-    STATUS_FILE = os.path.join(os.path.dirname(__file__), "status.json")
-    # 图片保存到client/images目录下
-    IMAGE_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(__file__)), "client", "images", "news.png")
+    # 抓取结果记录在JobStatusHelper中的任务名称；旧版本使用的状态文件在第一次使用时导入
+    JOB_NAME = "news"
+    LEGACY_STATUS_FILE = os.path.join(os.path.dirname(__file__), "status.json")
+    # 图片保存到client/images/news目录下，IMAGE_URL_PREFIX是客户端访问该目录的路径
+    IMAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "client", "images", "news")
+    IMAGE_URL_PREFIX = "src/client/images/news/"
+    # 保留最近多少天的图片（聊天记录中较早的新闻消息仍引用这些图片）
+    KEEP_DAYS = 30
+    # 下载中断（例如进程被杀死）留下的临时文件超过该时间（秒）后删除，正在进行的下载不会这么久
+    PART_MAX_AGE = 3600
     USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36 Edg/142.0.0.0"
 
     # 请求头
@@ -28,38 +52,114 @@ class SixtySecondHelper:
         "User-Agent": USER_AGENT,
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
         "Accept-Language": "zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7,en-GB;q=0.6",
-        "Accept-Encoding": "gzip, deflate, br, zstd",
-        "Connection": "keep-alive",
         "Upgrade-Insecure-Requests": "1"
     }
 
+    # 重试参数：第n次重试前等待 min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2^n) 秒（带随机抖动）
+    MAX_RETRIES = 3
+    RETRY_BASE_DELAY = 1.0
+    RETRY_MAX_DELAY = 10.0
+    CHUNK_SIZE = 65536
+
+    # 每日预取：源站每天早上发布当天的图片，发布时间之后每隔POLL_INTERVAL秒检查一次，直到抓取成功
+    PUBLISH_HOUR = 6
+    PUBLISH_MINUTE = 0
+    POLL_INTERVAL = 600
+    # 预取还没成功时，@新闻临时触发抓取的最小间隔（秒），避免频繁请求源站
+    ON_DEMAND_INTERVAL = 60
+    # 长时间等待时分段休眠，系统时间调整后也能按时醒来
+    MAX_SLEEP = 3600
+
+    # 可以重试的错误：网络错误、超时和连接中断
+    RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError)
+
+    UPDATE_HINT_PATTERN = re.compile(r'<[^>]*\bid=["\']update_hint["\'][^>]*>(.*?)</', re.S)
+
+    _fetch_task = None
+    _legacy_imported = False
+    # 已经抓取到图片的日期（YYYY-MM-DD）和图片文件，@新闻据此判断能否直接发送
+    _ready_date = None
+    _ready_file = None
+    _last_attempt = None
+    next_run_at = None
+    fetches = 0
+    fetch_errors = 0
+    coalesced = 0
+    last_error = None
+
+    @staticmethod
+    async def get_session():
+        """
+        获取抓取新闻使用的共享会话
+
+        Returns:
+            aiohttp.ClientSession: 共享会话
+        """
+        return await HttpSessionHelper.open("sixty_seconds", limit=4, limit_per_host=2, connect_timeout=10,
+                                            read_timeout=30, headers=SixtySecondHelper.headers)
+
     @staticmethod
-    def get_page_content():
+    def retry_delay(attempt):
+        """
+        计算第attempt次重试前的等待时间
+
+        Args:
+            attempt: 已失败的次数（从0开始）
+
+        Returns:
+            float: 等待秒数
+        """
+        delay = min(SixtySecondHelper.RETRY_MAX_DELAY, SixtySecondHelper.RETRY_BASE_DELAY * (2 ** attempt))
+        # 随机抖动，避免多个任务在同一时刻重试
+        return delay * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    async def with_retries(operation, description):
+        """
+        执行一个网络操作，遇到网络错误或超时时按指数退避重试
+
+        Args:
+            operation: 无参数的协程函数
+            description: 用于日志的操作描述
+
+        Returns:
+            operation的返回值
+
+        Raises:
+            NewsImageNotFoundError: 资源不存在，不重试
+            Exception: 重试次数用完后的最后一个错误
+        """
+        max_retries = SixtySecondHelper.MAX_RETRIES
+        for attempt in range(max_retries):
+            try:
+                return await operation()
+            except SixtySecondHelper.RETRYABLE_ERRORS as e:
+                error = f"{type(e).__name__} {str(e)}".strip()
+                if attempt == max_retries - 1:
+                    logger.error(f"{description}失败（已尝试{max_retries}次）: {error}")
+                    raise
+                delay = SixtySecondHelper.retry_delay(attempt)
+                logger.warning(f"{description}失败，{delay:.1f}秒后重试 ({attempt + 1}/{max_retries}): {error}")
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    async def get_page_content():
         """
         获取页面内容
         :return: 页面HTML内容，如果获取失败返回None
         """
+        logger.info(f"正在获取页面内容: {SixtySecondHelper.URL}")
+        session = await SixtySecondHelper.get_session()
+
+        async def request():
+            async with session.get(SixtySecondHelper.URL) as response:
+                response.raise_for_status()
+                logger.info(f"成功获取页面内容，状态码: {response.status}")
+                return await response.text(errors="replace")
+
         try:
-            logger.info(f"正在获取页面内容: {SixtySecondHelper.URL}")
-            # 添加重试机制
-            max_retries = 3
-            for retry in range(max_retries):
-                try:
-                    response = requests.get(SixtySecondHelper.URL, headers=SixtySecondHelper.headers, timeout=30)
-                    response.raise_for_status()  # 检查HTTP状态码
-                    logger.info(f"成功获取页面内容，状态码: {response.status_code}")
-                    # 记录响应头信息，有助于调试
-                    logger.debug(f"响应头: {dict(response.headers)}")
-                    return response.text
-                except requests.exceptions.RequestException as e:
-                    if retry < max_retries - 1:
-                        logger.warning(f"获取页面失败，正在重试 ({retry + 1}/{max_retries}): {e}")
-                        time.sleep(2)  # 等待2秒后重试
-                    else:
-                        logger.error(f"获取页面内容失败（已尝试{max_retries}次）: {e}")
-                        return None
-        except Exception as e:
-            logger.error(f"获取页面内容时发生未知错误: {e}")
+            return await SixtySecondHelper.with_retries(request, "获取页面")
+        except SixtySecondHelper.RETRYABLE_ERRORS:
             return None
 
     @staticmethod
@@ -69,43 +169,17 @@ class SixtySecondHelper:
         :param html_content: 页面HTML内容
         :return: 如果更新状态为"今日已更新"返回True，否则返回False
         """
-        try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # 方法1：直接查找id为update_hint的元素
-            update_hint = soup.find(id="update_hint")
-            if update_hint:
-                status_text = update_hint.get_text().strip()
-                logger.info(f"通过ID找到更新状态: {status_text}")
-                return "今日已更新" in status_text
-            
-            # 方法2：查找包含"今日已更新"文本的任何元素
-            elements_with_text = soup.find_all(string=lambda text: text and "今日已更新" in text)
-            if elements_with_text:
-                for element in elements_with_text:
-                    parent = element.find_parent()
-                    if parent:
-                        logger.info(f"通过文本找到更新状态元素: {parent.get_text().strip()}")
-                        return True
-            
-            # 方法3：查找可能包含更新状态的常见标签
-            common_tags = soup.find_all(['div', 'span', 'p', 'h1', 'h2', 'h3'])
-            for tag in common_tags:
-                text = tag.get_text().strip()
-                if "今日已更新" in text:
-                    logger.info(f"通过常见标签找到更新状态: {text}")
-                    return True
-            
-            # 方法4：直接在HTML字符串中搜索
-            if "今日已更新" in html_content:
-                logger.info("在HTML内容中找到'今日已更新'文本")
-                return True
-            
-            logger.warning("未找到更新状态元素或文本")
-            return False
-        except Exception as e:
-            logger.error(f"检查更新状态时出错: {e}")
-            return False
+        # 页面中有更新提示元素时以它为准，否则在整个页面中查找
+        match = SixtySecondHelper.UPDATE_HINT_PATTERN.search(html_content)
+        if match:
+            status_text = re.sub(r"<[^>]+>", "", match.group(1)).strip()
+            logger.info(f"找到更新状态: {status_text}")
+            return "今日已更新" in status_text
+        if "今日已更新" in html_content:
+            logger.info("在HTML内容中找到'今日已更新'文本")
+            return True
+        logger.warning("未找到更新状态元素或文本")
+        return False
 
     @staticmethod
     def get_today_date_str():
@@ -130,132 +204,122 @@ class SixtySecondHelper:
         :param html_content: 页面HTML内容
         :return: 图片的绝对URL
         """
-        try:
-            # 使用备用方案：直接构造图片URL
-            today_code = SixtySecondHelper.get_today_date_code()
-            img_url = f"https://blog.intelexe.cn/images/60秒_{today_code}_帆船网络.png"
-            logger.info(f"使用备用方案构造图片URL: {img_url}")
-            return img_url
-        except Exception as e:
-            logger.error(f"构造图片URL时出错: {e}")
-            return None
+        # 使用备用方案：直接构造图片URL
+        today_code = SixtySecondHelper.get_today_date_code()
+        img_url = f"https://blog.intelexe.cn/images/60秒_{today_code}_帆船网络.png"
+        logger.info(f"使用备用方案构造图片URL: {img_url}")
+        return img_url
 
     @staticmethod
-    def download_image(image_url, output_path):
+    def find_image(date_str):
         """
-        下载图片
-        :param image_url: 图片URL
-        :param output_path: 输出路径
-        :return: 下载成功返回True，否则返回False
+        在图片目录中查找某一天的图片（同一天有多个版本时取最新的）
+        :param date_str: 日期字符串YYYY-MM-DD
+        :return: 图片文件的绝对路径，没有时返回None
         """
-        try:
-            logger.info(f"正在下载图片: {image_url}")
-            
-            # 添加重试机制
-            max_retries = 3
-            for retry in range(max_retries):
-                try:
-                    response = requests.get(image_url, headers=SixtySecondHelper.headers, timeout=60, stream=True)
-                    
-                    # 检查是否为404错误
-                    if response.status_code == 404:
-                        logger.error(f"图片不存在（404错误）: {image_url}")
-                        return False
-                    
-                    response.raise_for_status()
-                    
-                    # 检查响应内容类型是否为图片
-                    content_type = response.headers.get('Content-Type', '')
-                    if not content_type.startswith('image/'):
-                        logger.warning(f"下载的内容不是图片，Content-Type: {content_type}")
-                        # 仍然尝试保存，因为有时候服务器可能不会正确设置Content-Type
-                    
-                    # 确保文件目录存在
-                    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
-                    
-                    # 写入文件
-                    with open(output_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                    
-                    # 验证文件大小
-                    file_size = os.path.getsize(output_path)
-                    logger.info(f"图片下载成功: {output_path}, 文件大小: {file_size} 字节")
-                    
-                    # 检查文件是否为空
-                    if file_size == 0:
-                        logger.error("下载的图片文件为空")
-                        os.remove(output_path)  # 删除空文件
-                        return False
-                    
-                    return True
-                except requests.exceptions.RequestException as e:
-                    if retry < max_retries - 1:
-                        logger.warning(f"下载图片失败，正在重试 ({retry + 1}/{max_retries}): {e}")
-                        time.sleep(3)  # 等待3秒后重试
-                    else:
-                        logger.error(f"下载图片失败（已尝试{max_retries}次）: {e}")
-                        return False
-        except IOError as e:
-            logger.error(f"保存图片失败: {e}")
-            # 清理可能的不完整文件
-            if os.path.exists(output_path):
-                try:
-                    os.remove(output_path)
-                    logger.info(f"已删除不完整的图片文件: {output_path}")
-                except:
-                    pass
-            return False
-        except Exception as e:
-            logger.error(f"下载图片时发生未知错误: {e}")
-            # 清理可能的不完整文件
-            if os.path.exists(output_path):
-                try:
-                    os.remove(output_path)
-                    logger.info(f"已删除不完整的图片文件: {output_path}")
-                except:
-                    pass
-            return False
+        paths = glob.glob(os.path.join(SixtySecondHelper.IMAGE_DIR, f"{date_str}-*.png"))
+        return max(paths, key=os.path.getmtime) if paths else None
 
     @staticmethod
-    def get_current_timestamp():
+    def prune_images(keep_days=KEEP_DAYS):
         """
-        获取当前时间戳
-        :return: 时间戳
+        删除超过keep_days天的图片，以及下载中断后遗留的临时文件
+        :param keep_days: 保留的天数
         """
-        return datetime.now().isoformat()
+        cutoff = (datetime.now() - timedelta(days=keep_days)).strftime("%Y-%m-%d")
+        for path in glob.glob(os.path.join(SixtySecondHelper.IMAGE_DIR, "*.png")):
+            # 文件名以日期开头，按字符串比较即可
+            if os.path.basename(path)[:10] < cutoff:
+                try:
+                    os.remove(path)
+                    logger.info(f"已删除过期的新闻图片: {path}")
+                except OSError as e:
+                    logger.warning(f"删除过期的新闻图片失败: {path}, {e}")
+
+        part_cutoff = time.time() - SixtySecondHelper.PART_MAX_AGE
+        for path in glob.glob(os.path.join(SixtySecondHelper.IMAGE_DIR, ".news-*.part")):
+            try:
+                if os.path.getmtime(path) < part_cutoff:
+                    os.remove(path)
+                    logger.info(f"已删除遗留的临时文件: {path}")
+            except OSError as e:
+                logger.warning(f"删除遗留的临时文件失败: {path}, {e}")
 
     @staticmethod
-    def load_status():
+    async def download_image(image_url, output_dir, date_str):
         """
-        加载状态文件
-        :return: 状态字典，如果文件不存在返回空字典
+        下载图片：流式写入output_dir中的临时文件，完整下载后按 日期-内容哈希.png 原子地重命名
+        :param image_url: 图片URL
+        :param output_dir: 输出目录
+        :param date_str: 图片的日期YYYY-MM-DD
+        :return: 下载成功返回图片的绝对路径，否则返回None
         """
+        logger.info(f"正在下载图片: {image_url}")
+        os.makedirs(output_dir, exist_ok=True)
+        session = await SixtySecondHelper.get_session()
+
+        async def request():
+            async with session.get(image_url, timeout=aiohttp.ClientTimeout(sock_connect=10, sock_read=60)) as response:
+                # 404说明今天的图片还没有发布，重试也没有用
+                if response.status == 404:
+                    raise NewsImageNotFoundError(f"图片不存在（404错误）: {image_url}")
+                response.raise_for_status()
+
+                content_type = response.headers.get('Content-Type', '')
+                if not content_type.startswith('image/'):
+                    # 仍然尝试保存，因为有时候服务器可能不会正确设置Content-Type
+                    logger.warning(f"下载的内容不是图片，Content-Type: {content_type}")
+
+                # 临时文件和目标文件在同一目录，保证os.replace是原子操作
+                fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".news-", suffix=".part")
+                try:
+                    size = 0
+                    digest = hashlib.sha256()
+                    with os.fdopen(fd, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(SixtySecondHelper.CHUNK_SIZE):
+                            f.write(chunk)
+                            digest.update(chunk)
+                            size += len(chunk)
+                    if size == 0:
+                        raise aiohttp.ClientPayloadError("下载的图片文件为空")
+                    # 压缩传输时Content-Length是压缩后的大小，无法用来校验
+                    expected = None if response.headers.get('Content-Encoding') else response.content_length
+                    if expected is not None and size != expected:
+                        raise aiohttp.ClientPayloadError(f"图片下载不完整: {size}/{expected} 字节")
+                    # mkstemp创建的文件只有所有者可读，改为与普通静态文件相同的权限
+                    os.chmod(temp_path, 0o644)
+                    output_path = os.path.join(output_dir, f"{date_str}-{digest.hexdigest()[:12]}.png")
+                    os.replace(temp_path, output_path)
+                except BaseException:
+                    # 出错或被取消时删除不完整的临时文件
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+                    raise
+                return output_path, size
+
         try:
-            if os.path.exists(SixtySecondHelper.STATUS_FILE):
-                with open(SixtySecondHelper.STATUS_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"加载状态文件失败: {e}")
-            return {}
+            output_path, size = await SixtySecondHelper.with_retries(request, "下载图片")
+        except NewsImageNotFoundError as e:
+            logger.error(str(e))
+            return None
+        except SixtySecondHelper.RETRYABLE_ERRORS:
+            return None
+        logger.info(f"图片下载成功: {output_path}, 文件大小: {size} 字节")
+        return output_path
 
     @staticmethod
-    def save_status(status_data):
+    def get_status_store():
         """
-        保存状态文件
-        :param status_data: 要保存的状态数据
-        :return: 保存成功返回True，否则返回False
+        获取记录每天抓取结果的状态存储（第一次调用时导入旧的status.json）
+        :return: JobStatusHelper
         """
-        try:
-            with open(SixtySecondHelper.STATUS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(status_data, f, ensure_ascii=False, indent=2)
-            logger.info("状态文件保存成功")
-            return True
-        except IOError as e:
-            logger.error(f"保存状态文件失败: {e}")
-            return False
+        store = JobStatusHelper.shared()
+        if not SixtySecondHelper._legacy_imported:
+            SixtySecondHelper._legacy_imported = True
+            store.import_json(SixtySecondHelper.JOB_NAME, SixtySecondHelper.LEGACY_STATUS_FILE)
+        return store
 
     @staticmethod
     def check_today_status():
@@ -263,121 +327,186 @@ class SixtySecondHelper:
         检查今天是否已经正常爬取
         :return: 如果今天已经正常爬取返回True，否则返回False
         """
-        today = SixtySecondHelper.get_today_date_str()
-        status = SixtySecondHelper.load_status()
-        
-        # 检查是否有今天的记录，并且状态是正常爬取
-        if today in status and status[today].get("success", False):
-            logger.info(f"今天({today})已经正常爬取过")
+        if SixtySecondHelper.get_status_store().succeeded(SixtySecondHelper.JOB_NAME):
+            logger.info(f"今天({SixtySecondHelper.get_today_date_str()})已经正常爬取过")
             return True
         return False
 
     @staticmethod
-    def update_today_status(success):
+    def update_today_status(success, detail=None):
         """
-        更新今天的爬取状态
+        记录今天的爬取结果
         :param success: 是否正常爬取
-        :return: 更新成功返回True，否则返回False
+        :param detail: 图片文件名或失败原因
+        :return: 记录成功返回True
         """
-        today = SixtySecondHelper.get_today_date_str()
-        timestamp = SixtySecondHelper.get_current_timestamp()
-        
-        # 加载现有状态
-        status = SixtySecondHelper.load_status()
-        
-        # 更新今天的状态
-        status[today] = {
-            "timestamp": timestamp,
-            "success": success
-        }
-        
-        return SixtySecondHelper.save_status(status)
+        return SixtySecondHelper.get_status_store().record(SixtySecondHelper.JOB_NAME, success, detail)
 
     @staticmethod
-    def main():
-        """
-        主函数
-        :return: True代表正常爬取，False代表爬取失败，如果当天已经正常爬取过也返回True
-        """
-        start_time = time.time()
-        logger.info("=" * 50)
-        logger.info(f"开始执行爬虫任务: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
+    async def _fetch_news():
+        start_time = time.perf_counter()
+        today = SixtySecondHelper.get_today_date_str()
+        SixtySecondHelper.fetches += 1
+        SixtySecondHelper._last_attempt = time.monotonic()
+        logger.info(f"开始抓取新闻图片: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
         try:
-            # 检查环境
-            logger.info(f"程序运行目录: {os.getcwd()}")
-            
-            # 检查今天是否已经正常爬取过
-            if SixtySecondHelper.check_today_status():
+            # 检查今天是否已经正常爬取过（例如服务器重启后）
+            image_file = SixtySecondHelper.find_image(today)
+            if image_file and SixtySecondHelper.check_today_status():
                 logger.info("任务提前结束：今天已经正常爬取过")
+                SixtySecondHelper._ready_date, SixtySecondHelper._ready_file = today, image_file
                 return True
-            
-            # 获取页面内容
-            logger.info("步骤1: 获取页面内容")
-            html_content = SixtySecondHelper.get_page_content()
+
+            html_content = await SixtySecondHelper.get_page_content()
             if not html_content:
-                # 获取页面失败，更新状态为失败
-                logger.error("步骤1失败: 获取页面内容失败")
-                SixtySecondHelper.update_today_status(False)
-                return False
-            
-            # 检查页面内容是否合理
-            if len(html_content) < 1000:
-                logger.warning(f"页面内容异常简短，长度: {len(html_content)} 字符")
-                # 仍然继续尝试处理，但标记为警告
-            
-            # 检查更新状态
-            logger.info("步骤2: 检查更新状态")
-            if not SixtySecondHelper.check_update_status(html_content):
-                # 未更新，更新状态为失败
-                logger.info("步骤2结果: 内容未更新，无需下载图片")
-                SixtySecondHelper.update_today_status(False)
-                return False
-            
-            # 提取图片URL
-            logger.info("步骤3: 提取图片URL")
-            image_url = SixtySecondHelper.extract_image_url(html_content)
-            if not image_url:
-                # 提取图片URL失败，更新状态为失败
-                logger.error("步骤3失败: 提取图片URL失败")
-                SixtySecondHelper.update_today_status(False)
-                return False
-            
-            # 下载图片
-            logger.info("步骤4: 下载图片")
-            if SixtySecondHelper.download_image(image_url, SixtySecondHelper.IMAGE_OUTPUT):
-                # 下载成功，更新状态为成功
-                logger.info("步骤4成功: 图片下载完成")
-                SixtySecondHelper.update_today_status(True)
-                
-                # 验证下载的图片文件
-                if os.path.exists(SixtySecondHelper.IMAGE_OUTPUT):
-                    file_size = os.path.getsize(SixtySecondHelper.IMAGE_OUTPUT)
-                    logger.info(f"下载结果验证: 文件已存在，大小: {file_size} 字节")
-                
-                logger.info("爬虫任务执行成功")
-                return True
+                SixtySecondHelper.last_error = "获取页面内容失败"
+            elif not SixtySecondHelper.check_update_status(html_content):
+                SixtySecondHelper.last_error = "内容未更新"
             else:
-                # 下载失败，更新状态为失败
-                logger.error("步骤4失败: 下载图片失败")
-                SixtySecondHelper.update_today_status(False)
-                return False
-        
+                image_file = await SixtySecondHelper.download_image(
+                    SixtySecondHelper.extract_image_url(html_content), SixtySecondHelper.IMAGE_DIR, today)
+                if image_file:
+                    SixtySecondHelper.last_error = None
+                    SixtySecondHelper._ready_date, SixtySecondHelper._ready_file = today, image_file
+                    SixtySecondHelper.update_today_status(True, os.path.basename(image_file))
+                    SixtySecondHelper.prune_images()
+                    logger.info("新闻图片抓取成功")
+                    return True
+                SixtySecondHelper.last_error = "下载图片失败"
         except Exception as e:
-            # 捕获其他异常，更新状态为失败
-            logger.error(f"爬虫执行过程中发生异常: {e}", exc_info=True)
-            try:
-                SixtySecondHelper.update_today_status(False)
-            except:
-                logger.error("更新状态文件失败")
-            return False
+            SixtySecondHelper.last_error = f"{type(e).__name__} {str(e)}".strip()
+            logger.error(f"抓取新闻图片时发生异常: {e}", exc_info=True)
         finally:
-            # 记录任务执行时间
-            end_time = time.time()
-            logger.info(f"爬虫任务执行完成，耗时: {end_time - start_time:.2f} 秒")
-            logger.info("=" * 50)
+            logger.info(f"新闻图片抓取结束，耗时: {time.perf_counter() - start_time:.2f} 秒")
+
+        SixtySecondHelper.fetch_errors += 1
+        logger.warning(f"新闻图片抓取失败: {SixtySecondHelper.last_error}")
+        SixtySecondHelper.update_today_status(False, SixtySecondHelper.last_error)
+        return False
+
+    @staticmethod
+    async def fetch_news():
+        """
+        抓取今天的新闻图片，并发调用共用同一次抓取
+        :return: True代表正常爬取，False代表爬取失败，如果当天已经正常爬取过也返回True
+        """
+        task = SixtySecondHelper._fetch_task
+        if task is None or task.done():
+            task = SixtySecondHelper._fetch_task = asyncio.create_task(SixtySecondHelper._fetch_news())
+        else:
+            SixtySecondHelper.coalesced += 1
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def is_today_ready():
+        """
+        今天的新闻图片是否已经下载好（只检查内存中的记录和图片文件，不请求源站）
+        :return: 已下载好返回True
+        """
+        return (SixtySecondHelper._ready_date == SixtySecondHelper.get_today_date_str()
+                and SixtySecondHelper._ready_file is not None and os.path.exists(SixtySecondHelper._ready_file))
+
+    @staticmethod
+    def get_today_image():
+        """
+        获取今天的新闻图片供客户端访问的路径
+        :return: 例如 src/client/images/news/2025-01-01-0123456789ab.png，图片还没准备好时返回None
+        """
+        if not SixtySecondHelper.is_today_ready():
+            return None
+        return SixtySecondHelper.IMAGE_URL_PREFIX + os.path.basename(SixtySecondHelper._ready_file)
+
+    @staticmethod
+    async def get_today_news():
+        """
+        @新闻使用：图片已经预取好时直接返回，否则临时抓取一次
+
+        距离上一次抓取不足ON_DEMAND_INTERVAL秒时不再请求源站（正在进行的抓取仍会等待）。
+        :return: 今天的图片可用返回True
+        """
+        if SixtySecondHelper.is_today_ready():
+            return True
+        task = SixtySecondHelper._fetch_task
+        last_attempt = SixtySecondHelper._last_attempt
+        if (task is None or task.done()) and last_attempt is not None \
+                and time.monotonic() - last_attempt < SixtySecondHelper.ON_DEMAND_INTERVAL:
+            return False
+        return await SixtySecondHelper.fetch_news()
+
+    @staticmethod
+    def next_publish_time(now):
+        """
+        计算now之后（含now当天）的下一个发布时间
+        :param now: 当前时间datetime
+        :return: 发布时间datetime
+        """
+        publish_at = now.replace(hour=SixtySecondHelper.PUBLISH_HOUR, minute=SixtySecondHelper.PUBLISH_MINUTE,
+                                 second=0, microsecond=0)
+        return publish_at if now < publish_at else publish_at + timedelta(days=1)
+
+    @staticmethod
+    async def run_scheduler(poll_interval=POLL_INTERVAL):
+        """
+        每日预取新闻图片（在main()中作为后台任务启动）
+
+        每天发布时间之后开始抓取，源站还没更新或抓取失败时每隔poll_interval秒重试，
+        成功后等到第二天的发布时间。用户发送@新闻时图片通常已经在本地，可以直接发送。
 
-# 非类方法的调用支持（用于直接运行脚本）
+        Args:
+            poll_interval: 还没抓取成功时的检查间隔（秒）
+        """
+        logger.info(f"新闻预取已启动: 每天{SixtySecondHelper.PUBLISH_HOUR:02d}:{SixtySecondHelper.PUBLISH_MINUTE:02d}之后抓取")
+        # 启动时清理一次，上次运行中断时留下的临时文件不必等到下次抓取成功
+        SixtySecondHelper.prune_images()
+        while True:
+            now = datetime.now()
+            if SixtySecondHelper.is_today_ready():
+                wake_at = SixtySecondHelper.next_publish_time(now)
+            else:
+                try:
+                    if await SixtySecondHelper.fetch_news():
+                        continue
+                except Exception as e:
+                    logger.error(f"新闻预取出错: {str(e)}", exc_info=True)
+                publish_at = SixtySecondHelper.next_publish_time(now)
+                if publish_at.date() == now.date():
+                    # 还没到今天的发布时间（例如服务器在凌晨启动），等到发布时间再抓取
+                    wake_at = publish_at
+                else:
+                    wake_at = now + timedelta(seconds=poll_interval)
+
+            SixtySecondHelper.next_run_at = wake_at
+            while datetime.now() < wake_at:
+                await asyncio.sleep(min(SixtySecondHelper.MAX_SLEEP, max(1.0, (wake_at - datetime.now()).total_seconds())))
+
+    @staticmethod
+    def stats():
+        """
+        获取新闻抓取统计
+
+        Returns:
+            dict: 抓取次数、失败次数、合并的请求数、已就绪的日期、下一次预取时间和最近一次错误
+        """
+        return {
+            "fetches": SixtySecondHelper.fetches,
+            "fetch_errors": SixtySecondHelper.fetch_errors,
+            "coalesced": SixtySecondHelper.coalesced,
+            "ready_date": SixtySecondHelper._ready_date,
+            "next_run_at": SixtySecondHelper.next_run_at.strftime("%Y-%m-%d %H:%M:%S") if SixtySecondHelper.next_run_at else None,
+            "last_error": SixtySecondHelper.last_error
+        }
+
+
+# 直接运行脚本时抓取一次
 if __name__ == "__main__":
-    result = SixtySecondHelper.main()
-    logger.info(f"爬虫任务执行结果: {'成功' if result else '失败'}")
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    async def run_once():
+        try:
+            return await SixtySecondHelper.fetch_news()
+        finally:
+            await HttpSessionHelper.close_all()
+
+    result = asyncio.run(run_once())
+    logger.info(f"爬虫任务执行结果: {'成功' if result else '失败'}")
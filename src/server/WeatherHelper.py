@@ -2,44 +2,504 @@ import asyncio
 import aiohttp
 import datetime
 import logging
-import random
 import json
-import requests
+import os
+import time
+from collections import OrderedDict
 
 # 导入我们集成的WeatherSpider类
 from CustomLibrary.weather_spider import WeatherSpider
+from HttpSessionHelper import HttpSessionHelper
+from JobStatusHelper import JobStatusHelper
 
 logger = logging.getLogger("ChatServer")
 
-# 天气API配置
-with open("src/server/LittleAPIConfig.json", "r") as f:
-    WEATHER_API_KEY = json.load(f)["key"]
+# 天气API配置文件，按模块所在目录定位，不依赖服务器的启动目录
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "LittleAPIConfig.json")
+
+
+class WeatherNotFoundError(Exception):
+    """天气API返回了错误码（通常是地名不存在），该结果可以缓存"""
+
+
+class WeatherCache:
+    """
+    按城市缓存天气数据的LRU+TTL缓存
+
+    查询失败的城市同样会被缓存（负缓存），有效期较短，避免反复请求不存在的地名。
+    """
+
+    # 表示"API确认没有该城市的数据"的缓存值
+    MISSING = object()
+
+    def __init__(self, capacity=500, ttl=1800, negative_ttl=600):
+        """
+        初始化缓存
+
+        Args:
+            capacity: 最多缓存的城市数，0表示禁用缓存
+            ttl: 天气数据的有效期（秒）
+            negative_ttl: 查询失败结果的有效期（秒）
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # 城市 -> (过期时间, 天气数据或MISSING)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize_city(city):
+        """统一地名的写法作为缓存键（去掉首尾和中间的空白）"""
+        return "".join(city.split())
+
+    def get(self, city):
+        """
+        读取缓存
+
+        Args:
+            city: 城市名称
+
+        Returns:
+            dict/MISSING/None: 天气数据，MISSING表示已知查询失败，None表示未缓存或已过期
+        """
+        key = WeatherCache.normalize_city(city)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, data = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if data is WeatherCache.MISSING:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return data
+
+    def put(self, city, data):
+        """
+        写入缓存，超出容量时淘汰最久未使用的城市
+
+        Args:
+            city: 城市名称
+            data: 天气数据或MISSING
+        """
+        if self.capacity <= 0:
+            return
+        key = WeatherCache.normalize_city(city)
+        ttl = self.negative_ttl if data is WeatherCache.MISSING else self.ttl
+        self._entries[key] = (time.monotonic() + ttl, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def peek(self, city):
+        """
+        查看缓存条目但不计入统计、不调整LRU顺序（预取时使用）
+
+        Args:
+            city: 城市名称
+
+        Returns:
+            tuple: (剩余有效时间（秒）, 天气数据或MISSING)，未缓存时返回(None, None)
+        """
+        entry = self._entries.get(WeatherCache.normalize_city(city))
+        if entry is None:
+            return None, None
+        expires_at, data = entry
+        return expires_at - time.monotonic(), data
+
+    def clear(self):
+        """清空缓存"""
+        self._entries.clear()
+
+    def stats(self):
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 容量、条目数、命中/负缓存命中/未命中/淘汰/过期次数和命中率
+        """
+        total = self.hits + self.negative_hits + self.misses
+        return {
+            "capacity": self.capacity,
+            "ttl": self.ttl,
+            "negative_ttl": self.negative_ttl,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round((self.hits + self.negative_hits) / total, 4) if total else 0.0
+        }
 
 
 class WeatherHelper:
+    # 天气API地址，可在LittleAPIConfig.json中用api_url覆盖（例如指向本地模拟服务）
+    API_URL = "https://v2.xxapi.cn/api/weather"
+    USER_AGENT = "xiaoxiaoapi/1.0.0"
+    # 连接超时和整个请求的超时（秒），可在LittleAPIConfig.json中用timeout覆盖后者
+    CONNECT_TIMEOUT = 5
+    TOTAL_TIMEOUT = 10
+
+    # 天气数据缓存的默认参数，可在LittleAPIConfig.json中用cache_ttl、negative_cache_ttl、cache_size覆盖
+    CACHE_TTL = 1800
+    NEGATIVE_CACHE_TTL = 600
+    CACHE_SIZE = 500
+
+    _config = None
+    _cache = None
+    # 城市 -> 正在进行的上游请求，同一城市的并发查询共用一个请求
+    _inflight = {}
+    upstream_calls = 0
+    upstream_errors = 0
+    coalesced = 0
+
+    # 预取的默认参数，可在LittleAPIConfig.json中用同名的小写键覆盖
+    PREFETCH_TOP = 10
+    PREFETCH_INTERVAL = 60
+    PREFETCH_AHEAD = 300
+    PREFETCH_PER_MINUTE = 10
+    # 城市热度的半衰期（秒），越近的查询权重越高
+    POPULARITY_HALF_LIFE = 86400
+    # 最多记录热度的城市数
+    POPULARITY_SIZE = 1000
+
+    # 城市 -> 热度（用户查询次数，随时间衰减）
+    _popularity = {}
+    prefetches = 0
+    prefetch_errors = 0
+
     @staticmethod
-    async def get_weather_info(city):
+    def load_config(reload=False):
+        """
+        读取LittleAPIConfig.json，首次读取后缓存在内存中
+
+        Args:
+            reload: 是否重新读取文件（修改密钥后调用）
+
+        Returns:
+            dict: 配置内容，读取失败时为空字典
+        """
+        if WeatherHelper._config is None or reload:
+            try:
+                with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                    WeatherHelper._config = json.load(f)
+            except Exception as e:
+                logger.error(f"读取天气API配置失败: {str(e)}")
+                WeatherHelper._config = {}
+        return WeatherHelper._config
+
+    @staticmethod
+    def get_cache():
+        """
+        获取天气数据缓存，首次调用时按配置创建
+
+        Returns:
+            WeatherCache: 缓存对象
+        """
+        if WeatherHelper._cache is None:
+            config = WeatherHelper.load_config()
+            WeatherHelper._cache = WeatherCache(
+                capacity=config.get("cache_size", WeatherHelper.CACHE_SIZE),
+                ttl=config.get("cache_ttl", WeatherHelper.CACHE_TTL),
+                negative_ttl=config.get("negative_cache_ttl", WeatherHelper.NEGATIVE_CACHE_TTL)
+            )
+        return WeatherHelper._cache
+
+    @staticmethod
+    async def get_session():
+        """
+        获取天气API的共享HTTP会话，首次调用时创建
+
+        Returns:
+            aiohttp.ClientSession: 共享会话
+        """
+        config = WeatherHelper.load_config()
+        return await HttpSessionHelper.open(
+            "weather",
+            limit=20,
+            limit_per_host=10,
+            connect_timeout=WeatherHelper.CONNECT_TIMEOUT,
+            read_timeout=config.get("timeout", WeatherHelper.TOTAL_TIMEOUT),
+            total_timeout=config.get("timeout", WeatherHelper.TOTAL_TIMEOUT),
+            headers={"User-Agent": WeatherHelper.USER_AGENT}
+        )
+
+    @staticmethod
+    async def fetch_weather(city):
+        """
+        请求天气API
+
+        Args:
+            city: 城市名称
+
+        Returns:
+            dict: API返回的原始天气数据（按星期排列的多日天气），由restruct_weather_data整理为卡片格式
+
+        Raises:
+            WeatherNotFoundError: API返回错误码
+            Exception: 请求超时、HTTP错误或响应不是JSON
+        """
+        config = WeatherHelper.load_config()
+        session = await WeatherHelper.get_session()
+        params = {"city": city, "key": config.get("key", "")}
+        async with session.get(config.get("api_url", WeatherHelper.API_URL), params=params) as response:
+            if response.status != 200:
+                raise Exception(f"天气API HTTP {response.status}")
+            # 部分情况下接口返回的Content-Type不是application/json，按文本内容解析
+            weather_response = await response.json(content_type=None)
+
+        if weather_response.get("code") != 200:
+            raise WeatherNotFoundError(f"获取天气数据失败: {weather_response.get('code')}")
+        logger.info(f"成功获取{city}天气数据: {weather_response}")
+        return weather_response["data"]
+
+    @staticmethod
+    async def _fetch_and_cache(city):
+        """
+        请求上游并写入缓存；API确认查询失败的结果做负缓存，网络错误不缓存
+
+        缓存的是API的原始数据：哪一天是"今天"在读取时才确定，跨过零点后不会把昨天的天气当作今天的
+        """
+        WeatherHelper.upstream_calls += 1
+        cache = WeatherHelper.get_cache()
         try:
-            with open("src/server/LittleAPIConfig.json", "r") as f:
-                api_key = json.load(f)["key"]
+            weather_data = await WeatherHelper.fetch_weather(city)
+        except WeatherNotFoundError:
+            cache.put(city, WeatherCache.MISSING)
+            raise
+        except Exception:
+            WeatherHelper.upstream_errors += 1
+            raise
+        cache.put(city, weather_data)
+        return weather_data
 
-            re_url = f"https://v2.xxapi.cn/api/weather?city={city}&key={api_key}"
+    @staticmethod
+    async def get_weather(city):
+        """
+        查询天气：优先使用缓存，同一城市的并发查询合并为一次上游请求
 
-            headers = {
-                'User-Agent': 'xiaoxiaoapi/1.0.0'
-            }
+        Args:
+            city: 城市名称
 
-            weather_response = eval(requests.request("GET",re_url,headers=headers,data={}).text)
+        Returns:
+            dict: 按当前日期整理后的天气数据
 
-            if weather_response["code"] == 200:
-                weather_data = weather_response["data"]
-                weather_data = WeatherHelper.restruct_weather_data(weather_data)
-            else:
-                raise Exception(f"获取天气数据失败: {weather_response['code']}")
-            logger.info(f"成功获取{city}天气数据: {weather_response}")
+        Raises:
+            WeatherNotFoundError: API返回错误码（包括负缓存命中）
+            Exception: 请求超时、HTTP错误等
+        """
+        WeatherHelper.record_request(city)
+        cached = WeatherHelper.get_cache().get(city)
+        if cached is WeatherCache.MISSING:
+            WeatherHelper.forget_city(city)
+            raise WeatherNotFoundError(f"获取天气数据失败: {city}（缓存）")
+        if cached is not None:
+            return WeatherHelper.restruct_weather_data(cached)
+        try:
+            weather_data = await WeatherHelper._fetch_shared(city)
+        except WeatherNotFoundError:
+            WeatherHelper.forget_city(city)
+            raise
+        return WeatherHelper.restruct_weather_data(weather_data)
+
+    @staticmethod
+    async def _fetch_shared(city):
+        """请求上游并写入缓存，同一城市正在进行的请求会被复用"""
+        key = WeatherCache.normalize_city(city)
+        task = WeatherHelper._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(WeatherHelper._fetch_and_cache(city))
+            WeatherHelper._inflight[key] = task
+
+            def on_done(done_task):
+                if WeatherHelper._inflight.get(key) is done_task:
+                    del WeatherHelper._inflight[key]
+                # 所有等待者都被取消时也要取出异常，避免"exception was never retrieved"警告
+                if not done_task.cancelled():
+                    done_task.exception()
+
+            task.add_done_callback(on_done)
+        else:
+            WeatherHelper.coalesced += 1
+        # 某个等待者被取消不影响共用的请求
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def stats():
+        """
+        获取天气查询统计
+
+        Returns:
+            dict: 缓存统计，以及上游请求次数、上游失败次数、被合并的查询数和进行中的请求数
+        """
+        stats = WeatherHelper.get_cache().stats()
+        stats.update({
+            "upstream_calls": WeatherHelper.upstream_calls,
+            "upstream_errors": WeatherHelper.upstream_errors,
+            "coalesced": WeatherHelper.coalesced,
+            "inflight": len(WeatherHelper._inflight),
+            "prefetches": WeatherHelper.prefetches,
+            "prefetch_errors": WeatherHelper.prefetch_errors,
+            "popular": WeatherHelper.popular_cities(5)
+        })
+        return stats
+
+    @staticmethod
+    def record_request(city):
+        """
+        记录一次用户查询，用于挑选预取的热门城市
+
+        Args:
+            city: 城市名称
+        """
+        key = WeatherCache.normalize_city(city)
+        if not key:
+            return
+        popularity = WeatherHelper._popularity
+        popularity[key] = popularity.get(key, 0.0) + 1
+        if len(popularity) > WeatherHelper.POPULARITY_SIZE:
+            # 超出上限时丢掉最冷门的城市
+            del popularity[min(popularity, key=popularity.get)]
+
+    @staticmethod
+    def forget_city(city):
+        """
+        不再记录查询失败（API返回错误码）的地名的热度，负缓存过期后不会被当作热门城市预取
+
+        Args:
+            city: 城市名称
+        """
+        WeatherHelper._popularity.pop(WeatherCache.normalize_city(city), None)
+
+    @staticmethod
+    def decay_popularity(elapsed):
+        """
+        按半衰期衰减所有城市的热度，热度很低的城市不再记录
+
+        Args:
+            elapsed: 距离上次衰减的时间（秒）
+        """
+        factor = 0.5 ** (elapsed / WeatherHelper.POPULARITY_HALF_LIFE)
+        for key in list(WeatherHelper._popularity):
+            WeatherHelper._popularity[key] *= factor
+            if WeatherHelper._popularity[key] < 0.1:
+                del WeatherHelper._popularity[key]
+
+    @staticmethod
+    def popular_cities(count):
+        """
+        获取最热门的城市
+
+        Args:
+            count: 城市数量
+
+        Returns:
+            list: 按热度从高到低排列的城市名称
+        """
+        popularity = WeatherHelper._popularity
+        return sorted(popularity, key=popularity.get, reverse=True)[:count]
+
+    @staticmethod
+    async def prefetch_once(top, ahead, min_interval):
+        """
+        刷新一次热门城市：缓存即将过期（或已过期）的热门城市重新向上游请求
+
+        查询失败过的城市（负缓存）不会预取；两次预取请求之间至少间隔min_interval秒，避免超出API额度。
+
+        Args:
+            top: 预取的热门城市数
+            ahead: 缓存剩余有效时间少于该值（秒）时刷新
+            min_interval: 两次预取请求的最小间隔（秒）
+
+        Returns:
+            int: 本次刷新的城市数
+        """
+        cache = WeatherHelper.get_cache()
+        refreshed = 0
+        candidates = 0
+        for city in WeatherHelper.popular_cities(len(WeatherHelper._popularity)):
+            remaining, data = cache.peek(city)
+            # 查询失败过的地名不占用预取名额
+            if data is WeatherCache.MISSING:
+                continue
+            candidates += 1
+            if candidates > top:
+                break
+            if remaining is not None and remaining > ahead:
+                continue
+            if refreshed:
+                await asyncio.sleep(min_interval)
+            refreshed += 1
+            WeatherHelper.prefetches += 1
+            try:
+                await WeatherHelper._fetch_shared(city)
+                logger.info(f"已预取天气数据: {city}")
+            except WeatherNotFoundError as e:
+                WeatherHelper.prefetch_errors += 1
+                WeatherHelper.forget_city(city)
+                logger.warning(f"预取天气数据失败，不再预取该地名: {city}, {str(e)}")
+            except Exception as e:
+                WeatherHelper.prefetch_errors += 1
+                logger.warning(f"预取天气数据失败: {city}, {type(e).__name__} {str(e)}")
+        return refreshed
+
+    @staticmethod
+    async def run_prefetch():
+        """
+        后台预取热门城市的天气（在main()中作为后台任务启动）
+
+        每隔prefetch_interval秒检查一次查询最多的prefetch_top个城市，
+        在缓存过期前prefetch_ahead秒内重新请求，用户查询这些城市时可以直接从缓存返回。
+        prefetch_top为0或关闭缓存时不预取。
+        """
+        config = WeatherHelper.load_config()
+        top = config.get("prefetch_top", WeatherHelper.PREFETCH_TOP)
+        interval = config.get("prefetch_interval", WeatherHelper.PREFETCH_INTERVAL)
+        ahead = config.get("prefetch_ahead", WeatherHelper.PREFETCH_AHEAD)
+        per_minute = config.get("prefetch_per_minute", WeatherHelper.PREFETCH_PER_MINUTE)
+        if top <= 0 or per_minute <= 0 or WeatherHelper.get_cache().capacity <= 0:
+            logger.info("天气预取未启用")
+            return
+        logger.info(f"天气预取已启动: 热门城市 {top} 个，每分钟最多 {per_minute} 次请求")
+
+        last_decay = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            WeatherHelper.decay_popularity(now - last_decay)
+            last_decay = now
+            errors_before = WeatherHelper.prefetch_errors
+            try:
+                refreshed = await WeatherHelper.prefetch_once(top, ahead, 60 / per_minute)
+            except Exception as e:
+                logger.error(f"天气预取出错: {str(e)}", exc_info=True)
+                JobStatusHelper.shared().record("weather_prefetch", False, f"{type(e).__name__} {str(e)}".strip())
+                continue
+            if refreshed:
+                errors = WeatherHelper.prefetch_errors - errors_before
+                JobStatusHelper.shared().record("weather_prefetch", errors < refreshed,
+                                                f"预取{refreshed}个城市，失败{errors}个")
+
+    @staticmethod
+    async def get_weather_info(city):
+        try:
+            weather_data = await WeatherHelper.get_weather(city)
             return True, weather_data
         except Exception as e:
-            logger.error(f"获取天气信息异常: {str(e)}")
+            logger.error(f"获取天气信息异常: {type(e).__name__} {str(e)}")
             # 异常时返回模拟数据
             # 修复：get_mock_weather_data是实例方法，需要先创建实例
             city = "未知"
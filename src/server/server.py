@@ -21,12 +21,32 @@ from MusicHelper import MusicHelper
 from C2SPraser import C2SPraser
 from S2CPackageHelper import S2CPackageHelper
 from DataBaseHelper import DataBaseHelper
+from ChatHistoryHelper import ChatHistoryHelper
+from HttpSessionHelper import HttpSessionHelper
+from LLMSchedulerHelper import LLMSchedulerHelper
+from LLMCacheHelper import LLMCacheHelper
+from SSEParserHelper import SSEParserHelper
+from ConversationMemoryHelper import ConversationMemoryHelper
+from LLMEndpointHelper import LLMEndpointHelper, LLMEndpointError
+from MetricsHelper import MetricsHelper
+from ImagePreloadHelper import ImagePreloadHelper
+from JobStatusHelper import JobStatusHelper
+
+# 数据目录：设置环境变量CHAT_SERVER_DATA_DIR时，账户库、聊天记录和日志都放在该目录下（基准测试使用临时目录）
+data_dir = os.environ.get("CHAT_SERVER_DATA_DIR")
 
 # 初始化数据库管理器
-db_manager = DataBaseHelper()
+db_manager = DataBaseHelper(os.path.join(data_dir, "users.db") if data_dir else "users.db")
+# 将旧版db_manager使用的accounts.db合并到统一账户库（只会执行一次）
+legacy_accounts_path = os.path.join(os.path.dirname(__file__), "accounts.db")
+if os.path.exists(legacy_accounts_path):
+    db_manager.import_legacy_accounts(legacy_accounts_path)
+
+# 聊天记录存储（组提交写入，在main()中启动后台任务）
+chat_history = ChatHistoryHelper(os.path.join(data_dir, "chat_history.db") if data_dir else None)
 
 # 配置日志系统
-log_dir = "logs"
+log_dir = os.path.join(data_dir, "logs") if data_dir else "logs"
 os.makedirs(log_dir, exist_ok=True)
 # 修改日志文件名格式为：chat-server-{日期编号}-{服务端启动时间编号（时分秒）}.log
 current_time = datetime.datetime.now()
@@ -57,6 +77,23 @@ clients_lock = asyncio.Lock()
 chatbot_config = {}
 chatbot_tips = ""
 
+# 大模型API线路路由（在main()中按配置重新创建）
+llm_router = LLMEndpointHelper([])
+# 大模型请求调度器（在main()中按配置重新创建）
+llm_scheduler = LLMSchedulerHelper()
+# 进行中的@苹果派后台任务 -> 提问者的客户端ID和回复所在的房间，没有听众时取消
+llm_tasks = {}
+# 大模型回复缓存（在main()中按配置重新创建）
+llm_cache = LLMCacheHelper()
+# @苹果派的对话记忆（在main()中按配置重新创建）
+conversation_memory = ConversationMemoryHelper()
+# 进行中的对话摘要任务，按会话键索引
+summary_tasks = {}
+# 图片预加载确认（@新闻等待房间内的客户端加载完图片再发送消息）
+image_preloads = ImagePreloadHelper()
+# 进行中的@新闻后台任务
+news_tasks = set()
+
 # 加载chatbot配置和提示词
 def load_chatbot_config():
     """加载聊天机器人配置和提示词"""
@@ -102,8 +139,8 @@ async def get_weather_info(city):
 
 # 获取百度热搜列表
 async def get_baidu_hot_search():
-    """从百度获取热搜列表"""
-    # 调用HotSearchHelper来获取热搜数据
+    """从百度获取热搜列表，返回(热搜列表, 更新时间)"""
+    # 调用HotSearchHelper来获取热搜数据（后台任务定期刷新，这里通常直接返回内存中的列表）
     return await HotSearchHelper.get_baidu_hot_search()
 
 # 格式化热搜内容为卡片形式
@@ -112,14 +149,328 @@ def format_hot_searches(hot_searches):
     # 调用HotSearchHelper来格式化热搜内容
     return HotSearchHelper.format_hot_searches(hot_searches)
 
+# 计算大模型回复的缓存键
+def get_llm_cache_key(prompt, history=None):
+    """根据问题、提示词、对话历史、模型和temperature生成回复缓存键"""
+    return LLMCacheHelper.make_key(
+        prompt,
+        chatbot_tips,
+        ",".join(endpoint.model_name for endpoint in llm_router.endpoints),
+        chatbot_config.get("temperature", 0.7),
+        history
+    )
+
+# 获取对话记忆的会话键
+def get_memory_key(user_info):
+    """按memory_scope配置返回会话键：user按用户，room按房间，off不使用记忆"""
+    scope = chatbot_config.get("memory_scope", "user")
+    if scope == "room":
+        return f"room:{user_info['room']}"
+    if scope == "user":
+        return f"user:{user_info['name']}"
+    return None
+
+# 记录一轮问答到对话记忆
+def remember_turn(memory_key, prompt, reply):
+    """记录问答，有问答被裁剪且开启了摘要时启动摘要任务"""
+    if memory_key is None or not reply:
+        return
+    if conversation_memory.add_turn(memory_key, prompt, reply) and memory_key not in summary_tasks:
+        task = asyncio.create_task(summarize_conversation(memory_key))
+        summary_tasks[memory_key] = task
+        task.add_done_callback(lambda _: summary_tasks.pop(memory_key, None))
+
+# 把被裁剪的问答压缩成摘要（后台任务）
+async def summarize_conversation(memory_key):
+    """循环处理会话中等待摘要的问答，摘要请求同样经过llm_scheduler排队"""
+    try:
+        while True:
+            summary, turns = conversation_memory.take_pending(memory_key)
+            if not turns:
+                return
+            accepted, new_summary = await llm_scheduler.run(
+                "苹果派记忆",
+                lambda: request_conversation_summary(summary, turns)
+            )
+            if accepted and new_summary:
+                conversation_memory.set_summary(memory_key, new_summary)
+                logger.info(f"已更新对话摘要: {memory_key}，压缩了 {len(turns)} 轮问答")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"生成对话摘要失败: {str(e)}")
+
+# 请求大模型生成对话摘要
+async def request_conversation_summary(summary, turns):
+    """
+    把旧摘要和被裁剪的问答交给大模型压缩成新的摘要
+    
+    Returns:
+        str: 新的摘要，失败时返回None
+    """
+    dialogue = "\n".join(f"用户: {user_text}\n苹果派: {assistant_text}" for user_text, assistant_text in turns)
+    content = f"已有摘要：{summary}\n\n新的对话：\n{dialogue}" if summary else dialogue
+    request_data = {
+        "messages": [
+            {"role": "system", "content": "请把下面的对话压缩成一段简短的摘要，保留用户的身份、偏好和尚未解决的问题，只输出摘要本身。"},
+            {"role": "user", "content": content}
+        ],
+        "max_tokens": conversation_memory.summary_tokens,
+        "temperature": 0.3,
+        "stream": False
+    }
+    try:
+        chunks, finished = await request_llm(request_data)
+    except LLMEndpointError as e:
+        logger.error(f"生成对话摘要失败: {str(e)}")
+        return None
+    return "".join(chunks).strip() if finished else None
+
+# 统计大模型API新建连接的耗时（复用连接池中的连接时不触发）
+def create_llm_trace_config():
+    """
+    创建记录连接耗时的aiohttp.TraceConfig
+    
+    Returns:
+        aiohttp.TraceConfig: 传给共享会话的trace配置
+    """
+    async def on_connection_create_start(session, context, params):
+        context.connect_started_at = time.perf_counter()
+    
+    async def on_connection_create_end(session, context, params):
+        MetricsHelper.observe("llm_connect_ms", (time.perf_counter() - context.connect_started_at) * 1000)
+        MetricsHelper.increment("llm_connections_created")
+    
+    async def on_connection_reuseconn(session, context, params):
+        MetricsHelper.increment("llm_connections_reused")
+    
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    return trace_config
+
+# 向一条大模型线路发送请求
+async def request_llm_endpoint(endpoint, request_data, emit):
+    """
+    向指定线路发送一次请求，收到的文本片段依次交给emit
+    
+    Args:
+        endpoint: LLMEndpoint线路
+        request_data: 请求数据（不含model，按线路填写）
+        emit: 接收文本片段的协程函数；非流式请求只调用一次
+        
+    Returns:
+        bool: 是否完整结束（流式响应收到[DONE]）
+        
+    Raises:
+        LLMEndpointError: HTTP状态码不是200
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {endpoint.api_key}"
+    }
+    request_data = dict(request_data, model=endpoint.model_name)
+    
+    # 使用共享会话发送异步请求，复用到各线路的连接
+    session = await HttpSessionHelper.get("llm")
+    started_at = time.perf_counter()
+    async with session.post(f"{endpoint.api_base}/chat/completions", json=request_data, headers=headers) as response:
+        # 响应头到达的时间包含连接、发送请求和上游排队，可以和首字延迟对比区分网络与模型生成
+        MetricsHelper.observe("llm_headers_ms", (time.perf_counter() - started_at) * 1000)
+        if response.status != 200:
+            logger.error(f"大模型API调用失败: {endpoint.name} HTTP {response.status}, {await response.text()}")
+            raise LLMEndpointError(f"HTTP {response.status}")
+        
+        if not request_data["stream"]:
+            data = await response.json()
+            await emit(data["choices"][0]["message"]["content"].strip())
+            return True
+        
+        finished = False
+        parser = SSEParserHelper()
+        
+        # 处理一个完整的SSE事件，收到[DONE]结束标记时返回True
+        async def handle_event(event_data):
+            if event_data == '[DONE]':
+                return True
+            try:
+                chunk_data = json.loads(event_data)
+            except json.JSONDecodeError:
+                logger.warning(f"解析流式响应失败: {event_data}")
+                return False
+            # 提取文本片段
+            if chunk_data.get('choices'):
+                chunk_text = chunk_data['choices'][0].get('delta', {}).get('content')
+                if chunk_text:
+                    await emit(chunk_text)
+            return False
+        
+        # 按网络到达的字节块增量解析，块边界不必与行边界对齐
+        async for data in response.content.iter_any():
+            for _, event_data in parser.feed(data):
+                if await handle_event(event_data):
+                    finished = True
+                    break
+            if finished:
+                # 读完剩余数据，连接才能放回连接池复用
+                await response.content.read()
+                break
+        else:
+            # 连接已结束，处理缓冲区中最后一个事件
+            for _, event_data in parser.close():
+                if await handle_event(event_data):
+                    finished = True
+                    break
+        return finished
+
+# 按路由发送大模型请求：选择最快的健康线路，失败时切换线路，可选对冲请求
+async def request_llm(request_data, on_chunk=None):
+    """
+    通过llm_router发送请求
+    
+    还没有输出任何片段时，失败的请求会切换到下一条可用线路；
+    配置了hedge_after时，首字超时会向第二条线路发出对冲请求，先输出首字的一方胜出，另一方被取消。
+    
+    Args:
+        request_data: 请求数据（不含model）
+        on_chunk: 文本片段回调函数，只会收到胜出线路的片段
+        
+    Returns:
+        tuple: (chunks, finished) - 收到的文本片段列表，是否完整结束
+        
+    Raises:
+        LLMEndpointError: 没有可用线路，或所有线路都在输出首字之前失败
+    """
+    chunks = []
+    tried = []
+    attempts = {}
+    first_token_latency = {}
+    winner = None
+    # 已经记录为放弃的请求（对冲失败的一方）
+    abandoned = set()
+    hedge_started = False
+    last_error = "所有大模型线路暂时不可用，请稍后再试"
+    request_started_at = time.perf_counter()
+    first_token_at = None
+    
+    def start_attempt(endpoint):
+        tried.append(endpoint)
+        started_at = time.perf_counter()
+        
+        async def emit(chunk_text):
+            nonlocal winner, first_token_at
+            if winner is None:
+                # 第一个输出首字的线路胜出，取消其他请求
+                winner = endpoint
+                first_token_at = time.perf_counter()
+                first_token_latency[endpoint] = first_token_at - started_at
+                # 首字延迟从本次调用开始计算，包含切换线路和对冲的等待
+                MetricsHelper.observe("llm_ttft_ms", (first_token_at - request_started_at) * 1000)
+                current = asyncio.current_task()
+                for other_task, (other_endpoint, other_started_at) in attempts.items():
+                    if other_task is not current and not other_task.done():
+                        other_task.cancel()
+                        abandoned.add(other_task)
+                        llm_router.record_abandoned(other_endpoint, time.perf_counter() - other_started_at)
+            if winner is endpoint:
+                chunks.append(chunk_text)
+                if on_chunk:
+                    await on_chunk(chunk_text)
+        
+        task = asyncio.create_task(request_llm_endpoint(endpoint, request_data, emit))
+        attempts[task] = (endpoint, started_at)
+    
+    endpoint = llm_router.choose()
+    if endpoint is None:
+        raise LLMEndpointError(last_error)
+    start_attempt(endpoint)
+    first_started_at = time.perf_counter()
+    
+    try:
+        while attempts:
+            timeout = None
+            if llm_router.hedge_after and not hedge_started and winner is None:
+                timeout = max(0, llm_router.hedge_after - (time.perf_counter() - first_started_at))
+            done, _ = await asyncio.wait(attempts.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            
+            if not done:
+                # 首字超时，向另一条线路发出对冲请求
+                hedge_started = True
+                backup = llm_router.choose(exclude=tried)
+                if backup is not None:
+                    llm_router.hedged += 1
+                    logger.info(f"大模型线路 {endpoint.name} 首字超时，对冲请求 {backup.name}")
+                    start_attempt(backup)
+                continue
+            
+            for task in done:
+                task_endpoint, started_at = attempts.pop(task)
+                if task.cancelled():
+                    continue
+                error = task.exception()
+                if error is None:
+                    if winner is None or winner is task_endpoint:
+                        finished = task.result()
+                        if finished:
+                            latency = first_token_latency.get(task_endpoint, time.perf_counter() - started_at)
+                            llm_router.record_success(task_endpoint, latency)
+                        else:
+                            llm_router.record_failure(task_endpoint, "流式响应中途断开")
+                        return chunks, finished
+                    continue
+                
+                llm_router.record_failure(task_endpoint, str(error))
+                last_error = str(error) or type(error).__name__
+                if winner is task_endpoint:
+                    # 已经输出了部分片段，不能再切换线路
+                    logger.error(f"大模型线路 {task_endpoint.name} 输出中途失败: {last_error}")
+                    return chunks, False
+                logger.warning(f"大模型线路 {task_endpoint.name} 请求失败: {last_error}")
+            
+            if not attempts and winner is None:
+                # 所有进行中的请求都失败了，切换到下一条线路
+                endpoint = llm_router.choose(exclude=tried)
+                if endpoint is None:
+                    raise LLMEndpointError(last_error)
+                llm_router.failovers += 1
+                logger.info(f"切换到大模型线路 {endpoint.name}")
+                start_attempt(endpoint)
+                first_started_at = time.perf_counter()
+                hedge_started = False
+        return chunks, False
+    finally:
+        # 取消仍在进行的请求并等待其退出，上游的HTTP响应随之关闭，不再继续读取
+        for task, (task_endpoint, started_at) in attempts.items():
+            task.cancel()
+            if task in abandoned:
+                continue
+            if task_endpoint is winner:
+                # 已经在输出的线路被调用方取消（例如听众都离开了），线路本身是正常的：
+                # 按首字延迟记为成功，不能把整段输出的时长当作首字延迟
+                llm_router.record_success(task_endpoint, first_token_latency[task_endpoint])
+            else:
+                # 还没有输出首字的请求记为放弃，半开线路的探测请求被取消时清除探测标记，线路才能再次被选中
+                llm_router.record_abandoned(task_endpoint, time.perf_counter() - started_at)
+        if attempts:
+            await asyncio.gather(*attempts, return_exceptions=True)
+        finished_at = time.perf_counter()
+        MetricsHelper.observe("llm_duration_ms", (finished_at - request_started_at) * 1000)
+        # 输出速度只统计流式响应，按首字之后收到的片段计算（OpenAI兼容接口通常每个片段一个token）
+        if request_data["stream"] and first_token_at is not None and len(chunks) > 1 and finished_at > first_token_at:
+            MetricsHelper.observe("llm_tokens_per_second", (len(chunks) - 1) / (finished_at - first_token_at))
+
 # 大模型API调用函数 - 支持流式响应
-async def call_llm_api(prompt, stream=False, on_chunk=None):
+async def call_llm_api(prompt, stream=False, on_chunk=None, memory_key=None, cached_chunks=None, check_cache=True):
     """调用大模型API获取回复，支持流式响应
     
     Args:
         prompt: 用户提问
         stream: 是否使用流式响应
         on_chunk: 流式响应回调函数，接收单个文本片段
+        memory_key: 对话记忆的会话键，为None时只发送当前问题
+        cached_chunks: 调用方已经从缓存取出的回复片段，传入时直接重放
+        check_cache: 是否查询回复缓存（调用方已经查询过且未命中时传入False）
         
     Returns:
         完整响应文本（非流式时）
@@ -127,87 +478,49 @@ async def call_llm_api(prompt, stream=False, on_chunk=None):
     global chatbot_config, chatbot_tips
     
     # 检查配置是否有效
-    if not chatbot_config.get('enabled') or not chatbot_config.get('api_key'):
+    if not chatbot_config.get('enabled') or not llm_router.endpoints:
         logger.warning("大模型对话功能未启用或API密钥未配置")
         error_msg = "抱歉，大模型对话功能暂未启用。请联系管理员配置API密钥。"
         if on_chunk:
             await on_chunk(error_msg)
         return error_msg
     
-    try:
-        # 构建消息列表，包含系统提示和用户消息
-        messages = [
-            {"role": "system", "content": chatbot_tips},
-            {"role": "user", "content": prompt}
-        ]
-        
-        # 准备请求数据，启用stream参数
-        request_data = {
-            "model": chatbot_config.get("model_name", "gpt-3.5-turbo"),
-            "messages": messages,
-            "max_tokens": 500,
-            "temperature": 0.7,
-            "stream": stream  # 启用流式响应
-        }
-        
-        # 准备请求头
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {chatbot_config['api_key']}"
-        }
-        
-        # 发送异步请求
-        async with aiohttp.ClientSession() as session:
-            api_base = chatbot_config.get("api_base", "https://api.openai.com/v1")
-            url = f"{api_base}/chat/completions"
-            
-            if stream:
-                # 流式响应处理
-                async with session.post(url, json=request_data, headers=headers) as response:
-                    if response.status == 200:
-                        full_response = ""
-                        # 逐行读取流式响应
-                        async for line in response.content:
-                            if line.strip():
-                                # 处理SSE格式的响应行
-                                line_str = line.decode('utf-8').strip()
-                                # 跳过data: [DONE] 结束标记
-                                if line_str == 'data: [DONE]':
-                                    break
-                                # 提取data: 后面的JSON部分
-                                if line_str.startswith('data: '):
-                                    json_str = line_str[6:]
-                                    try:
-                                        chunk_data = json.loads(json_str)
-                                        # 提取文本片段
-                                        if chunk_data.get('choices'):
-                                            delta = chunk_data['choices'][0].get('delta', {})
-                                            if 'content' in delta:
-                                                chunk_text = delta['content']
-                                                full_response += chunk_text
-                                                # 调用回调函数处理文本片段
-                                                if on_chunk:
-                                                    await on_chunk(chunk_text)
-                                    except json.JSONDecodeError:
-                                        logger.warning(f"解析流式响应失败: {json_str}")
-                        return full_response.strip()
-                    else:
-                        error_msg = f"抱歉，调用大模型API时出错 (HTTP {response.status})"
-                        logger.error(f"大模型API调用失败: HTTP {response.status}, {await response.text()}")
-                        if on_chunk:
-                            await on_chunk(error_msg)
-                        return error_msg
-            else:
-                # 非流式响应处理（保持原有逻辑）
-                async with session.post(url, json=request_data, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data["choices"][0]["message"]["content"].strip()
-                    else:
-                        error_msg = f"抱歉，调用大模型API时出错 (HTTP {response.status})"
-                        logger.error(f"大模型API调用失败: HTTP {response.status}, {await response.text()}")
-                        return error_msg
+    # 该会话最近的问答（已按token预算裁剪）
+    history = conversation_memory.get_messages(memory_key)
     
+    # 命中缓存时按原来的片段顺序重放，客户端收到的消息与实际调用一致
+    cache_key = get_llm_cache_key(prompt, history)
+    if cached_chunks is None and check_cache:
+        cached_chunks = llm_cache.get(cache_key)
+    if cached_chunks is not None:
+        logger.info(f"大模型回复命中缓存，片段数: {len(cached_chunks)}")
+        full_response = "".join(cached_chunks)
+        if stream and on_chunk:
+            for chunk_text in cached_chunks:
+                await on_chunk(chunk_text)
+        remember_turn(memory_key, prompt, full_response.strip())
+        return full_response.strip()
+    
+    # 构建消息列表，包含系统提示、对话历史和用户消息
+    messages = [{"role": "system", "content": chatbot_tips}]
+    messages.extend(history)
+    messages.append({"role": "user", "content": prompt})
+    
+    # 准备请求数据，模型名称按选中的线路填写
+    request_data = {
+        "messages": messages,
+        "max_tokens": 500,
+        "temperature": chatbot_config.get("temperature", 0.7),
+        "stream": stream  # 启用流式响应
+    }
+    
+    try:
+        chunks, finished = await request_llm(request_data, on_chunk=on_chunk if stream else None)
+    except LLMEndpointError as e:
+        error_msg = f"抱歉，调用大模型API时出错 ({str(e)})"
+        if on_chunk:
+            await on_chunk(error_msg)
+        return error_msg
     except Exception as e:
         logger.error(f"大模型API调用异常: {str(e)}")
         logger.debug(traceback.format_exc())
@@ -215,6 +528,281 @@ async def call_llm_api(prompt, stream=False, on_chunk=None):
         if on_chunk:
             await on_chunk(error_msg)
         return error_msg
+    
+    # 只缓存和记忆完整结束的回复，中途断开的不缓存
+    full_response = "".join(chunks).strip()
+    if finished:
+        llm_cache.put(cache_key, chunks)
+        remember_turn(memory_key, prompt, full_response)
+    return full_response
+
+# 处理@苹果派命令（在后台任务中执行）
+async def handle_llm_command(message, user_info):
+    """处理@苹果派大模型对话命令，请求经过llm_scheduler排队"""
+    try:
+        await process_llm_command(message, user_info)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"处理@苹果派命令时出错: {str(e)}", exc_info=True)
+
+# 处理@新闻命令（在后台任务中执行）
+async def handle_news_command(user_info):
+    """发送今天的新闻图片：先广播预加载消息，足够多的客户端加载完图片后再发送新闻消息"""
+    # 后台任务每天预取新闻图片，只有图片还没准备好、需要临时抓取时才发送正在获取的提示
+    if not SixtySecondHelper.is_today_ready():
+        command_message = S2CPackageHelper.create_command_response("正在获取最新新闻资讯...")
+        await user_info['websocket'].send(json.dumps(command_message))
+    
+    try:
+        # 图片已预取时直接返回，否则临时抓取（与预取任务共用同一次抓取）
+        success = await SixtySecondHelper.get_today_news()
+        
+        logger.info(f"SixtySecondHelper.get_today_news() 返回结果: {success}")
+        
+        # 新闻文本内容（默认内容）
+        news_content = "每天60秒，看懂世界。"
+        
+        # 图片路径 - 按日期和内容哈希命名的图片，浏览器可以长期缓存
+        image_path = SixtySecondHelper.get_today_image() if success else None
+        has_image = image_path is not None
+        
+        logger.info(f"新闻图片存在检查: {has_image}")
+        
+        # 图片信息对象
+        image_content = None
+        if has_image:
+            # 生成唯一的图片ID（同一秒内的多次@新闻也不会混淆各自的预加载回复）
+            image_id = f"news_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+            image_content = {
+                "image_id": image_id,
+                "path": image_path,
+                "timestamp": datetime.datetime.now().isoformat()
+            }
+            
+            # 创建一个图片预加载消息
+            image_preload_message = {
+                "type": "image_preload",
+                "image_id": image_id,
+                "image_path": image_path,
+                "time": datetime.datetime.now().strftime("%H:%M:%S")
+            }
+            
+            # 先登记会收到预加载消息的客户端，再广播，避免漏掉很快到达的加载完成信号
+            room = user_info['room']
+            async with clients_lock:
+                room_clients = [client_id for client_id, client_info in active_clients.items()
+                                if client_info['room'] == room]
+            image_preloads.start(image_id, room, room_clients)
+            
+            logger.info(f"发送图片预加载消息: {image_id}，路径: {image_path}")
+            # 广播图片预加载消息给房间内的所有用户
+            await broadcast_message(image_preload_message, room=room)
+            
+            # 等待足够多的客户端加载完图片（或超过等待期限）后再发送新闻消息
+            preload_result = await image_preloads.wait(image_id, room)
+            MetricsHelper.observe("image_preload_ms", preload_result["waited_ms"])
+            logger.info(f"图片预加载: {image_id}，{preload_result}")
+        
+        # 使用S2CPackageHelper创建新闻消息，使用新的数据结构
+        news_message = S2CPackageHelper.create_news_message(news_content, image_content=image_content)
+        
+        # 广播新闻内容给所有用户
+        await broadcast_message(news_message, room=user_info['room'], persist=True)
+        
+        logger.info(f"新闻资讯已发送，图片状态: {'已包含' if has_image else '未包含'}")
+        
+    except Exception as e:
+        logger.error(f"处理新闻时出错: {str(e)}", exc_info=True)
+        error_message = S2CPackageHelper.create_error_message("获取新闻资讯失败")
+        await user_info['websocket'].send(json.dumps(error_message))
+
+# 取消没有听众的@苹果派任务
+def cancel_unwatched_llm_tasks():
+    """
+    提问者断开连接，或回复所在的房间已经没有人时，取消对应的@苹果派任务
+    
+    排队中的请求直接退出队列；正在输出的请求会关闭上游的HTTP响应，不再继续读取和广播。
+    在客户端断开或切换房间后调用。
+    """
+    if not llm_tasks:
+        return
+    occupied_rooms = {client_info['room'] for client_info in active_clients.values()}
+    for task, info in list(llm_tasks.items()):
+        if task.done() or "reason" in info:
+            continue
+        if info["client_id"] not in active_clients:
+            reason = "提问者已离开"
+        elif info["room"] not in occupied_rooms:
+            reason = "房间里已经没有人"
+        else:
+            continue
+        info["reason"] = reason
+        task.cancel()
+        MetricsHelper.increment("llm_tasks_cancelled")
+        logger.info(f"{reason}，取消 {info['requester']} 的@苹果派请求（房间: {info['room']}）")
+
+async def process_llm_command(message, user_info):
+    """处理@苹果派命令的具体逻辑"""
+    sender = user_info['name']
+    # 回复固定发往提问时所在的房间，提问者中途切换房间不影响其他听众
+    room = user_info['room']
+    # 对话记忆的会话键；按房间记忆时在问题前加上提问者，让模型区分不同的人
+    memory_key = get_memory_key(user_info)
+    room_memory = memory_key is not None and memory_key.startswith("room:")
+    
+    # 排队位置变化时通知提问者
+    async def notify_position(position):
+        queue_message = S2CPackageHelper.create_command_response(f"🍎 苹果派正在回答其他问题，你排在第 {position} 位，请稍候...")
+        await user_info['websocket'].send(json.dumps(queue_message))
+    
+    # 检查是否启用流式响应
+    use_stream = chatbot_config.get("enabled", True)
+    
+    if not use_stream:
+        # 非流式响应模式
+        logger.info(f"处理@苹果派命令（非流式）for {sender}")
+        sender = user_info['name']
+        user_message = message[len('@苹果派'):].strip()
+        
+        if not user_message:
+            response = "🍎 苹果派: 你好！我是苹果派AI助手，有什么可以帮助你的吗？\n⚠服务器未启用大模型对话，你将只能收到这一条回复！⚠"
+            response_data = {
+                "type": "command",
+                "message": response,
+                "time": datetime.datetime.now().strftime("%H:%M:%S")
+            }
+            await user_info['websocket'].send(json.dumps(response_data))
+        else:
+            # 广播用户的原始问题消息
+            await broadcast_message({
+                "type": "message",
+                "message": message,
+                "user": sender,
+                "sender": sender
+            }, room=room, persist=True)
+            
+            prompt = f"{sender}：{user_message}" if room_memory else user_message
+            
+            # 调用大模型API获取完整响应（经调度器排队，命中缓存时不占用上游名额）
+            # 只查询一次缓存并使用查询结果，避免条目在检查之后过期而绕过调度器直接请求上游
+            cached_chunks = llm_cache.get(get_llm_cache_key(prompt, conversation_memory.get_messages(memory_key)))
+            if cached_chunks is not None:
+                accepted, response = True, await call_llm_api(prompt, stream=False, memory_key=memory_key, cached_chunks=cached_chunks)
+            else:
+                accepted, response = await llm_scheduler.run(
+                    sender,
+                    lambda: call_llm_api(prompt, stream=False, memory_key=memory_key, check_cache=False),
+                    on_position=notify_position
+                )
+            if not accepted:
+                error_message = S2CPackageHelper.create_error_message(response)
+                await user_info['websocket'].send(json.dumps(error_message))
+                return
+            
+            # 使用S2CPackageHelper创建非流式苹果派消息
+            response_data = S2CPackageHelper.create_message("苹果派", response)
+            
+            await broadcast_message(response_data, room=room, persist=True)
+    else:
+        # 大模型对话功能 - 使用SSE协议返回流式响应
+        logger.info(f"处理@苹果派命令（流式）for {sender}")
+        sender = user_info['name']
+        # 提取用户实际的对话内容（去掉@苹果派前缀）
+        user_message = message[len('@苹果派'):].strip()
+        
+        if not user_message:
+            # 如果用户没有提供具体问题，发送提示消息
+            response = "🍎 苹果派: 你好！我是苹果派AI助手，有什么可以帮助你的吗？"
+            response_data = {
+                "type": "command",
+                "message": response,
+                "time": datetime.datetime.now().strftime("%H:%M:%S")
+            }
+            logger.info(f"{sender} 请求苹果派，准备发送提示: {response_data}")
+            await user_info['websocket'].send(json.dumps(response_data))
+        else:
+            logger.info(f"{sender} 请求大模型对话: {user_message}")
+            
+            prompt = f"{sender}：{user_message}" if room_memory else user_message
+            
+            # 生成唯一的响应ID，客户端据此区分同一房间里同时进行的多个流式回复
+            response_id = str(uuid.uuid4())[:8]
+            queued_at = time.perf_counter()
+            
+            # 只查询一次缓存并使用查询结果，避免条目在检查之后过期而绕过调度器直接请求上游
+            cached_chunks = llm_cache.get(get_llm_cache_key(prompt, conversation_memory.get_messages(memory_key)))
+            
+            # 轮到该请求时才开始推送流式响应
+            async def stream_reply():
+                MetricsHelper.observe("llm_queue_ms", (time.perf_counter() - queued_at) * 1000)
+                # 收集已推送的片段，结束后拼接为完整响应
+                sent_chunks = []
+                # 本次流式回复的消息序号
+                stream_seq = 0
+                # 本次回复花在广播上的总时间
+                fanout_time = 0.0
+                
+                # 广播一条带stream_id和序号的SSE消息
+                async def send_stream_event(text, event_type):
+                    nonlocal stream_seq, fanout_time
+                    sse_message = S2CPackageHelper.create_sse_stream_message(
+                        text, event_type=event_type, stream_id=response_id, requester=sender, stream_seq=stream_seq
+                    )
+                    stream_seq += 1
+                    started_at = time.perf_counter()
+                    await broadcast_message(sse_message, room=room)
+                    elapsed = time.perf_counter() - started_at
+                    fanout_time += elapsed
+                    MetricsHelper.observe("broadcast_frame_ms", elapsed * 1000)
+                
+                # 发送SSE开始信号
+                await send_stream_event("", "start")
+                logger.info(f"发送SSE流式响应开始信号，stream_id: {response_id}")
+                
+                # 定义流式响应的回调函数
+                async def on_chunk(chunk_text):
+                    sent_chunks.append(chunk_text)
+                    # 广播文本片段作为SSE消息
+                    await send_stream_event(chunk_text, "chunk")
+                    logger.debug(f"发送流式响应片段，长度: {len(chunk_text)}")
+                
+                # 使用流式API调用大模型
+                try:
+                    await call_llm_api(
+                        prompt, stream=True, on_chunk=on_chunk, memory_key=memory_key,
+                        cached_chunks=cached_chunks, check_cache=False
+                    )
+                except asyncio.CancelledError:
+                    # 提问者离开时房间里可能还有其他人，补上说明和结束信号，客户端不会一直等待
+                    reason = llm_tasks.get(asyncio.current_task(), {}).get("reason", "请求已取消")
+                    notice = f"（{reason}，回复已中止）"
+                    await send_stream_event(notice, "chunk")
+                    await send_stream_event("", "end")
+                    logger.info(f"大模型流式回复已中止，stream_id: {response_id}，已发送 {len(sent_chunks)} 个片段")
+                    if sent_chunks:
+                        chat_history.append(room, S2CPackageHelper.create_message("苹果派", "".join(sent_chunks) + notice))
+                    raise
+                
+                # 发送SSE结束信号
+                await send_stream_event("", "end")
+                logger.info(f"发送SSE流式响应结束信号，stream_id: {response_id}")
+                MetricsHelper.observe("broadcast_stream_ms", fanout_time * 1000)
+                
+                full_response = "".join(sent_chunks)
+                # 流式片段不入库，结束后把完整回复作为一条消息写入聊天记录
+                if full_response:
+                    chat_history.append(room, S2CPackageHelper.create_message("苹果派", full_response))
+                logger.info(f"大模型流式回复完成，总内容长度: {len(full_response)} 字符")
+            
+            # 命中缓存的回复直接重放，不占用上游名额
+            if cached_chunks is not None:
+                accepted, result = True, await stream_reply()
+            else:
+                accepted, result = await llm_scheduler.run(sender, stream_reply, on_position=notify_position)
+            if not accepted:
+                error_message = S2CPackageHelper.create_error_message(result)
+                await user_info['websocket'].send(json.dumps(error_message))
 
 # 处理@命令
 async def handle_at_command(message, user_info):
@@ -238,7 +826,7 @@ async def handle_at_command(message, user_info):
             # 使用S2CPackageHelper创建电影消息
             movie_message = S2CPackageHelper.create_movie_message(url, sender)
             # 广播电影播放消息
-            await broadcast_message(movie_message, room=user_info['room'])
+            await broadcast_message(movie_message, room=user_info['room'], persist=True)
             logger.info(f"{sender} 发送了电影链接: {url}")
         else:
             # 使用S2CPackageHelper创建错误消息
@@ -249,22 +837,27 @@ async def handle_at_command(message, user_info):
         # 处理热搜指令
         logger.info(f"处理@热搜命令 for {sender}")
         
-        # 首先向发送者发送一个正在获取的提示
-        command_message = S2CPackageHelper.create_command_response("正在获取最新热搜榜单...")
-        await user_info['websocket'].send(json.dumps(command_message))
+        # 内存中还没有热搜列表时（服务器刚启动）需要现场抓取，先向发送者发送一个正在获取的提示
+        if not HotSearchHelper.get_latest()[0]:
+            command_message = S2CPackageHelper.create_command_response("正在获取最新热搜榜单...")
+            await user_info['websocket'].send(json.dumps(command_message))
         
         # 获取百度热搜列表
-        hot_searches = await get_baidu_hot_search()
+        hot_searches, updated_at = await get_baidu_hot_search()
         
-        # 格式化热搜内容为卡片形式
-        formatted_content = format_hot_searches(hot_searches)
+        if not hot_searches:
+            error_message = S2CPackageHelper.create_error_message("暂时无法获取百度热搜，请稍后再试")
+            await user_info['websocket'].send(json.dumps(error_message))
+            return
         
         # 使用S2CPackageHelper创建热搜消息
-        hot_search_message = S2CPackageHelper.create_hot_search_message(hot_searches)
+        hot_search_message = S2CPackageHelper.create_hot_search_message(
+            hot_searches, updated_at=updated_at.strftime("%H:%M")
+        )
         # 广播热搜内容给所有用户
-        await broadcast_message(hot_search_message, room=user_info['room'])
+        await broadcast_message(hot_search_message, room=user_info['room'], persist=True)
         
-        logger.info(f"热搜列表已发送，共 {len(hot_searches)} 条")
+        logger.info(f"热搜列表已发送，共 {len(hot_searches)} 条，更新于 {updated_at:%H:%M:%S}")
         
     elif message.startswith('@音乐'):
         # 处理音乐指令
@@ -292,7 +885,7 @@ async def handle_at_command(message, user_info):
             # 使用S2CPackageHelper创建音乐消息
             music_message = S2CPackageHelper.create_music_message(api_url, sender, song_id)
             # 广播音乐消息
-            await broadcast_message(music_message, room=user_info['room'])
+            await broadcast_message(music_message, room=user_info['room'], persist=True)
             logger.info(f"{sender} 分享了音乐: {music_url}，API地址: {api_url}")
             
         except Exception as e:
@@ -304,157 +897,45 @@ async def handle_at_command(message, user_info):
         # 处理新闻指令
         logger.info(f"处理@新闻命令 for {sender}")
         
-        # 首先向发送者发送一个正在获取的提示
-        command_message = S2CPackageHelper.create_command_response("正在获取最新新闻资讯...")
-        await user_info['websocket'].send(json.dumps(command_message))
+        # 新闻需要等待客户端预加载图片，放到后台任务中执行，不阻塞该用户发送加载完成信号
+        task = asyncio.create_task(handle_news_command(user_info))
+        news_tasks.add(task)
+        task.add_done_callback(news_tasks.discard)
         
-        try:
-            # 异步调用SixtySecondHelper的main函数
-            logger.info("异步调用SixtySecondHelper.main()")
-            # 使用asyncio.to_thread来在单独的线程中运行同步函数
-            success = await asyncio.to_thread(SixtySecondHelper.main)
-            
-            logger.info(f"SixtySecondHelper.main() 返回结果: {success}")
-            
-            # 新闻文本内容（默认内容）
-            news_content = "每天60秒，看懂世界。"
-            
-            # 图片路径 - 指向客户端src/client/images目录下的news.png
-            image_filename = "news.png"
-            image_path = f"src/client/images/{image_filename}"
-            # 本地图片路径（服务器端用于检查文件是否存在）
-            local_image_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "client", "images", "news.png")
-            has_image = success and os.path.exists(local_image_path)
-            
-            logger.info(f"新闻图片存在检查: {has_image}")
-            
-            # 图片信息对象
-            image_content = None
-            if has_image:
-                # 生成唯一的图片ID
-                image_id = f"news_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
-                image_content = {
-                    "image_id": image_id,
-                    "path": image_path,
-                    "timestamp": datetime.datetime.now().isoformat()
-                }
-                
-                # 创建一个图片预加载消息
-                image_preload_message = {
-                    "type": "image_preload",
-                    "image_id": image_id,
-                    "image_path": image_path,
-                    "time": datetime.datetime.now().strftime("%H:%M:%S")
-                }
-                
-                logger.info(f"发送图片预加载消息: {image_id}，路径: {image_path}")
-                # 广播图片预加载消息给所有用户
-                await broadcast_message(image_preload_message, room=user_info['room'])
-                
-                # 添加延迟确保图片预加载消息先到达客户端
-                # 后续会添加等待客户端加载完成信号的逻辑
-                await asyncio.sleep(1.0)
-            
-            # 使用S2CPackageHelper创建新闻消息，使用新的数据结构
-            news_message = S2CPackageHelper.create_news_message(news_content, image_content=image_content)
-            
-            # 广播新闻内容给所有用户
-            # 注意：后续会修改为等待客户端加载完成信号后再发送
-            logger.info(f"准备发送新闻消息，等待图片预加载完成")
-            await broadcast_message(news_message, room=user_info['room'])
-            
-            logger.info(f"新闻资讯已发送，图片状态: {'已包含' if has_image else '未包含'}")
-            
-        except Exception as e:
-            logger.error(f"处理新闻时出错: {str(e)}", exc_info=True)
-            error_message = S2CPackageHelper.create_error_message("获取新闻资讯失败")
+    elif message.startswith('@性能'):
+        # 管理员查看性能指标：@性能 查看，@性能 重置 清空
+        logger.info(f"处理@性能命令 for {sender}")
+        if sender not in chatbot_config.get("admin_users", ["admin"]):
+            error_message = S2CPackageHelper.create_error_message("只有管理员可以查看性能指标")
             await user_info['websocket'].send(json.dumps(error_message))
+            return
         
+        if message[len('@性能'):].strip() == "重置":
+            MetricsHelper.reset()
+            report = "性能指标已清空"
+        else:
+            report = "\n".join([
+                "📊 服务器性能指标",
+                MetricsHelper.format_report(),
+                f"调度器: {json.dumps(llm_scheduler.stats(), ensure_ascii=False)}",
+                f"回复缓存: {json.dumps(llm_cache.stats(), ensure_ascii=False)}",
+                f"对话记忆: {json.dumps(conversation_memory.stats(), ensure_ascii=False)}",
+                f"用户资料缓存: {json.dumps(db_manager.get_cache_stats(), ensure_ascii=False)}",
+                f"线路: {json.dumps(llm_router.stats(), ensure_ascii=False)}",
+                f"天气: {json.dumps(WeatherHelper.stats(), ensure_ascii=False)}",
+                f"热搜: {json.dumps(HotSearchHelper.stats(), ensure_ascii=False)}",
+                f"新闻: {json.dumps(SixtySecondHelper.stats(), ensure_ascii=False)}",
+                f"图片预加载: {json.dumps(image_preloads.stats(), ensure_ascii=False)}",
+                f"定时任务: {json.dumps(JobStatusHelper.shared().latest(), ensure_ascii=False)}"
+            ])
+        response_data = S2CPackageHelper.create_command_response(report)
+        await user_info['websocket'].send(json.dumps(response_data))
+    
     elif message.startswith('@苹果派'):
-            # 检查是否启用流式响应
-            use_stream = chatbot_config.get("enabled", True)
-            
-            if not use_stream:
-                # 非流式响应模式
-                logger.info(f"处理@苹果派命令（非流式）for {sender}")
-                sender = user_info['name']
-                user_message = message[len('@苹果派'):].strip()
-                
-                if not user_message:
-                    response = "🍎 苹果派: 你好！我是苹果派AI助手，有什么可以帮助你的吗？\n⚠服务器未启用大模型对话，你将只能收到这一条回复！⚠"
-                    response_data = {
-                        "type": "command",
-                        "message": response,
-                        "time": datetime.datetime.now().strftime("%H:%M:%S")
-                    }
-                    await user_info['websocket'].send(json.dumps(response_data))
-                else:
-                    # 广播用户的原始问题消息
-                    await broadcast_message({
-                        "type": "message",
-                        "message": message,
-                        "user": sender,
-                        "sender": sender
-                    }, room=user_info['room'])
-                    
-                    # 调用大模型API获取完整响应
-                    response = await call_llm_api(user_message, stream=False)
-                    
-                    # 使用S2CPackageHelper创建非流式苹果派消息
-                    response_data = S2CPackageHelper.create_message("苹果派", response)
-                    
-                    await broadcast_message(response_data, room=user_info['room'])
-            else:
-                # 大模型对话功能 - 使用SSE协议返回流式响应
-                logger.info(f"处理@苹果派命令（流式）for {sender}")
-                sender = user_info['name']
-                # 提取用户实际的对话内容（去掉@苹果派前缀）
-                user_message = message[len('@苹果派'):].strip()
-                
-                if not user_message:
-                    # 如果用户没有提供具体问题，发送提示消息
-                    response = "🍎 苹果派: 你好！我是苹果派AI助手，有什么可以帮助你的吗？"
-                    response_data = {
-                        "type": "command",
-                        "message": response,
-                        "time": datetime.datetime.now().strftime("%H:%M:%S")
-                    }
-                    logger.info(f"{sender} 请求苹果派，准备发送提示: {response_data}")
-                    await user_info['websocket'].send(json.dumps(response_data))
-                else:
-                    logger.info(f"{sender} 请求大模型对话: {user_message}")
-                    
-                    # 生成唯一的响应ID，用于跟踪流式响应
-                    response_id = str(uuid.uuid4())[:8]
-                    
-                    # 累积完整响应
-                    full_response = ""
-                    
-                    # 发送SSE开始信号
-                    start_sse_message = S2CPackageHelper.create_sse_stream_message("", event_type="start")
-                    await broadcast_message(start_sse_message, room=user_info['room'])
-                    logger.info(f"发送SSE流式响应开始信号")
-                    
-                    # 定义流式响应的回调函数
-                    async def on_chunk(chunk_text):
-                        nonlocal full_response
-                        full_response += chunk_text
-                        
-                        # 使用S2CPackageHelper创建sse_stream消息
-                        sse_message = S2CPackageHelper.create_sse_stream_message(chunk_text)
-                        # 广播文本片段作为SSE消息
-                        await broadcast_message(sse_message, room=user_info['room'])
-                        
-                        logger.debug(f"发送流式响应片段，长度: {len(chunk_text)}")
-                    
-                    # 使用流式API调用大模型
-                    await call_llm_api(user_message, stream=True, on_chunk=on_chunk)
-                    
-                    # 发送SSE结束信号
-                    end_sse_message = S2CPackageHelper.create_sse_stream_message("", event_type="end")
-                    await broadcast_message(end_sse_message, room=user_info['room'])
-                    logger.info(f"发送SSE流式响应结束信号")
-                    logger.info(f"大模型流式回复完成，总内容长度: {len(full_response)} 字符")
+        # 大模型请求可能需要排队，放到后台任务中执行，不阻塞该用户接收其他消息
+        task = asyncio.create_task(handle_llm_command(message, user_info))
+        llm_tasks[task] = {"client_id": user_info['id'], "room": user_info['room'], "requester": sender}
+        task.add_done_callback(lambda done_task: llm_tasks.pop(done_task, None))
     
     elif message.startswith('@天气'):
         # 处理天气查询指令
@@ -480,7 +961,7 @@ async def handle_at_command(message, user_info):
                 # 使用S2CPackageHelper创建天气卡片消息
                 weather_card_message = S2CPackageHelper.create_weather_card_message(weather_card, city, sender)
                 # 广播天气卡片给所有用户
-                await broadcast_message(weather_card_message, room=user_info['room'])
+                await broadcast_message(weather_card_message, room=user_info['room'], persist=True)
                 logger.info(f"天气信息已发送: {city}")
             else:
                 # 使用S2CPackageHelper创建错误消息
@@ -545,8 +1026,29 @@ async def send_active_users(room=None):
     
     logger.info("在线用户列表广播完成")
 
-async def broadcast_message(message, room=None, exclude_client=None):
-    """广播消息给所有客户端或指定房间的客户端，优化版"""
+async def send_history(websocket, room, before_seq=None, limit=50):
+    """向单个客户端发送房间的聊天记录
+    
+    Args:
+        websocket: 客户端连接
+        room: 房间名称
+        before_seq: 只发送序号小于该值的消息，None表示最新的消息
+        limit: 最多发送的条数
+    """
+    messages, has_more = await chat_history.get_history(room, before_seq=before_seq, limit=limit)
+    history_message = S2CPackageHelper.create_history_message(room, messages, has_more)
+    await websocket.send(json.dumps(history_message))
+    logger.info(f"已发送房间 {room} 的聊天记录，共 {len(messages)} 条")
+
+async def broadcast_message(message, room=None, exclude_client=None, persist=False):
+    """广播消息给所有客户端或指定房间的客户端，优化版
+    
+    Args:
+        message: 消息对象
+        room: 房间名称，None表示所有客户端
+        exclude_client: 需要排除的客户端ID
+        persist: 是否写入聊天记录（消息会带上房间内的seq序号）
+    """
     logger.info(f"开始广播消息，类型: {message.get('type')}，房间: {room}，排除客户端: {exclude_client}")
     
     message_data = {
@@ -559,6 +1061,10 @@ async def broadcast_message(message, room=None, exclude_client=None):
     if 'user' in message_data and 'sender' not in message_data:
         message_data['sender'] = message_data['user']
     
+    # 写入聊天记录只操作内存队列，由后台任务批量落盘
+    if persist:
+        chat_history.append(room, message_data)
+    
     # 预先准备好消息的JSON字符串
     message_json = json.dumps(message_data)
     
@@ -606,6 +1112,9 @@ async def broadcast_message(message, room=None, exclude_client=None):
             for client_id in disconnected_clients:
                 if client_id in active_clients:
                     del active_clients[client_id]
+        cancel_unwatched_llm_tasks()
+        for client_id in disconnected_clients:
+            image_preloads.remove_client(client_id)
         
         # 如果有用户断开连接，发送一条统一的系统消息和更新用户列表
         if disconnected_users:
@@ -716,8 +1225,8 @@ async def handle_client(*args):
                             logger.info(f"向客户端 {client_id} 发送注册响应: {response_data}")
                             await websocket.send(json.dumps(response_data))
                         else:
-                            # 调用数据库管理器进行注册
-                            success, result = db_manager.register_user(username, password)
+                            # 调用数据库管理器进行注册（密码哈希耗时较长，放到线程中执行，避免阻塞事件循环）
+                            success, result = await asyncio.to_thread(db_manager.register_user, username, password)
                             if success:
                                 logger.info(f"用户注册成功: {username}, 用户ID: {result}")
                                 # 使用S2CPackageHelper创建注册响应消息
@@ -743,8 +1252,8 @@ async def handle_client(*args):
                             logger.info(f"向客户端 {client_id} 发送登录响应: {response_data}")
                             await websocket.send(json.dumps(response_data))
                         else:
-                            # 使用密码验证用户身份
-                            success, user_data = db_manager.verify_user(username, password)
+                            # 使用密码验证用户身份（在线程中执行密码哈希校验）
+                            success, user_data = await asyncio.to_thread(db_manager.verify_user, username, password)
                             if success:
                                 # 检查用户名是否已在聊天室中
                                 if username in online_users:
@@ -774,6 +1283,9 @@ async def handle_client(*args):
                                     
                                     # 发送更新后的在线用户列表
                                     await send_active_users()
+                                    
+                                    # 补发当前房间的聊天记录
+                                    await send_history(websocket, user_info['room'])
                             else:
                                 logger.warning(f"用户登录失败: {username}，用户名或密码错误")
                                 # 使用S2CPackageHelper创建登录响应消息
@@ -811,13 +1323,11 @@ async def handle_client(*args):
                         elif data['type'] == 'image_preload_complete':
                             logger.info(f"收到图片预加载完成信号: image_id={data.get('image_id')}, status={data.get('status')}")
                             
-                            # 这里可以存储预加载状态或触发后续操作
-                            # 由于我们已经在handle_at_command中添加了延迟，这里主要是记录状态
-                            if data.get('status') == 'success':
-                                logger.info(f"图片预加载成功，image_id={data.get('image_id')}")
-                                # 如果需要，可以在这里执行额外的操作
-                            else:
+                            success = data.get('status') == 'success'
+                            if not success:
                                 logger.warning(f"图片预加载失败，image_id={data.get('image_id')}, error={data.get('error')}")
+                            # 记录该客户端的回复，足够多的客户端回复后等待中的@新闻会发送新闻消息
+                            image_preloads.ack(data.get('image_id'), user_info['room'], client_id, success)
                             
                             continue
                         
@@ -843,7 +1353,7 @@ async def handle_client(*args):
                                     "type": "message",
                                     "message": content,
                                     "user": user_info['name']
-                                }, room=user_info['room'])
+                                }, room=user_info['room'], persist=True)
                                 # 然后再进行指令处理
                                 await handle_at_command(content, user_info)
                             else:
@@ -853,7 +1363,7 @@ async def handle_client(*args):
                                     "type": "message",
                                     "message": content,
                                     "user": user_info['name']
-                                }, room=user_info['room'])
+                                }, room=user_info['room'], persist=True)
                         
                         # 处理加入房间消息
                         elif data['type'] == 'join_room' and 'room' in data:
@@ -865,6 +1375,10 @@ async def handle_client(*args):
                                 # 更新用户房间
                                 user_info['room'] = new_room
                                 logger.info(f"用户 {user_info['name']} 从 {old_room} 加入 {new_room}")
+                                # 原房间没有人了时，取消其中还在进行的@苹果派回复
+                                cancel_unwatched_llm_tasks()
+                                # 原房间的图片预加载不再等待该客户端
+                                image_preloads.remove_client(client_id)
                                 
                                 # 发送确认消息给用户
                                 room_message = S2CPackageHelper.create_room_joined_message(new_room)
@@ -873,6 +1387,19 @@ async def handle_client(*args):
                                 # 广播用户房间变更
                                 system_message = S2CPackageHelper.create_system_message(f"{user_info['name']} 加入了房间 {new_room}", user=user_info['name'])
                                 await broadcast_message(system_message, new_room)
+                                
+                                # 发送新房间的聊天记录
+                                await send_history(websocket, new_room)
+                        
+                        # 处理聊天记录分页请求
+                        elif data['type'] == 'history_request':
+                            before_seq = data.get('before_seq')
+                            limit = data.get('limit', 50)
+                            if (before_seq is not None and not isinstance(before_seq, int)) or not isinstance(limit, int):
+                                error_message = S2CPackageHelper.create_error_message("聊天记录请求参数无效")
+                                await websocket.send(json.dumps(error_message))
+                            else:
+                                await send_history(websocket, user_info['room'], before_seq=before_seq, limit=limit)
                         
                         # 处理心跳消息
                         elif data['type'] == 'ping':
@@ -899,7 +1426,7 @@ async def handle_client(*args):
                                 "message": content,
                                 "user": user_info['name'],
                                 "sender": user_info['name']  # 添加sender字段以兼容客户端
-                            }, room=user_info['room'])
+                            }, room=user_info['room'], persist=True)
                             # 然后再进行指令处理
                             logger.info(f"检测到@命令，调用handle_at_command处理: {content}")
                             await handle_at_command(content, user_info)
@@ -912,7 +1439,7 @@ async def handle_client(*args):
                                 "message": content,
                                 "user": user_info['name'],
                                 "sender": user_info['name']  # 添加sender字段以兼容客户端
-                            }, room=user_info['room'])
+                            }, room=user_info['room'], persist=True)
                 except json.JSONDecodeError:
                     # 处理非JSON格式消息
                     content = message.strip()
@@ -926,7 +1453,7 @@ async def handle_client(*args):
                             "type": "message",
                             "message": content,
                             "user": user_info['name']
-                        }, room=user_info['room'])
+                        }, room=user_info['room'], persist=True)
                         # 然后再进行指令处理
                         logger.info(f"在JSON解析错误中检测到@命令，调用handle_at_command处理: {content}")
                         await handle_at_command(content, user_info)
@@ -938,7 +1465,7 @@ async def handle_client(*args):
                             "type": "message",
                             "message": content,
                             "user": user_info['name']
-                        }, room=user_info['room'])
+                        }, room=user_info['room'], persist=True)
             except asyncio.TimeoutError:
                 # 超时处理，可能是网络问题或客户端无响应
                 logger.warning(f"客户端 {client_id} 接收超时，可能网络不稳定")
@@ -968,6 +1495,11 @@ async def handle_client(*args):
                 del active_clients[client_id]
                 logger.info(f"从active_clients中移除客户端: {client_id} ({user_info['name']})")
         
+        # 该用户的@苹果派请求和已经没有人的房间里的回复不再继续
+        cancel_unwatched_llm_tasks()
+        # 进行中的图片预加载不再等待该客户端
+        image_preloads.remove_client(client_id)
+        
         # 关键修复：当用户断开连接时，从online_users集合中移除用户名
         if user_info.get('authenticated', False) and user_info['name'] in online_users:
             online_users.remove(user_info['name'])
@@ -986,22 +1518,106 @@ async def handle_client(*args):
         
         logger.info(f"客户端 {user_info['name']} (ID: {client_id}) 已断开连接")
 
+# 定期测量事件循环延迟
+async def monitor_event_loop_lag(interval=0.5):
+    """
+    每隔interval秒测量一次sleep实际醒来比预期晚了多少，记录为event_loop_lag_ms
+    
+    有同步代码阻塞事件循环时（例如同步的HTTP请求），该延迟会明显升高，所有客户端的消息都会被推迟。
+    
+    Args:
+        interval: 测量间隔（秒）
+    """
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        MetricsHelper.observe("event_loop_lag_ms", max(0.0, time.perf_counter() - expected) * 1000)
+
 # 启动WebSocket服务器
-async def main():
+async def main(host="0.0.0.0", port=8766, background_jobs=True):
+    """
+    启动WebSocket服务器
+    
+    Args:
+        host: 监听地址
+        port: 监听端口（基准测试等场景可以换用其他端口）
+        background_jobs: 是否启动天气预取、热搜刷新和新闻图片预取等定时任务（基准测试中关闭）
+    """
     # 加载chatbot配置
     load_chatbot_config()
     
-    # 配置WebSocket服务器
-    async with websockets.serve(
-        handle_client,
-        "0.0.0.0", 
-        8766,
-        ping_interval=15.0,
-        ping_timeout=20.0,
-        close_timeout=10.0
-    ):
-        logger.info(f"WebSocket服务器已启动，监听端口8766，大模型对话功能状态: {'已启用' if chatbot_config.get('enabled') else '已禁用'}")
-        await asyncio.Future()  # 保持服务器运行
+    # 启动聊天记录的组提交任务
+    await chat_history.start()
+    
+    # 按配置创建大模型API线路路由
+    global llm_router
+    llm_router = LLMEndpointHelper.from_config(chatbot_config)
+    logger.info(f"大模型线路: {', '.join(endpoint.name for endpoint in llm_router.endpoints) or '无'}")
+    
+    # 按配置创建大模型请求调度器
+    global llm_scheduler
+    llm_scheduler = LLMSchedulerHelper(
+        max_concurrent=chatbot_config.get("max_concurrent_requests", 4),
+        max_queue=chatbot_config.get("max_queue_size", 50),
+        max_per_user=chatbot_config.get("max_queue_per_user", 3)
+    )
+    
+    # 按配置创建@苹果派的对话记忆
+    global conversation_memory
+    conversation_memory = ConversationMemoryHelper(
+        max_tokens=chatbot_config.get("memory_max_tokens", 1000),
+        max_conversations=chatbot_config.get("memory_max_conversations", 500),
+        summarize=chatbot_config.get("memory_summarize", False)
+    )
+    
+    # 按配置创建大模型回复缓存
+    global llm_cache
+    llm_cache = LLMCacheHelper(
+        capacity=chatbot_config.get("response_cache_size", 256),
+        ttl=chatbot_config.get("response_cache_ttl", 3600)
+    )
+    
+    # 创建大模型API的共享HTTP会话（长连接、DNS缓存、连接数上限和超时）
+    await HttpSessionHelper.open(
+        "llm",
+        limit=chatbot_config.get("max_connections", 20),
+        limit_per_host=chatbot_config.get("max_connections", 20),
+        connect_timeout=chatbot_config.get("connect_timeout", 10),
+        read_timeout=chatbot_config.get("read_timeout", 60),
+        trace_configs=[create_llm_trace_config()]
+    )
+    
+    # 持续测量事件循环延迟，管理员可以用@性能查看
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    background_tasks = []
+    if background_jobs:
+        # 在缓存过期前预取热门城市的天气
+        background_tasks.append(asyncio.create_task(WeatherHelper.run_prefetch()))
+        # 定期刷新百度热搜，@热搜直接返回内存中的列表
+        background_tasks.append(asyncio.create_task(HotSearchHelper.run_refresher()))
+        # 每天在新闻发布后预取新闻图片，@新闻直接发送本地图片
+        background_tasks.append(asyncio.create_task(SixtySecondHelper.run_scheduler()))
+    
+    try:
+        # 配置WebSocket服务器
+        async with websockets.serve(
+            handle_client,
+            host,
+            port,
+            ping_interval=15.0,
+            ping_timeout=20.0,
+            close_timeout=10.0
+        ):
+            logger.info(f"WebSocket服务器已启动，监听端口{port}，大模型对话功能状态: {'已启用' if chatbot_config.get('enabled') else '已禁用'}")
+            await asyncio.Future()  # 保持服务器运行
+    finally:
+        lag_monitor.cancel()
+        for task in background_tasks:
+            task.cancel()
+        # 关闭共享HTTP会话（大模型、天气等）
+        await HttpSessionHelper.close_all()
+        # 关闭前写入尚未落盘的聊天记录
+        await chat_history.close()
 
 if __name__ == "__main__":
     logger.info("正在启动聊天服务器...")
@@ -15,14 +15,14 @@ def start_http_server():
     """启动HTTP服务器提供静态文件服务"""
     try:
         # 使用Python的内置http.server模块
-        import http.server
         import socketserver
         
         # 设置端口
         PORT = 8000
         
-        # 创建处理器
-        handler = http.server.SimpleHTTPRequestHandler
+        # 创建处理器（为新闻图片等静态文件加上缓存头）
+        from start_server import StaticFileHandler
+        handler = StaticFileHandler
         
         # 使用ThreadingTCPServer支持多线程并发处理
         with socketserver.ThreadingTCPServer(("", PORT), handler) as httpd:
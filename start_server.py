@@ -16,6 +16,27 @@ if sys.version_info < (3, 7):
     print("错误: 需要Python 3.7或更高版本")
     sys.exit(1)
 
+class StaticFileHandler(http.server.SimpleHTTPRequestHandler):
+    """静态文件处理器：为静态文件加上缓存头"""
+
+    # 这些目录中的文件名包含内容哈希，内容永远不会变化，浏览器可以长期缓存且不必再验证
+    IMMUTABLE_PREFIXES = ("/src/client/images/news/",)
+
+    def send_response(self, code, message=None):
+        # 记录状态码，end_headers据此决定缓存头
+        self._response_code = code
+        super().send_response(code, message)
+
+    def end_headers(self):
+        path = self.path.split("?", 1)[0].split("#", 1)[0]
+        # 只有成功的响应可以长期缓存，404等错误响应缓存后文件出现了浏览器也不会重新请求
+        if path.startswith(self.IMMUTABLE_PREFIXES) and getattr(self, "_response_code", None) in (200, 304):
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        else:
+            # 其他文件（页面、脚本、样式等）每次使用前向服务器验证，未修改时返回304
+            self.send_header("Cache-Control", "no-cache")
+        super().end_headers()
+
 def start_http_server():
     """启动HTTP服务器提供静态文件服务"""
     # 设置HTTP服务器端口
@@ -25,7 +46,7 @@ def start_http_server():
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
     # 创建HTTP请求处理器
-    Handler = http.server.SimpleHTTPRequestHandler
+    Handler = StaticFileHandler
     
     # 设置为不显示日志信息
     Handler.log_message = lambda self, format, *args: None